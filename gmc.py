@@ -0,0 +1,295 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''GMC datalogger without GUI
+Decode dumps, download the device memory, record live data, process a folder.
+
+Only the modules a command needs are imported (no Qt; pyserial only to
+talk to the device), so e.g. a decode job from cron starts at once.
+
+Examples:
+gmc.py decode dump.bin -o dump.csv           convert dump to csv
+gmc.py decode *.bin -o {name}.csv,all.sqlite   one csv per dump, all in one database
+gmc.py download -d today.gmcz -o today.csv   save memory of the device, and as csv
+gmc.py live -o live.jsonl -a                 CPM every second, with alerts
+gmc.py live --replay dump.bin --speed 0      dump as live data, as fast as possible
+gmc.py live --publish -o live.csv            live data also for other programs (gmcshm)
+gmc.py live --follow -a                      alerts on the live data of another program
+gmc.py batch /data/incoming -o all.sqlite    decode dumps dropped into a folder
+gmc.py summary dump.bin -o runs.csv          table of the runs (between time/ID tags)
+
+Usage:
+  gmc.py decode [options] INPUT...
+  gmc.py download [options]
+  gmc.py live [options]
+  gmc.py batch [options] DIR
+  gmc.py summary [options] INPUT...
+  gmc.py (-h | --help)
+
+Options:
+  -o OUT, --output OUT     Output file(s), comma separated, format by extension (see gmcsink);
+                           {name}: name of the input file; - : screen; batch: relative to DIR
+                           summary: *.json, *.jsonl, *.csv or text (see gmcsummary)
+  -t FMT, --format FMT     Text output format: plain, csv, tsv (default: by file name)
+  --from TIME              Only data from TIME on (YYYY-MM-DD HH:MM:SS)
+  --to TIME                Only data up to TIME (YYYY-MM-DD HH:MM:SS)
+  -j N, --jobs N           Decode with N processes (0: number of CPUs) [default: 1]
+  -c, --cache              Keep decoded data in ~/.cache/gmc_datalogger
+  -a, --alerts             Print spikes and increases of the count rate (see gmcalarm)
+  -P DEV, --port DEV       Serial device (default: search)
+  -b BAUD, --baud BAUD     Baud rate (default: search)
+  -d FILE, --dump FILE     Save downloaded memory (compressed if FILE is *.gmcz)
+  -i SEC, --interval SEC   Seconds between live readings [default: 1]
+  --replay FILE            Live data from a dump instead of the device
+  --speed N                Replay speed: 1 real time, 0 as fast as possible [default: 1]
+  --publish                live: publish samples in shared memory for other programs
+  --follow                 live: samples published by another program, not the device
+  --ring FILE              Shared memory file of --publish/--follow (default: see gmcshm)
+  --once                   batch: process waiting files and exit
+  -s, --serialstats        Print serial link statistics per command
+  -p, --profile            Print time spent per stage
+  -v, --verbose            Print more details
+  -h --help                Show help
+'''
+
+# versions:
+# vers 2017-04: first version
+# vers 2017-04: live --publish/--follow (gmcshm)
+# vers 2017-04: summary (gmcsummary)
+
+import os
+import sys
+import time
+
+from docopt import docopt
+
+
+def readdump(fn):
+    """Raw data of a dump file or *.gmcz archive"""
+    with open(fn, 'rb') as f:
+        data = f.read()
+    if fn.endswith('.gmcz'):
+        import gmccodec
+        data = gmccodec.decompress(data)
+    return data
+
+
+def outputs(args, name=None):
+    """gmcsink sinks of --output; {name} replaced by name"""
+    import gmcsink
+    if not args['--output']:
+        return []
+    out = []
+    for o in args['--output'].split(','):
+        o = o.strip()
+        if '{name}' in o:
+            if name is None:
+                continue
+            o = o.format(name=os.path.splitext(os.path.basename(name))[0])
+        elif name is not None:
+            continue
+        out.append(gmcsink.forfile(o, args['--format']))
+    return out
+
+
+def decoded(args, data):
+    """RecordBatch of raw data, with --jobs and --cache"""
+    import gmccache
+    jobs = int(args['--jobs']) or None
+    if jobs != 1:
+        import gmcparallel
+        return gmccache.decode(data, lambda d: gmcparallel.decode(d, jobs))
+    return gmccache.decode(data)
+
+
+def emit(args, rb, name, shared):
+    """Write rb to the per file outputs of name and to the pipeline shared"""
+    import gmcsink
+    perfile = outputs(args, name)
+    if perfile:
+        with gmcsink.Pipeline(perfile) as p:
+            p.write(rb)
+    if shared:
+        shared.write(rb)
+    if args['--alerts']:
+        import gmcalarm
+        for a in gmcalarm.replay(rb, gmcalarm.Detector()):
+            print gmcalarm.describe(a)
+
+
+def cmd_decode(args):
+    import gmcsink
+    tf = tt = None
+    if args['--from'] or args['--to']:
+        import gmcdecode
+        tf = gmcdecode.parsetime(args['--from']) if args['--from'] else None
+        tt = gmcdecode.parsetime(args['--to']) if args['--to'] else None
+    with gmcsink.Pipeline(outputs(args)) as shared:
+        for fn in args['INPUT']:
+            if tf is not None or tt is not None:
+                import gmcindex
+                rb = gmcindex.select(fn, tf, tt)
+            else:
+                rb = decoded(args, readdump(fn))
+            if args['--verbose']:
+                print "{:s}: {:d} records".format(fn, len(rb))
+            emit(args, rb, fn, shared)
+
+
+def session(args):
+    """gmcserial.Session of --port/--baud, device searched if not given"""
+    import gmcserial
+    port, baud = args['--port'], args['--baud']
+    if not (port and baud):
+        found = gmcserial.detect([port] if port else None,
+                                 (int(baud),) if baud else gmcserial.BAUDS)
+        if not found:
+            sys.exit("No GMC device found")
+        port, baud = found[:2]
+    ser = gmcserial.Session(port, int(baud))
+    try:
+        ser.open(1)
+    except (IOError, OSError) as e:
+        sys.exit("Serial port {:s}: {!s}".format(port, e))
+    return ser
+
+
+def cmd_download(args):
+    import gmcparse6
+    import gmcsink
+    ser = session(args)
+    try:
+        if args['--verbose']:
+            print "Device:", gmcparse6.getVER(ser), gmcparse6.getDate(ser)
+        data = gmcparse6.readHIST(ser)
+    except (IOError, OSError) as e:
+        # serial errors are raised by gmcparse6, end with a message
+        sys.exit("Serial port {:s}: {!s}".format(ser.name, e))
+    finally:
+        ser.close()
+    if args['--dump']:
+        out = data
+        if args['--dump'].endswith('.gmcz'):
+            import gmccodec
+            out = gmccodec.compress(data)
+        with open(args['--dump'], 'wb') as f:
+            f.write(out)
+    if args['--verbose']:
+        print "{:d} bytes read from device".format(len(data))
+    with gmcsink.Pipeline(outputs(args)) as shared:
+        emit(args, decoded(args, data), args['--dump'] or 'download', shared)
+
+
+def livefeed(ser, interval=1.0):
+    """Yield (epoch sec, CPM) read from the device every interval seconds"""
+    import gmcparse6
+    import gmcdecode
+    import datetime
+    due = time.time()
+    while True:
+        dt = datetime.datetime.strptime(gmcparse6.getDate(ser), "%Y-%m-%d %H:%M:%S")
+        yield gmcdecode.epoch(dt), gmcparse6.getCPM(ser)
+        due += interval
+        wait = due - time.time()
+        if wait > 0:
+            time.sleep(wait)
+
+
+def cmd_live(args):
+    import gmcsink
+    import gmcwrite
+    ser = ring = None
+    if args['--replay']:
+        import gmcreplay
+        feed = gmcreplay.Replay(readdump(args['--replay']), float(args['--speed']))
+    elif args['--follow']:
+        import gmcshm
+        feed = gmcshm.Reader(args['--ring'] or gmcshm.RING).follow()
+    else:
+        ser = session(args)
+        feed = livefeed(ser, float(args['--interval']))
+    detector = None
+    if args['--alerts']:
+        import gmcalarm
+        detector = gmcalarm.Detector(lambda a: sys.stdout.write(gmcalarm.describe(a) + "\n"))
+    if args['--publish']:
+        import gmcshm
+        ring = gmcshm.Ring(args['--ring'] or gmcshm.RING)
+    pipe = gmcsink.Pipeline(outputs(args), block=False)
+    n = 0
+    t0 = time.time()
+    try:
+        for t, cpm in feed:
+            pipe.append(t, cpm)
+            if ring:
+                ring.publish(t, cpm)
+            if detector:
+                detector.update(t, cpm)
+            if args['--verbose'] or not args['--output']:
+                print "{:s}  {:d}".format(gmcwrite.timestr(t), cpm)
+            n += 1
+    except KeyboardInterrupt:
+        pass
+    except (IOError, OSError) as e:
+        if not ser:
+            raise
+        sys.exit("Serial port {:s}: {!s}".format(ser.name, e))
+    finally:
+        pipe.close()
+        if ser:
+            ser.close()
+        if ring:
+            ring.close()
+    if args['--verbose']:
+        dt = time.time() - t0
+        print "{:d} samples in {:.2f} s, dropped: {!r}".format(n, dt, pipe.dropped())
+
+
+def cmd_batch(args):
+    import gmcwatch
+    w = gmcwatch.Watcher(args['DIR'],
+                         [o.strip() for o in (args['--output'] or '{name}.csv').split(',')],
+                         verbose=args['--verbose'])
+    try:
+        w.run(args['--once'])
+    except KeyboardInterrupt:
+        pass
+
+
+def cmd_summary(args):
+    import gmcsummary
+    for fn in args['INPUT']:
+        rb, summary = gmcsummary.decode(readdump(fn))
+        if len(args['INPUT']) > 1:
+            print "{:s}:".format(fn)
+        print summary.table()
+        for o in (args['--output'] or '').split(','):
+            o = o.strip()
+            if o and o != '-':
+                summary.write(o.format(name=os.path.splitext(os.path.basename(fn))[0]))
+        if args['--alerts']:
+            import gmcalarm
+            for a in gmcalarm.replay(rb, gmcalarm.Detector()):
+                print gmcalarm.describe(a)
+
+
+def main(argv=None):
+    args = docopt(__doc__, argv)
+    if args['--profile']:
+        import gmcprof
+        gmcprof.enable()
+    if args['--cache']:
+        import gmccache
+        gmccache.use_disk()
+    for cmd in ('decode', 'download', 'live', 'batch', 'summary'):
+        if args[cmd]:
+            globals()['cmd_' + cmd](args)
+    if args['--serialstats']:
+        import gmclink
+        sys.stderr.write(gmclink.stats.report() + "\n")
+    if args['--profile']:
+        sys.stderr.write(gmcprof.report() + "\n")
+
+
+if __name__ == '__main__':
+    main()
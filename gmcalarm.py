@@ -0,0 +1,218 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Online anomaly detection on count rates
+
+Each sample (count per interval: CPS, CPM or CPH) is checked by three
+tests against a baseline, in O(1) time per sample:
+    poisson:  count above the Poisson quantile of the baseline rate
+              (upper tail probability < alpha); catches single spikes
+    cusum:    one sided CUSUM of (count - rate) / sqrt(rate); catches
+              small but lasting increases
+    zscore:   deviation from mean and spread of the last samples
+              (rolling window); catches changes if the counts are not
+              Poisson like (e.g. CPM sampled every second)
+The baseline rate is a moving average, not updated while alarmed, so
+a lasting increase is not learned as normal.
+
+Alerts go to a callback: callback(Alert). Live: feed getCPM() values
+(see gwcmain livedata); history: replay() a decoded dump for tuning.
+
+Usage:
+    gmcalarm.py DUMPFILE [ALPHA [H [Z]]]    print alerts of a dump
+'''
+
+# versions:
+# vers 2017-04: first version
+
+import collections
+import itertools
+import math
+import sys
+
+import gmcdecode
+from gmcdecode import KIND_COUNT, KIND_COUNT2, KIND_TIME
+
+
+Alert = collections.namedtuple('Alert', 'time count kind score baseline')
+
+ALPHA = 1e-6    # poisson: false alarm probability per sample
+CUSUM_K = 0.5   # cusum: allowance, in standard deviations
+CUSUM_H = 10.0  # cusum: alarm level, in standard deviations
+ZMAX = 5.0      # zscore: alarm level
+WINDOW = 60     # zscore: samples
+WARMUP = 10     # samples before the first alert
+SMOOTH = 0.02   # baseline: weight of new sample
+
+
+def _zscore(alpha):
+    # z with normal upper tail probability alpha (bisection of erfc)
+    lo, hi = 0.0, 40.0
+    for _ in xrange(60):
+        z = (lo + hi) / 2
+        if 0.5 * math.erfc(z / math.sqrt(2)) > alpha:
+            lo = z
+        else:
+            hi = z
+    return hi
+
+
+class _Quantiles(dict):
+    # smallest k with P(X >= k) < alpha for X ~ Poisson(rate), by int(rate)
+    def __init__(self, alpha):
+        dict.__init__(self)
+        self.alpha = alpha
+        self.z = _zscore(alpha)
+
+    def __missing__(self, lam):
+        lam = max(lam, 1)
+        if lam > 500:
+            # normal approximation, continuity corrected
+            k = int(math.ceil(lam + self.z * math.sqrt(lam) + 0.5))
+        else:
+            # exact: sum pmf until the tail is small enough
+            p = math.exp(-lam)
+            cdf = p
+            k = 0
+            while 1.0 - cdf >= self.alpha and k < 10 * lam + 100:
+                k += 1
+                p *= float(lam) / k
+                cdf += p
+            k += 1
+        self[lam] = k
+        return k
+
+
+class Detector(object):
+    """Poisson threshold, CUSUM and rolling z-score on a stream of counts"""
+
+    def __init__(self, callback=None, alpha=ALPHA, k=CUSUM_K, h=CUSUM_H,
+                 zmax=ZMAX, window=WINDOW, warmup=WARMUP, smooth=SMOOTH):
+        self.callback = callback
+        self.quantile = _Quantiles(alpha)
+        self.k = k
+        self.h = h
+        self.zmax = zmax
+        self.window = window
+        self.warmup = warmup
+        self.smooth = smooth
+        self.reset()
+
+    def reset(self):
+        """Forget the baseline, e.g. after a change of interval (CPS/CPM/CPH)"""
+        self.n = 0
+        self.rate = 0.0
+        self.cusum = 0.0
+        self.ring = collections.deque()
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.alarmed = set()    # tests in alarm state
+
+    def _alert(self, kind, t, x, score):
+        # report on entering the alarm state only
+        if kind in self.alarmed:
+            return None
+        self.alarmed.add(kind)
+        a = Alert(t, x, kind, score, self.rate)
+        if self.callback:
+            self.callback(a)
+        return a
+
+    def update(self, t, x):
+        """Next sample: time t (epoch sec), count x; returns list of new alerts"""
+        alerts = []
+        n = self.n
+        if n >= self.warmup:
+            rate = max(self.rate, 1.0)
+            sd = math.sqrt(rate)
+            hit = False
+            # poisson
+            if x >= self.quantile[int(rate)]:
+                a = self._alert('poisson', t, x, (x - rate) / sd)
+                hit = True
+            else:
+                self.alarmed.discard('poisson')
+                a = None
+            if a:
+                alerts.append(a)
+            # cusum
+            self.cusum = max(0.0, self.cusum + (x - rate) / sd - self.k)
+            if self.cusum > self.h:
+                a = self._alert('cusum', t, x, self.cusum)
+                if a:
+                    alerts.append(a)
+                hit = True
+            elif self.cusum == 0.0:
+                self.alarmed.discard('cusum')
+            # rolling z-score, spread at least Poisson
+            m = len(self.ring)
+            if m:
+                mean = self.sum / m
+                var = max(self.sumsq / m - mean * mean, mean, 1.0)
+                z = (x - mean) / math.sqrt(var)
+                if z > self.zmax:
+                    a = self._alert('zscore', t, x, z)
+                    if a:
+                        alerts.append(a)
+                    hit = True
+                else:
+                    self.alarmed.discard('zscore')
+            if hit or self.alarmed:
+                # keep the baseline of normal data
+                self.n = n + 1
+                return alerts
+        # learn
+        if n == 0:
+            self.rate = float(x)
+        elif n < self.warmup:
+            self.rate += (x - self.rate) / (n + 1)
+        else:
+            self.rate += self.smooth * (x - self.rate)
+        self.ring.append(x)
+        self.sum += x
+        self.sumsq += x * x
+        if len(self.ring) > self.window:
+            y = self.ring.popleft()
+            self.sum -= y
+            self.sumsq -= y * y
+        self.n = n + 1
+        return alerts
+
+
+def replay(rb, detector):
+    """Feed decoded records (gmcdecode.RecordBatch) into detector
+
+    The baseline is reset at time tags which change the interval.
+    Returns list of all alerts.
+    """
+    alerts = []
+    idcpm = None
+    update = detector.update
+    for t, c, kind in itertools.izip(rb.epochs(), rb.counts, rb.kinds):
+        if kind == KIND_COUNT or kind == KIND_COUNT2:
+            alerts.extend(update(t, c))
+        elif kind == KIND_TIME and c != idcpm:
+            # count field of a time tag: interval mode
+            idcpm = c
+            detector.reset()
+    return alerts
+
+
+def describe(a):
+    return "* ALERT {:%Y-%m-%d %H:%M:%S} {:s}: count {:d}, baseline {:.1f}, score {:.1f}".format(
+        gmcdecode.fromepoch(a.time), a.kind, a.count, a.baseline, a.score)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+    opts = dict(zip(('alpha', 'h', 'zmax'), [float(v) for v in sys.argv[2:5]]))
+    with open(sys.argv[1], 'rb') as f:
+        data = f.read()
+    if sys.argv[1].endswith('.gmcz'):
+        import gmccodec
+        data = gmccodec.decompress(data)
+    for a in replay(gmcdecode.decode(data), Detector(**opts)):
+        print describe(a)
@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Cache of decoded data (gmcdecode.RecordBatch)
+
+Key: SHA1 of the raw data and the decode options. The cache in memory
+keeps the most recently used results up to MAXBYTES (least recently
+used are dropped first). With a directory set (use_disk()), results are
+saved there as well and found again in the next session.
+
+Cached results are shared: callers must not change them.
+'''
+
+# versions:
+# vers 2017-04: first version
+
+import array
+import collections
+import hashlib
+import marshal
+import os
+
+import gmcdecode
+import gmcprof
+from gmcdecode import TSTART
+
+
+MAXBYTES = 256 << 20   # memory for cached arrays
+DISKDIR = os.path.expanduser('~/.cache/gmc_datalogger')
+_FIELDS = ('times', 'counts', 'kinds', 'offsets')
+
+
+def key(data, start=0, end=None, tstart=TSTART, idcpm=2):
+    """Cache key of data and decode options"""
+    if end is None:
+        end = len(data)
+    return '{:s}-{:d}-{:d}-{:d}-{:d}'.format(hashlib.sha1(data).hexdigest(), start, end, tstart, idcpm)
+
+
+def size(rb):
+    """Approximate memory of rb in bytes"""
+    return rb.nbytes()
+
+
+def _save(fn, rb):
+    d = dict((f, (getattr(rb, f).typecode, getattr(rb, f).tostring())) for f in _FIELDS)
+    d['tags'] = rb.tags
+    d['tbase'] = TSTART    # times are seconds since TSTART
+    d['tnext'] = rb.tnext
+    d['idcpm'] = rb.idcpm
+    tmp = fn + '.tmp'
+    with open(tmp, 'wb') as f:
+        marshal.dump(d, f)
+    os.rename(tmp, fn)
+
+
+def _load(fn):
+    with open(fn, 'rb') as f:
+        d = marshal.load(f)
+    if d['tbase'] != TSTART:
+        # KeyError: saved by an older version (epoch times), decoded again
+        raise ValueError("other time base")
+    rb = gmcdecode.RecordBatch()
+    for name in _FIELDS:
+        code, s = d[name]
+        a = array.array(code)
+        a.fromstring(s)
+        setattr(rb, name, a)
+    rb.tags = d['tags']
+    rb.tnext = d['tnext']
+    rb.idcpm = d['idcpm']
+    return rb
+
+
+class LRUCache(object):
+    """Decoded results by key, least recently used dropped above maxbytes"""
+
+    def __init__(self, maxbytes=MAXBYTES, directory=None):
+        self.maxbytes = maxbytes
+        self.directory = directory
+        self.items = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = self.diskhits = self.misses = 0
+
+    def get(self, k):
+        rb = self.items.pop(k, None)
+        if rb is not None:
+            self.items[k] = rb    # most recent at the end
+            self.hits += 1
+            return rb
+        if self.directory:
+            try:
+                rb = _load(os.path.join(self.directory, k))
+            except (IOError, OSError, EOFError, ValueError, TypeError, KeyError):
+                rb = None
+            if rb is not None:
+                self.diskhits += 1
+                self._keep(k, rb)
+                return rb
+        self.misses += 1
+        return None
+
+    def _keep(self, k, rb):
+        n = size(rb)
+        if n > self.maxbytes:
+            return
+        self.items[k] = rb
+        self.bytes += n
+        while self.bytes > self.maxbytes:
+            _, old = self.items.popitem(last=False)
+            self.bytes -= size(old)
+
+    def put(self, k, rb):
+        if k in self.items:
+            self.bytes -= size(self.items.pop(k))
+        self._keep(k, rb)
+        if self.directory:
+            try:
+                if not os.path.isdir(self.directory):
+                    os.makedirs(self.directory)
+                _save(os.path.join(self.directory, k), rb)
+            except (IOError, OSError):
+                # no disk cache, memory only
+                pass
+
+    def clear(self):
+        self.items.clear()
+        self.bytes = 0
+
+    def decode(self, data, decoder=None):
+        """gmcdecode.decode(data), from cache if decoded before
+
+        decoder: function data -> RecordBatch with the default options,
+        e.g. gmcparallel.decode
+        """
+        with gmcprof.timer('cache.key', len(data)):
+            k = key(data)
+        rb = self.get(k)
+        if rb is None:
+            rb = (decoder or gmcdecode.decode)(data)
+            self.put(k, rb)
+        return rb
+
+
+cache = LRUCache()
+
+
+def use_disk(directory=DISKDIR):
+    """Save decoded results in directory too (None: memory only)"""
+    cache.directory = directory
+
+
+def decode(data, decoder=None):
+    """Decoded data from the global cache (shared, do not change)"""
+    return cache.decode(data, decoder)
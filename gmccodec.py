@@ -0,0 +1,308 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Compressed archive format for raw dumps (.gmcz)
+
+The dump is split by the marker structure (gmcdecode.markers) into
+three streams per frame of about 64k raw bytes:
+    structure:  token list, time tags and ID tags verbatim
+    counts:     one byte counts, as they are or as zigzag varint deltas
+                (whichever compresses better)
+    counts2:    double byte counts (55 AA 01 DH DL) as zigzag varint
+                deltas to the previous double byte count
+Each stream is deflated on its own; counts with Huffman coding only,
+since Poisson noise has no repeated strings for LZ77 to find. Trailing
+0xff bytes (erased flash) are stored only as their number.
+Decompression restores the dump bit by bit (checked by CRC32).
+
+File layout:
+    "GMCZ" version varint(size) varint(trailing 0xff) crc32 (4 bytes)
+    frames: varint(raw length) mode varint(len1) varint(len2) varint(len3)
+            structure counts counts2;  raw length 0 ends
+Structure tokens:
+    0 n             n one byte counts
+    1               double byte count
+    2 n bytes       verbatim (time tag, ID tag)
+
+iterchunks() yields the dump frame by frame; decode() feeds these parts
+into gmcdecode without joining them to one buffer.
+
+Usage:
+    gmccodec.py c DUMPFILE [ARCHIVE]    compress (default: DUMPFILE.gmcz)
+    gmccodec.py x ARCHIVE [DUMPFILE]    decompress
+'''
+
+# versions:
+# vers 2017-04: first version
+
+import struct
+import sys
+import zlib
+from operator import sub
+
+import gmcdecode
+from gmcdecode import KIND_COUNT2
+
+
+MAGIC = 'GMCZ'
+VERSION = 1
+FRAMESIZE = 1 << 16   # raw bytes per frame
+TOK_COUNTS, TOK_COUNT2, TOK_RAW = 0, 1, 2
+MODE_RAW, MODE_DELTA = 0, 1
+
+
+def varint(n):
+    """LEB128 of n >= 0"""
+    out = []
+    while n > 0x7f:
+        out.append(chr(n & 0x7f | 0x80))
+        n >>= 7
+    out.append(chr(n))
+    return ''.join(out)
+
+
+def zigzag(d):
+    return d << 1 if d >= 0 else (-d << 1) - 1
+
+
+def unzigzag(z):
+    return z >> 1 if not z & 1 else -((z + 1) >> 1)
+
+
+class _Deltas(dict):
+    # varint(zigzag(delta)), computed on first use
+    def __missing__(self, d):
+        v = self[d] = varint(zigzag(d))
+        return v
+
+
+_DELTA = _Deltas()
+
+
+def _readvarint(buf, i):
+    n = shift = 0
+    while True:
+        b = buf[i]
+        i += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, i
+        shift += 7
+
+
+def _freadvarint(f):
+    n = shift = 0
+    while True:
+        c = f.read(1)
+        if not c:
+            raise ValueError("truncated archive")
+        b = ord(c)
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n
+        shift += 7
+
+
+def _deflate(s, strategy=zlib.Z_DEFAULT_STRATEGY):
+    c = zlib.compressobj(9, zlib.DEFLATED, -15, 9, strategy)
+    return c.compress(s) + c.flush()
+
+
+def _inflate(s):
+    return zlib.decompress(s, -15)
+
+
+class _Frames(object):
+    # collects the streams, cut into frames of about FRAMESIZE raw bytes
+    def __init__(self, out):
+        self.out = out
+        self.prev2 = 0   # last double byte count, over all frames
+        self.clear()
+
+    def clear(self):
+        self.struct = []
+        self.counts = []
+        self.counts2 = []
+        self.raw = 0
+
+    def add(self, rawlen):
+        self.raw += rawlen
+        if self.raw >= FRAMESIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.raw:
+            return
+        counts = ''.join(self.counts)
+        v = list(bytearray(counts))
+        # delta coding pays off for smooth data only, not for Poisson noise
+        plain = _deflate(counts, zlib.Z_HUFFMAN_ONLY)
+        delta = _deflate(''.join(map(_DELTA.__getitem__, map(sub, v, ([0] + v)[:len(v)]))))
+        if len(delta) < len(plain):
+            mode, counts = MODE_DELTA, delta
+        else:
+            mode, counts = MODE_RAW, plain
+        st = _deflate(''.join(self.struct))
+        c2 = _deflate(''.join(self.counts2))
+        self.out.append(varint(self.raw) + chr(mode) + varint(len(st)) + varint(len(counts)) +
+                        varint(len(c2)) + st + counts + c2)
+        self.clear()
+
+
+def compress(data):
+    """Compress raw dump data, returns archive as str"""
+    if not isinstance(data, bytearray):
+        data = bytearray(data)
+    size = len(data)
+    out = []
+    fr = _Frames(out)
+
+    def counts(a, b):
+        # one byte counts data[a:b], in pieces of at most FRAMESIZE
+        for i in xrange(a, b, FRAMESIZE):
+            j = min(b, i + FRAMESIZE)
+            fr.struct.append(chr(TOK_COUNTS) + varint(j - i))
+            fr.counts.append(str(data[i:j]))
+            fr.add(j - i)
+
+    dp = 0
+    for p, kind, nxt, value in gmcdecode.markers(data):
+        if p > dp:
+            counts(dp, p)
+        if kind == KIND_COUNT2:
+            fr.struct.append(chr(TOK_COUNT2))
+            fr.counts2.append(_DELTA[value - fr.prev2])
+            fr.prev2 = value
+            fr.add(5)
+        else:
+            fr.struct.append(chr(TOK_RAW) + varint(nxt - p) + str(data[p:nxt]))
+            fr.add(nxt - p)
+        dp = nxt
+    # erased flash at the end (not part of a marker)
+    end = max(len(data.rstrip('\xff')), dp)
+    if end > dp:
+        counts(dp, end)
+    fr.flush()
+    head = varint(size) + varint(size - end) + struct.pack('>I', zlib.crc32(str(data)) & 0xffffffff)
+    return MAGIC + chr(VERSION) + head + ''.join(out) + varint(0)
+
+
+def _undelta(buf):
+    # one byte counts from zigzag varint deltas
+    out = bytearray()
+    append = out.append
+    prev = i = 0
+    n = len(buf)
+    while i < n:
+        z = buf[i]
+        i += 1
+        if z >= 0x80:
+            z, i = _readvarint(buf, i - 1)
+        prev += z >> 1 if not z & 1 else -((z + 1) >> 1)
+        append(prev)
+    return out
+
+
+def _frame(rawlen, mode, st, counts, c2, prev2):
+    # raw bytes of one frame; returns raw, last double byte count
+    st = bytearray(_inflate(st))
+    counts = _inflate(counts)
+    if mode == MODE_DELTA:
+        counts = _undelta(bytearray(counts))
+    c2 = bytearray(_inflate(c2))
+    raw = bytearray()
+    extend = raw.extend
+    i = ci = c2i = 0
+    n = len(st)
+    while i < n:
+        tok = st[i]
+        if tok == TOK_COUNTS:
+            k, i = _readvarint(st, i + 1)
+            extend(counts[ci:ci + k])
+            ci += k
+        elif tok == TOK_COUNT2:
+            z, c2i = _readvarint(c2, c2i)
+            prev2 += unzigzag(z)
+            extend('\x55\xaa\x01')
+            extend(struct.pack('>H', prev2))
+            i += 1
+        else:
+            k, i = _readvarint(st, i + 1)
+            extend(st[i:i + k])
+            i += k
+    if len(raw) != rawlen:
+        raise ValueError("corrupt archive frame")
+    return raw, prev2
+
+
+def iterchunks(f):
+    """Yield the raw dump of archive file object f in parts
+
+    Parts end at marker boundaries, so each may be decoded on its own
+    with the decoder state of the previous one.
+    """
+    if f.read(4) != MAGIC:
+        raise ValueError("not a GMCZ archive")
+    if f.read(1) != chr(VERSION):
+        raise ValueError("unknown GMCZ version")
+    size = _freadvarint(f)
+    tail = _freadvarint(f)
+    crc0 = struct.unpack('>I', f.read(4))[0]
+    crc = 0
+    prev2 = 0
+    while True:
+        rawlen = _freadvarint(f)
+        if not rawlen:
+            break
+        mode = ord(f.read(1))
+        l1 = _freadvarint(f)
+        l2 = _freadvarint(f)
+        l3 = _freadvarint(f)
+        raw, prev2 = _frame(rawlen, mode, f.read(l1), f.read(l2), f.read(l3), prev2)
+        crc = zlib.crc32(str(raw), crc)
+        yield raw
+    for i in xrange(0, tail, FRAMESIZE):
+        ff = bytearray('\xff') * min(FRAMESIZE, tail - i)
+        crc = zlib.crc32(str(ff), crc)
+        yield ff
+    if crc & 0xffffffff != crc0:
+        raise ValueError("archive CRC error")
+
+
+def decompress(arc):
+    """Archive str -> raw dump str"""
+    import StringIO
+    return ''.join(str(c) for c in iterchunks(StringIO.StringIO(arc)))
+
+
+def decode(fn):
+    """Decode archive file fn part by part; same result as decoding the dump"""
+    rb = gmcdecode.RecordBatch()
+    pos = 0
+    with open(fn, 'rb') as f:
+        for raw in iterchunks(f):
+            part = gmcdecode.decode(raw, 0, len(raw), rb.tnext, rb.idcpm)
+            rb.extend(part, pos)
+            pos += len(raw)
+    return rb
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (3, 4) or sys.argv[1] not in ('c', 'x'):
+        print __doc__
+        sys.exit(1)
+    src = sys.argv[2]
+    if sys.argv[1] == 'c':
+        dst = sys.argv[3] if len(sys.argv) > 3 else src + '.gmcz'
+        with open(src, 'rb') as f:
+            data = f.read()
+        arc = compress(data)
+        with open(dst, 'wb') as f:
+            f.write(arc)
+        print "{:d} -> {:d} bytes ({:s})".format(len(data), len(arc), dst)
+    else:
+        dst = sys.argv[3] if len(sys.argv) > 3 else src[:-5] if src.endswith('.gmcz') else src + '.bin'
+        with open(src, 'rb') as f, open(dst, 'wb') as g:
+            for raw in iterchunks(f):
+                g.write(raw)
@@ -0,0 +1,468 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Decode GMC history data into arrays
+
+Same format rules as analyse() in gmcparse5/gmcparse6, but instead of
+formatted strings the result is a set of parallel arrays (time, count,
+kind, offset). Formatting is left to gmcwrite.
+'''
+
+# versions:
+# vers 2017-04: split from analyse()
+# vers 2017-04: 32 bit arrays, Record views, slicing, concat, NumPy views
+# vers 2017-04: times relative to TSTART (all device years), 16 bit counts
+
+import array
+import bisect
+import calendar
+import datetime
+import itertools
+import operator
+
+import gmcprof
+
+
+# record kinds
+KIND_COUNT = 0   # one byte count
+KIND_COUNT2 = 1  # 55 AA 01 DH DL
+KIND_TIME = 2    # time tag, count holds interval mode (id_cpm)
+KIND_TAG = 3     # 55 AA 02 len str, count holds index into tags
+
+# seconds per record for interval mode 0,1,2,3: off, sec, min, hour
+TICKS = (0, 1, 60, 3600)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+# arbitrary time as init value (< 2000), as in analyse()
+TSTART = calendar.timegm((1950, 1, 22, 11, 12, 13))
+
+# array type codes, 11 bytes per record
+TIMECODE = 'I'     # seconds since TSTART, 32 bit: up to 2086
+COUNTCODE = 'H'    # up to 65535 (double byte counts)
+KINDCODE = 'b'
+OFFSETCODE = 'I'
+FIELDS = ('times', 'counts', 'kinds', 'offsets')
+CODES = (TIMECODE, COUNTCODE, KINDCODE, OFFSETCODE)
+
+# values which do not fit (times after 2086, more than 65535 ID tags)
+# make the array wider: H -> I -> d (exact for integers up to 2**53)
+_RANGE = {'H': (0, 0xffff), 'I': (0, 0xffffffff)}
+_WIDER = {'H': 'I', 'I': 'd'}
+_RANK = {'b': 0, 'H': 1, 'I': 2, 'd': 3}
+
+
+def epoch(dt):
+    """Seconds since 1970 of a naive device time (no time zone, no DST)"""
+    return calendar.timegm(dt.timetuple())
+
+
+def fromepoch(t):
+    """Naive datetime of epoch seconds"""
+    return EPOCH + datetime.timedelta(seconds=t)
+
+
+def fitcode(code, lo, hi):
+    """Type code code, or a wider one if needed for values lo..hi"""
+    while code in _RANGE and not (_RANGE[code][0] <= lo and hi <= _RANGE[code][1]):
+        code = _WIDER[code]
+    return code
+
+
+def _fit(a, lo, hi):
+    # a, or a wider copy of a for values lo..hi
+    code = fitcode(a.typecode, lo, hi)
+    return a if code == a.typecode else array.array(code, a)
+
+
+def _tlimits(times):
+    # epoch seconds which fit into the times array
+    if times.typecode in _RANGE:
+        lo, hi = _RANGE[times.typecode]
+        return TSTART + lo, TSTART + hi
+    return float('-inf'), float('inf')
+
+
+def parsetime(s):
+    """Epoch seconds of 'YYYY-MM-DD HH:MM:SS', 'YYYY-MM-DD HH:MM' or 'YYYY-MM-DD'"""
+    s = s.strip()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return epoch(datetime.datetime.strptime(s, fmt))
+        except ValueError:
+            pass
+    raise ValueError("time not in format YYYY-MM-DD HH:MM:SS: " + s)
+
+
+class RecordBatch(object):
+    """Decoded records as parallel arrays
+
+    times:   seconds since TSTART (device time); time(i), epochs() and
+             bisect_left/right() work in epoch seconds
+    counts:  count value; interval mode for time tags; tags index for ID tags
+    kinds:   KIND_*
+    offsets: position of the record in the raw data
+    tags:    ID tag strings
+    tnext, idcpm: decoder state after the last record
+
+    11 bytes per record (CODES), e.g. 11 MB for 1M records; times and
+    counts become wider only if a value does not fit. rb[i] is a Record
+    view of one record, rb[i:j] a new RecordBatch.
+    """
+
+    __slots__ = FIELDS + ('tags', 'tnext', 'idcpm')
+
+    def __init__(self):
+        self.times = array.array(TIMECODE)
+        self.counts = array.array(COUNTCODE)
+        self.kinds = array.array(KINDCODE)
+        self.offsets = array.array(OFFSETCODE)
+        self.tags = []
+        self.tnext = TSTART
+        self.idcpm = 2
+
+    def __getstate__(self):
+        # pickle (gmcparallel) of a class with __slots__; arrays as bytes,
+        # Python 2 pickles an array as a list of numbers (slow, 6 x larger)
+        return tuple((getattr(self, f).typecode, getattr(self, f).tostring()) if f in FIELDS
+                     else getattr(self, f) for f in self.__slots__)
+
+    def __setstate__(self, state):
+        for f, v in zip(self.__slots__, state):
+            if f in FIELDS:
+                a = array.array(v[0])
+                a.fromstring(v[1])
+                v = a
+            setattr(self, f, v)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step == 1:
+                return self.slice(start, stop)
+            rb = self.slice(0, 0)
+            for f in FIELDS:
+                setattr(rb, f, getattr(self, f)[i])
+            return rb
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("record index out of range")
+        return Record(self, i)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield Record(self, i)
+
+    def __add__(self, other):
+        return concat([self, other])
+
+    def time(self, i):
+        """Epoch seconds of record i"""
+        return int(self.times[i]) + TSTART
+
+    def epochs(self, i=0, j=None):
+        """Iterator of the epoch seconds of records i..j-1"""
+        ts = itertools.islice(self.times, i, j)
+        if self.times.typecode == 'd':
+            return (int(t) + TSTART for t in ts)
+        return itertools.imap(operator.add, ts, itertools.repeat(TSTART))
+
+    def bisect_left(self, t, lo=0, hi=None):
+        """Index of the first record at or after epoch t (times ascending in lo..hi)"""
+        return bisect.bisect_left(self.times, t - TSTART, lo, len(self) if hi is None else hi)
+
+    def bisect_right(self, t, lo=0, hi=None):
+        """Index of the first record after epoch t (times ascending in lo..hi)"""
+        return bisect.bisect_right(self.times, t - TSTART, lo, len(self) if hi is None else hi)
+
+    def append(self, t, count, kind=KIND_COUNT, offset=0):
+        """Add one record at epoch t"""
+        lo, hi = _tlimits(self.times)
+        if not lo <= t <= hi:
+            self.times = _fit(self.times, t - TSTART, t - TSTART)
+        if count > _RANGE.get(self.counts.typecode, (0, count))[1]:
+            self.counts = _fit(self.counts, 0, count)
+        self.times.append(t - TSTART)
+        self.counts.append(count)
+        self.kinds.append(kind)
+        self.offsets.append(offset)
+
+    def nbytes(self):
+        """Memory of the arrays and tags in bytes"""
+        return sum(len(getattr(self, f)) * getattr(self, f).itemsize for f in FIELDS) + \
+            sum(len(t) for t in self.tags)
+
+    def timetags(self):
+        """Number of time tags found"""
+        return self.kinds.count(KIND_TIME)
+
+    def slice(self, i, j):
+        """New RecordBatch with records i..j-1 (tags table shared)"""
+        rb = RecordBatch()
+        rb.times = self.times[i:j]
+        rb.counts = self.counts[i:j]
+        rb.kinds = self.kinds[i:j]
+        rb.offsets = self.offsets[i:j]
+        rb.tags = self.tags
+        rb.tnext = self.tnext
+        rb.idcpm = self.idcpm
+        return rb
+
+    def extend(self, other, base=0):
+        """Append records of other; base is added to its offsets
+
+        Only the ID tags used by the records of other are taken over
+        (other may be a slice sharing a larger tags table).
+        """
+        n = len(self.kinds)
+        for f in FIELDS:
+            a, b = getattr(self, f), getattr(other, f)
+            if f == 'offsets' and base:
+                b = array.array(b.typecode, [o + base for o in b])
+            if a.typecode != b.typecode:
+                # the wider type for both
+                if _RANK[a.typecode] < _RANK[b.typecode]:
+                    a = array.array(b.typecode, a)
+                    setattr(self, f, a)
+                else:
+                    b = array.array(a.typecode, b)
+            a.extend(b)
+        if other.tags:
+            # renumber ID tags
+            ks = other.kinds.tostring()
+            used = []
+            i = ks.find(chr(KIND_TAG))
+            while i >= 0:
+                used.append(i)
+                i = ks.find(chr(KIND_TAG), i + 1)
+            new = {}
+            for i in used:
+                k = other.counts[i]
+                if k not in new:
+                    new[k] = len(self.tags)
+                    self.tags.append(other.tags[k])
+            if self.tags:
+                self.counts = _fit(self.counts, 0, len(self.tags) - 1)
+            counts = self.counts
+            for i in used:
+                counts[n + i] = new[other.counts[i]]
+        self.tnext = other.tnext
+        self.idcpm = other.idcpm
+
+    def numpy(self):
+        """Dict of NumPy arrays over times, counts, kinds, offsets (no copies)
+
+        times are seconds since TSTART, as in the batch. The NumPy arrays
+        share the memory of the arrays of the batch: do not append to the
+        batch while they are used (its arrays may move).
+        """
+        import numpy
+        return dict((f, numpy.frombuffer(a, a.typecode) if len(a) else numpy.zeros(0, a.typecode))
+                    for f, a in ((f, getattr(self, f)) for f in FIELDS))
+
+
+class Record(object):
+    """View of record i of a RecordBatch"""
+
+    __slots__ = ('batch', 'i')
+
+    def __init__(self, batch, i):
+        self.batch = batch
+        self.i = i
+
+    @property
+    def time(self):
+        return self.batch.time(self.i)
+
+    @property
+    def count(self):
+        return self.batch.counts[self.i]
+
+    @property
+    def kind(self):
+        return self.batch.kinds[self.i]
+
+    @property
+    def offset(self):
+        return self.batch.offsets[self.i]
+
+    @property
+    def datetime(self):
+        return fromepoch(self.time)
+
+    @property
+    def tag(self):
+        """ID tag string, None for other kinds"""
+        if self.kind == KIND_TAG:
+            return self.batch.tags[self.count]
+        return None
+
+    def __repr__(self):
+        return "Record({:d}, {:d}, {:d}, {:d})".format(self.time, self.count, self.kind, self.offset)
+
+
+def concat(batches):
+    """New RecordBatch of all records of batches (offsets unchanged)"""
+    rb = RecordBatch()
+    for b in batches:
+        rb.extend(b)
+    return rb
+
+
+def fromnumpy(times, counts, kinds, offsets, tags=()):
+    """RecordBatch of NumPy (or other sequence) columns; copied once into arrays
+
+    times: seconds since TSTART, as given by RecordBatch.numpy()
+    """
+    rb = RecordBatch()
+    for f, code, a in zip(FIELDS, CODES, (times, counts, kinds, offsets)):
+        if len(a) and code in _RANGE:
+            code = fitcode(code, min(a), max(a))
+        if hasattr(a, 'astype'):
+            a = array.array(code, a.astype(code).tostring())
+        else:
+            a = array.array(code, a)
+        setattr(rb, f, a)
+    if len(rb.times) != len(rb.kinds) or len(rb.counts) != len(rb.kinds) or \
+            len(rb.offsets) != len(rb.kinds):
+        raise ValueError("columns of different length")
+    rb.tags = list(tags)
+    return rb
+
+
+def markers(data, start=0, end=None):
+    """Yield (pos, kind, next pos, value) for every valid 55 AA marker
+
+    value: (datetime, mode) for time tags, count for double bytes, string
+    for ID tags. Bytes between markers are one byte counts. Invalid or
+    truncated markers are not reported, i.e. treated as counting data.
+    """
+    if end is None:
+        end = len(data)
+    p = data.find('\x55\xaa', start, end)
+    while p >= 0:
+        nxt = p + 1
+        if p + 2 < end:
+            idk = data[p+2]
+            if idk == 0x00:
+                # date + time found (very likely)
+                if p + 11 < end and data[p+9] == 0x55 and data[p+10] == 0xaa:
+                    dsb = list(data[p+3:p+9])
+                    dsb[0] += 2000
+                    try:
+                        dt = datetime.datetime(*dsb)
+                    except ValueError:
+                        # no valid date: treat markers as counting data
+                        dt = None
+                    if dt:
+                        yield p, KIND_TIME, p + 12, (dt, data[p+11])
+                        nxt = p + 12
+            elif idk == 0x01:
+                if p + 4 < end:
+                    yield p, KIND_COUNT2, p + 5, data[p+3] << 8 | data[p+4]
+                    nxt = p + 5
+            elif idk == 0x02:
+                if p + 3 < end:
+                    strgl = data[p+3]
+                    nxt = min(p + 4 + strgl, end)
+                    yield p, KIND_TAG, nxt, str(data[p+4:nxt])
+        p = data.find('\x55\xaa', nxt, end)
+
+
+def decode(data, start=0, end=None, tstart=TSTART, idcpm=2, summary=None):
+    """Decode raw history data, returns RecordBatch
+
+    data:  str or bytearray as read from device or file
+    start, end: decode only this part of data
+    tstart, idcpm: decoder state at start (e.g. of a previous part)
+    summary: gmcsummary.Summary, fed with the segments while decoding
+    """
+    if not isinstance(data, bytearray):
+        data = bytearray(data)
+    if end is None:
+        end = len(data)
+    with gmcprof.timer('decode', end - start):
+        return _decode(data, start, end, tstart, idcpm, summary)
+
+
+def _decode(data, start, end, tstart, idcpm, summary=None):
+    rb = RecordBatch()
+    times, counts, kinds, offsets = rb.times, rb.counts, rb.kinds, rb.offsets
+    tlo, thi = _tlimits(times)
+    t = tstart
+    tick = TICKS[idcpm] if idcpm < 4 else 60
+    dp = start
+
+    for p, kind, nxt, value in markers(data, start, end):
+        n = p - dp
+        te = t + n * tick    # after the plain counts
+        tn = epoch(value[0]) if kind == KIND_TIME else te
+        if t < tlo or te > thi or tn < tlo or tn > thi:
+            # after 2086 (or before TSTART): wider times
+            rb.times = times = _fit(times, min(t, tn) - TSTART, max(te, tn) - TSTART)
+            tlo, thi = _tlimits(times)
+        if n > 0:
+            # plain one byte counts
+            run = data[dp:p]
+            counts.extend(run)
+            if summary is not None:
+                summary.counts(t, run)
+            r = t - TSTART
+            if tick:
+                times.extend(xrange(r, r + n * tick, tick))
+            else:
+                times.extend([r] * n)
+            offsets.extend(xrange(dp, p))
+            kinds.extend(array.array(KINDCODE, [KIND_COUNT]) * n)
+            t = te
+        if kind == KIND_COUNT2:
+            times.append(t - TSTART)
+            counts.append(value)
+            if summary is not None:
+                summary.counts(t, (value,))
+            t += tick
+        elif kind == KIND_TIME:
+            dt, mode = value
+            if mode < 4 and mode != idcpm:
+                idcpm = mode
+                tick = TICKS[idcpm]
+            t = tn
+            times.append(t - TSTART)
+            counts.append(idcpm)
+            if summary is not None:
+                summary.timetag(t, mode, p)
+        else:
+            if summary is not None:
+                summary.tag(t, value, p)
+            times.append(t - TSTART)
+            if len(rb.tags) > 0xffff and counts.typecode == 'H':
+                rb.counts = counts = _fit(counts, 0, len(rb.tags))
+            counts.append(len(rb.tags))
+            rb.tags.append(value)
+        kinds.append(kind)
+        offsets.append(p)
+        dp = nxt
+
+    n = end - dp
+    if n > 0:
+        if not (tlo <= t and t + n * tick <= thi):
+            rb.times = times = _fit(times, t - TSTART, t + n * tick - TSTART)
+        run = data[dp:end]
+        counts.extend(run)
+        if summary is not None:
+            summary.counts(t, run)
+        r = t - TSTART
+        if tick:
+            times.extend(xrange(r, r + n * tick, tick))
+        else:
+            times.extend([r] * n)
+        offsets.extend(xrange(dp, end))
+        kinds.extend(array.array(KINDCODE, [KIND_COUNT]) * n)
+        t += n * tick
+    rb.tnext = t
+    rb.idcpm = idcpm
+    return rb
@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Search in decoded records (gmcdecode.RecordBatch) by prebuilt indexes
+
+    time index:   record numbers sorted by time
+    count index:  count records sorted by count
+    tag index:    ID tag string -> segments (ID tag up to the next ID tag)
+A query combines time window, count range and tag text. The most
+selective criterion is looked up in its index (binary search), the
+others are checked on these records only.
+'''
+
+# versions:
+# vers 2017-04: first version
+
+import array
+import bisect
+import itertools
+
+import gmcdecode
+from gmcdecode import KIND_COUNT, KIND_COUNT2, KIND_TAG, TSTART
+
+
+class RecordIndex(object):
+    """Indexes of one RecordBatch"""
+
+    def __init__(self, rb):
+        self.rb = rb
+        n = len(rb)
+        times = rb.times
+        # time: usually ascending already (unless the clock was set back)
+        if all(itertools.imap(lambda a, b: a <= b, times[:-1], times[1:])):
+            self.byt = array.array('l', xrange(n))
+            self.tsorted = times
+        else:
+            self.byt = array.array('l', sorted(xrange(n), key=times.__getitem__))
+            self.tsorted = array.array(times.typecode, [times[i] for i in self.byt])
+        # count: count records only
+        kinds = rb.kinds
+        cnt = [i for i in xrange(n) if kinds[i] == KIND_COUNT or kinds[i] == KIND_COUNT2]
+        cnt.sort(key=rb.counts.__getitem__)
+        self.byc = array.array('l', cnt)
+        self.csorted = array.array('l', [rb.counts[i] for i in cnt])
+        # tags: segment k starts at record tagpos[k]
+        self.tagpos = array.array('l', [i for i in xrange(n) if kinds[i] == KIND_TAG])
+        self.tagtext = {}
+        for k, i in enumerate(self.tagpos):
+            self.tagtext.setdefault(rb.tags[rb.counts[i]].lower(), []).append(k)
+
+    def _segments(self, text):
+        # numbers of segments whose ID tag contains text
+        text = text.lower()
+        segs = []
+        for t, ks in self.tagtext.iteritems():
+            if text in t:
+                segs.extend(ks)
+        return sorted(segs)
+
+    def query(self, tfrom=None, tto=None, cmin=None, cmax=None, tag=None):
+        """Record numbers (ascending) matching all given criteria
+
+        tfrom, tto: epoch sec; cmin, cmax: counts (count records only);
+        tag: part of ID tag text, case insensitive
+        """
+        rb = self.rb
+        cand = []    # (size, record numbers)
+        # times of the batch are seconds since TSTART
+        if tfrom is not None:
+            tfrom -= TSTART
+        if tto is not None:
+            tto -= TSTART
+        if tfrom is not None or tto is not None:
+            a = bisect.bisect_left(self.tsorted, tfrom) if tfrom is not None else 0
+            b = bisect.bisect_right(self.tsorted, tto) if tto is not None else len(self.tsorted)
+            cand.append((b - a, lambda: self.byt[a:b]))
+        if cmin is not None or cmax is not None:
+            c = bisect.bisect_left(self.csorted, cmin) if cmin is not None else 0
+            d = bisect.bisect_right(self.csorted, cmax) if cmax is not None else len(self.csorted)
+            cand.append((d - c, lambda: self.byc[c:d]))
+        segs = None
+        if tag:
+            segs = self._segments(tag)
+            bounds = [(self.tagpos[k], self.tagpos[k + 1] if k + 1 < len(self.tagpos) else len(rb))
+                      for k in segs]
+            cand.append((sum(e - s for s, e in bounds),
+                         lambda: itertools.chain.from_iterable(xrange(s, e) for s, e in bounds)))
+        if not cand:
+            return array.array('l', xrange(len(rb)))
+        cand.sort(key=lambda c: c[0])
+        found = cand[0][1]()
+        # check the other criteria
+        times, counts, kinds = rb.times, rb.counts, rb.kinds
+        checks = []
+        if tfrom is not None:
+            checks.append(lambda i: times[i] >= tfrom)
+        if tto is not None:
+            checks.append(lambda i: times[i] <= tto)
+        if cmin is not None or cmax is not None:
+            checks.append(lambda i: kinds[i] == KIND_COUNT or kinds[i] == KIND_COUNT2)
+        if cmin is not None:
+            checks.append(lambda i: counts[i] >= cmin)
+        if cmax is not None:
+            checks.append(lambda i: counts[i] <= cmax)
+        if segs is not None:
+            segset = set(segs)
+            tagpos = self.tagpos
+            checks.append(lambda i: bisect.bisect_right(tagpos, i) - 1 in segset)
+        out = array.array('l', sorted(i for i in found if all(c(i) for c in checks)))
+        return out
+
+
+def take(rb, rows):
+    """New RecordBatch of records rows (tags table shared)"""
+    out = gmcdecode.RecordBatch()
+    for name in gmcdecode.FIELDS:
+        a = getattr(rb, name)
+        setattr(out, name, array.array(a.typecode, [a[i] for i in rows]))
+    out.tags = rb.tags
+    return out
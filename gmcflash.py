@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Used part of the device flash memory
+
+The device writes the history from address 0 on; erased flash reads
+0xff. findend() finds the end of the data by binary search with small
+SPIR probes, so only the bytes in use need to be downloaded instead of
+whole 4096 byte pages up to the first erased page.
+
+spir: function (address, length) -> bytes, e.g.
+      lambda a, n: getSPIR(ser, a, n)
+A short or empty answer (timeout) is not taken as erased: the probe is
+repeated after PACE seconds, IOError after RETRIES failed probes.
+
+readHIST (gmcparse5/gmcparse6) reads the pages into one bytearray of the
+flash size (flashsize()) through memoryview slices, so a download needs
+one buffer and no copies; the bytearray is cut to the data in place.
+'''
+
+# versions:
+# vers 2017-04: first version
+# vers 2017-04: short probes repeated, not taken as erased
+
+import time
+
+
+FLASHSIZE = 1 << 16   # GMC-320
+MAXSIZE = 1 << 20     # GMC-320+ V5, GMC-500, GMC-600
+PAGE = 4096           # longest SPIR request
+PROBE = 16            # bytes per probe; 16 x 0xff do not occur in data
+RETRIES = 3           # probes repeated after a short answer
+PACE = 0.5            # seconds before a repeated probe (device pacing, see readHIST)
+
+
+def flashsize(version):
+    """Flash size of the device with GETVER answer version, e.g. 'GMC-320Re 4.20'"""
+    v = str(version).strip()
+    if v.startswith(('GMC-500', 'GMC-600', 'GMC-320Re 5')):
+        return MAXSIZE
+    return FLASHSIZE
+
+
+def erased(block):
+    """True if block is all 0xff"""
+    return block.count('\xff') == len(block)
+
+
+def readprobe(spir, address, n, retries=RETRIES, pace=PACE):
+    """n bytes at address; repeated if short, IOError if never complete"""
+    for i in xrange(retries + 1):
+        if i:
+            time.sleep(pace)
+        block = spir(address, n)
+        if len(block) >= n:
+            return block[:n]
+    raise IOError("no complete answer to {:d} byte probe at {:#x} ({:d} bytes)".format(
+        n, address, len(block)))
+
+
+def findend(spir, size=FLASHSIZE, probe=PROBE, retries=RETRIES, pace=PACE):
+    """Address after the last data byte: about log2(size/probe) probes
+
+    If the flash is full (or wrapped around) the result is size.
+    """
+    def read(address):
+        return readprobe(spir, address, probe, retries, pace)
+
+    if erased(read(0)):
+        return 0
+    # block lo is in use, block hi is erased (or the end)
+    lo, hi = 0, size // probe
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if erased(read(mid * probe)):
+            hi = mid
+        else:
+            lo = mid
+    # erased tail of the last block in use
+    return lo * probe + len(read(lo * probe).rstrip('\xff'))
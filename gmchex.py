@@ -0,0 +1,153 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Hex listing of raw data with annotated markers
+
+    00000000  55 aa 00 11 02 0e 15 14 0c 55 aa 02 43 15 13 0f  |U........U..C...|  time 2017-02-14 21:20:12 mode 2
+One row per 16 bytes: offset, hex, ASCII and the markers (gmcdecode.markers)
+starting in this row: time tag, double byte count, ID tag.
+
+The data are read and listed block by block, so memory does not grow
+with the file size; *.gmcz archives are listed as the raw dump.
+
+Usage:
+    gmchex.py FILE [START [END]]    offsets decimal or 0x hex
+'''
+
+# versions:
+# vers 2017-04: first version (was lstfile in gmcparse5, commented out)
+
+import itertools
+import sys
+
+import gmcdecode
+from gmcdecode import KIND_TIME, KIND_COUNT2
+
+
+WIDTH = 16          # bytes per row
+BLOCK = 1 << 16     # bytes listed per block
+OVER = 260          # longest marker: ID tag 55 AA 02 len + 255 chars
+_HEX = ['{:02x} '.format(i) for i in xrange(256)]
+_ASCII = ''.join(chr(i) if 32 <= i < 127 else '.' for i in xrange(256))
+_MODES = ('off', 'sec', 'min', 'hour')
+
+
+def offset(s):
+    """Offset from '1234' or '0x4d2'"""
+    return int(s, 0)
+
+
+def note(kind, value):
+    """Annotation of a marker"""
+    if kind == KIND_TIME:
+        dt, mode = value
+        return "time {:%Y-%m-%d %H:%M:%S} mode {:d}{:s}".format(
+            dt, mode, " (" + _MODES[mode] + ")" if mode < 4 else "")
+    if kind == KIND_COUNT2:
+        return "count2 {:d}".format(value)
+    return "tag {!r}".format(str(value))
+
+
+def _rows(buf, base, a, b, notes):
+    # rows of buf[a:b] (a row aligned), base: offset of buf[0]
+    hexs = map(_HEX.__getitem__, buf[a:b])
+    text = str(buf[a:b]).translate(_ASCII)
+    out = []
+    fill = 3 * WIDTH
+    for i in xrange(0, b - a, WIDTH):
+        pos = base + a + i
+        ln = "{:08x}  {:s} |{:s}|".format(pos, ''.join(hexs[i:i + WIDTH]).ljust(fill),
+                                          text[i:i + WIDTH])
+        if pos in notes:
+            ln += "  " + ", ".join(notes[pos])
+        out.append(ln + "\n")
+    return ''.join(out)
+
+
+def blocks(chunks, start=0, end=None):
+    """Yield listing text block by block
+
+    chunks: iterable of raw data parts, the first one at offset start
+    (start a multiple of WIDTH); end: offset to stop
+    """
+    buf = bytearray()
+    base = start
+    scan = 0         # first byte not part of a marker already reported
+    for chunk in itertools.chain(chunks, [None]):
+        final = chunk is None
+        if not final:
+            buf.extend(chunk)
+            if len(buf) < BLOCK + OVER:
+                continue
+        limit = len(buf) if final else len(buf) - OVER
+        if end is not None and base + limit >= end:
+            limit = max(end - base, 0)
+            final = True
+        if not final:
+            limit -= limit % WIDTH
+        # markers starting before limit, noted in their row
+        notes = {}
+        for p, kind, nxt, value in gmcdecode.markers(buf, scan):
+            if p >= limit:
+                break
+            notes.setdefault(base + p - p % WIDTH, []).append(
+                "@{:x} {:s}".format(base + p, note(kind, value)))
+            scan = nxt
+        for a in xrange(0, limit, BLOCK):
+            yield _rows(buf, base, a, min(a + BLOCK, limit), notes)
+        if final:
+            return
+        scan = max(scan, limit) - limit
+        del buf[:limit]
+        base += limit
+
+
+def _filechunks(f):
+    while True:
+        s = f.read(BLOCK)
+        if not s:
+            return
+        yield s
+
+
+def listfile(fn, out, start=0, end=None):
+    """Write listing of dump file fn (or *.gmcz archive) to file object out"""
+    start -= start % WIDTH
+    with open(fn, 'rb') as f:
+        if fn.endswith('.gmcz'):
+            import gmccodec
+            chunks = gmccodec.iterchunks(f)
+            if start:
+                chunks = _skip(chunks, start)
+        else:
+            f.seek(start)
+            chunks = _filechunks(f)
+        for blk in blocks(chunks, start, end):
+            out.write(blk)
+
+
+def _skip(chunks, n):
+    # drop the first n bytes of chunks
+    for c in chunks:
+        if n >= len(c):
+            n -= len(c)
+            continue
+        yield c[n:]
+        n = 0
+
+
+def listdata(data, out, start=0, end=None):
+    """Write listing of raw data (str/bytearray) to file object out"""
+    start -= start % WIDTH
+    for blk in blocks([data[start:end]] if end is not None else [data[start:]], start, end):
+        out.write(blk)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+    listfile(sys.argv[1], sys.stdout,
+             offset(sys.argv[2]) if len(sys.argv) > 2 else 0,
+             offset(sys.argv[3]) if len(sys.argv) > 3 else None)
@@ -0,0 +1,214 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Sidecar index of time tag segments of a dump file
+
+A segment starts at a time tag (55 AA 00 ... 55 AA mode) and ends before
+the next one; data before the first time tag is segment 0. The index is
+saved as JSON next to the dump (dump.bin -> dump.bin.idx), keyed by the
+SHA1 of the dump. A time window query reads and decodes only the
+segments it needs. Records decoded before (an archive has no index) are
+cut segment by segment too (window()), as the clock may be set back.
+
+Usage:
+    gmcindex.py DUMPFILE            build index and print segments
+'''
+
+# versions:
+# vers 2017-04: first version
+# vers 2017-04: query() may sum up the segments found
+# vers 2017-04: window() of decoded records, select() for dumps and archives
+
+import hashlib
+import json
+import os
+import sys
+
+import gmcdecode
+import gmcsummary
+from gmcdecode import KIND_TIME, KIND_TAG, TICKS, TSTART
+
+
+IDXVERSION = 1
+
+
+def sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def segments(data):
+    """List of segments of raw data, each a dict:
+
+    offset, end:  byte range; decode(data, offset, end, tstart, idcpm)
+                  gives the same records as the full decode
+    tstart, idcpm: decoder state at offset
+    mode:         interval mode (id_cpm) within the segment
+    first, last:  time of first and last count (epoch sec); time tag
+                  if there are no counts
+    records:      number of counts
+    tags:         number of ID tags
+    """
+    if not isinstance(data, bytearray):
+        data = bytearray(data)
+    segs = []
+    seg = {'offset': 0, 'tstart': TSTART, 'idcpm': 2, 'mode': 2, 'first': TSTART}
+    idcpm = 2
+    dp = 0
+    records = tags = 0
+
+    def close(end):
+        seg['end'] = end
+        seg['records'] = records
+        seg['tags'] = tags
+        seg['last'] = seg['first'] + max(records - 1, 0) * TICKS[seg['mode']]
+        segs.append(seg)
+
+    for p, kind, nxt, value in gmcdecode.markers(data):
+        records += p - dp
+        dp = nxt
+        if kind == KIND_TIME:
+            if p > 0:
+                close(p)
+            dt, mode = value
+            # the time tag sets the time, tstart is just for completeness
+            seg = {'offset': p, 'tstart': gmcdecode.epoch(dt), 'idcpm': idcpm}
+            if mode < 4:
+                idcpm = mode
+            seg['mode'] = idcpm
+            seg['first'] = seg['tstart']
+            records = tags = 0
+        elif kind == KIND_TAG:
+            tags += 1
+        else:
+            records += 1
+    records += len(data) - dp
+    close(len(data))
+    return segs
+
+
+def idxname(fn):
+    return fn + '.idx'
+
+
+def build(fn, data=None):
+    """Build and save index of dump file fn"""
+    if data is None:
+        with open(fn, 'rb') as f:
+            data = f.read()
+    st = os.stat(fn)
+    idx = {
+        'version': IDXVERSION,
+        'sha1': sha1(data),
+        'size': st.st_size,
+        'mtime': st.st_mtime,
+        'segments': segments(data),
+    }
+    try:
+        with open(idxname(fn), 'w') as f:
+            json.dump(idx, f)
+    except IOError:
+        # read only directory: index in memory only
+        pass
+    return idx
+
+
+def load(fn):
+    """Index of dump file fn: from sidecar if still valid, else rebuilt"""
+    try:
+        with open(idxname(fn)) as f:
+            idx = json.load(f)
+    except (IOError, ValueError):
+        return build(fn)
+    if idx.get('version') != IDXVERSION:
+        return build(fn)
+    st = os.stat(fn)
+    if idx['size'] == st.st_size and idx['mtime'] == st.st_mtime:
+        return idx
+    # touched: check content
+    with open(fn, 'rb') as f:
+        data = f.read()
+    if idx['sha1'] != sha1(data):
+        return build(fn, data)
+    idx['mtime'] = st.st_mtime
+    return idx
+
+
+def query(fn, tfrom=None, tto=None, summary=None):
+    """Records of dump file fn with tfrom <= time <= tto (epoch sec)
+
+    Only segments overlapping the window are read and decoded. Tags of
+    these segments are kept. Returns gmcdecode.RecordBatch.
+    summary: gmcsummary.Summary, gets the segments of the records found
+    (start and interval mode of a segment cut by the window are kept)
+    """
+    idx = load(fn)
+    rb = gmcdecode.RecordBatch()
+    with open(fn, 'rb') as f:
+        for seg in idx['segments']:
+            if (tto is not None and seg['first'] > tto) or \
+                    (tfrom is not None and seg['last'] < tfrom):
+                continue
+            f.seek(seg['offset'])
+            raw = f.read(seg['end'] - seg['offset'])
+            part = gmcdecode.decode(raw, 0, len(raw), seg['tstart'], seg['idcpm'])
+            # times are ascending within a segment
+            i = part.bisect_left(tfrom) if tfrom is not None else 0
+            j = part.bisect_right(tto) if tto is not None else len(part)
+            n = len(rb)
+            rb.extend(part.slice(i, j), seg['offset'])
+            if summary is not None:
+                gmcsummary.summarize(rb.slice(n, len(rb)), seg['mode'], summary)
+    if summary is not None:
+        summary.close()
+    return rb
+
+
+def window(rb, tfrom=None, tto=None, summary=None):
+    """Records of RecordBatch rb with tfrom <= time <= tto (epoch sec)
+
+    As query(), segment by segment: times ascend only between two time
+    tags (the clock may be set back, runs may overlap). For records
+    decoded before, e.g. of an archive, which has no index.
+    summary: as for query()
+    """
+    out = gmcdecode.RecordBatch()
+    ks = rb.kinds.tostring()
+    mark = chr(KIND_TIME)
+    idcpm = 2
+    a, n = 0, len(rb)
+    while a < n:
+        b = ks.find(mark, a + 1)
+        if b < 0:
+            b = n
+        if ks[a] == mark and rb.counts[a] < 4:
+            idcpm = rb.counts[a]
+        i = rb.bisect_left(tfrom, a, b) if tfrom is not None else a
+        j = rb.bisect_right(tto, a, b) if tto is not None else b
+        if i < j:
+            m = len(out)
+            out.extend(rb.slice(i, j))
+            if summary is not None:
+                gmcsummary.summarize(out.slice(m, len(out)), idcpm, summary)
+        a = b
+    if summary is not None:
+        summary.close()
+    return out
+
+
+def select(fn, tfrom=None, tto=None, summary=None):
+    """Time window of dump file fn: query(), or window() of a .gmcz archive"""
+    if fn.endswith('.gmcz'):
+        import gmccodec
+        return window(gmccodec.decode(fn), tfrom, tto, summary)
+    return query(fn, tfrom, tto, summary)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print __doc__
+        sys.exit(1)
+    for seg in load(sys.argv[1])['segments']:
+        print "{:8d} {:8d}  {:d}  {:%Y-%m-%d %H:%M:%S}  {:%Y-%m-%d %H:%M:%S} {:7d}".format(
+            seg['offset'], seg['end'], seg['mode'], gmcdecode.fromepoch(seg['first']),
+            gmcdecode.fromepoch(seg['last']), seg['records'])
@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Serial link statistics per device command
+
+For every command (GETCPM, GETDATETIME, SPIR, GETVER, ...):
+latency histogram, bytes requested/received, bytes per second,
+short reads, timeouts (nothing received) and retries.
+
+serialCOMM() in gmcparse5/gmcparse6 records into gmclink.stats,
+which may be read at any time: stats.snapshot() or stats.report().
+'''
+
+# versions:
+# vers 2017-04: first version
+
+
+# upper bounds of latency buckets in ms; last bucket: above
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def cmdname(sendtxt):
+    """Command name of e.g. '<GETCPM>>' or '<SPIR...>>'"""
+    if sendtxt.startswith('<SPIR'):
+        # binary address and length follow
+        return 'SPIR'
+    return sendtxt.strip('<>').split('>')[0]
+
+
+class CmdStats(object):
+    __slots__ = ('calls', 'seconds', 'maxsec', 'requested', 'received',
+                 'shortreads', 'timeouts', 'retries', 'hist')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.maxsec = 0.0
+        self.requested = 0
+        self.received = 0
+        self.shortreads = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.hist = [0] * (len(BUCKETS) + 1)
+
+    def bytespersec(self):
+        if self.seconds <= 0:
+            return 0.0
+        return self.received / self.seconds
+
+    def percentile(self, q):
+        """Upper bound in ms of the bucket containing quantile q (0..1)"""
+        n = sum(self.hist)
+        if not n:
+            return 0
+        k = 0
+        for i, h in enumerate(self.hist):
+            k += h
+            if k >= q * n:
+                return BUCKETS[i] if i < len(BUCKETS) else float('inf')
+
+    def asdict(self):
+        return {
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'max': self.maxsec,
+            'requested': self.requested,
+            'received': self.received,
+            'bytespersec': self.bytespersec(),
+            'shortreads': self.shortreads,
+            'timeouts': self.timeouts,
+            'retries': self.retries,
+            'histogram_ms': dict(zip([str(b) for b in BUCKETS] + ['more'], self.hist)),
+        }
+
+
+class LinkStats(object):
+    """Statistics of all commands sent over the serial link"""
+
+    def __init__(self):
+        self.cmds = {}
+
+    def get(self, cmd):
+        s = self.cmds.get(cmd)
+        if s is None:
+            s = self.cmds[cmd] = CmdStats()
+        return s
+
+    def record(self, cmd, seconds, requested, received):
+        """One write/read cycle of cmd; received < requested is a short read"""
+        s = self.get(cmd)
+        s.calls += 1
+        s.seconds += seconds
+        if seconds > s.maxsec:
+            s.maxsec = seconds
+        s.requested += requested
+        s.received += received
+        if received < requested:
+            s.shortreads += 1
+            if not received:
+                s.timeouts += 1
+        ms = seconds * 1000.0
+        i = 0
+        while i < len(BUCKETS) and ms > BUCKETS[i]:
+            i += 1
+        s.hist[i] += 1
+
+    def retry(self, cmd):
+        self.get(cmd).retries += 1
+
+    def reset(self):
+        self.cmds.clear()
+
+    def snapshot(self):
+        """{command: dict of counters}"""
+        return dict((k, v.asdict()) for k, v in self.cmds.items())
+
+    def report(self):
+        lines = ["{:12s} {:>6s} {:>8s} {:>8s} {:>8s} {:>9s} {:>5s} {:>5s} {:>5s}".format(
+            "command", "calls", "mean ms", "p90 ms", "max ms", "bytes/s", "short", "tmo", "retry")]
+        for k, v in sorted(self.cmds.items()):
+            lines.append("{:12s} {:6d} {:8.1f} {:>8} {:8.1f} {:9.0f} {:5d} {:5d} {:5d}".format(
+                k, v.calls, 1000.0 * v.seconds / max(v.calls, 1), v.percentile(0.9),
+                1000.0 * v.maxsec, v.bytespersec(), v.shortreads, v.timeouts, v.retries))
+        return "\n".join(lines)
+
+
+stats = LinkStats()
@@ -0,0 +1,273 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''GUI load test
+Runs GmcApp (gwcmain) without a screen and feeds it text lines, synthetic
+dumps and replayed live data of increasing size. Measured per step:
+
+  latency   lateness of a 10 ms timer: how long the event loop was blocked
+  frame     time to repaint the text widget
+  memory    resident memory and its growth since the start
+
+Without a display Xvfb is started (if installed); QT_QPA_PLATFORM=offscreen
+is set for Qt versions with platform plugins. With limits given the exit
+status is 1 if one is exceeded, e.g. to compare versions before a release.
+
+Usage:
+  gmcloadtest.py [options]
+
+Options:
+  --lines N,...        Lines written by writeplain [default: 1000,10000,50000]
+  --dumps N,...        Sizes of synthetic dumps processed, bytes [default: 65536,262144,1048576]
+  --live N,...         Samples of live data replayed [default: 100,1000,5000]
+  -j FILE, --json FILE Save results as JSON
+  --max-latency MS     Limit of the event loop latency
+  --max-frame MS       Limit of the frame time
+  --max-growth MB      Limit of the memory growth
+  --xvfb               Start Xvfb also if DISPLAY is set
+  -h --help            Show help
+'''
+
+# versions:
+# vers 2017-04: first version
+
+import atexit
+import datetime
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+from docopt import docopt
+
+
+TICK = 0.010     # latency probe interval, seconds
+BATCH = 500      # lines between repaints
+
+
+def synthetic(size, mode=2, seed=1):
+    """Dump of about size bytes: runs of random counts between time and ID tags"""
+    rnd = random.Random(seed)
+    tick = (0, 1, 60, 3600)[mode]
+    dt = datetime.datetime(2017, 3, 1, 12, 0, 0)
+    out = bytearray()
+    while len(out) < size:
+        out += bytearray([0x55, 0xaa, 0x00, dt.year - 2000, dt.month, dt.day, dt.hour, dt.minute,
+                          dt.second, 0x55, 0xaa, mode])
+        if rnd.random() < 0.2:
+            text = 'run{:d}'.format(rnd.randint(1, 999))
+            out += bytearray([0x55, 0xaa, 0x02, len(text)]) + text
+        n = min(rnd.randint(200, 4000), max(size - len(out), 1))
+        run = bytearray(min(int(rnd.gauss(20, 5)) & 0xff, 0x54) for _ in xrange(n))
+        out += run
+        dt += datetime.timedelta(seconds=n * tick + rnd.randint(60, 7200))
+    return str(out[:size])
+
+
+def rss():
+    """Resident memory in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        # peak, not current (no /proc)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def display(force=False):
+    """Make sure Qt has a screen: Xvfb if there is no DISPLAY"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    if os.environ.get('DISPLAY') and not force:
+        return
+    for n in xrange(99, 199):
+        if not os.path.exists('/tmp/.X11-unix/X{:d}'.format(n)):
+            break
+    try:
+        xvfb = subprocess.Popen(['Xvfb', ':{:d}'.format(n), '-screen', '0', '1024x768x24', '-nolisten', 'tcp'],
+                                stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT)
+    except OSError:
+        # no Xvfb: the offscreen platform (Qt5) or fail at QApplication
+        return
+    atexit.register(xvfb.terminate)
+    os.environ['DISPLAY'] = ':{:d}'.format(n)
+    for _ in xrange(50):
+        if os.path.exists('/tmp/.X11-unix/X{:d}'.format(n)):
+            break
+        time.sleep(0.1)
+
+
+class Probe(object):
+    """Event loop latency: lateness of a timer firing every TICK seconds"""
+
+    def __init__(self, QtCore):
+        self.timer = QtCore.QTimer()
+        self.timer.setInterval(int(TICK * 1000))
+        self.timer.timeout.connect(self.tick)
+        self.reset()
+        self.timer.start()
+
+    def reset(self):
+        self.last = time.time()
+        self.late = []
+
+    def tick(self):
+        now = time.time()
+        self.late.append(max(now - self.last - TICK, 0.0))
+        self.last = now
+
+    def stop(self):
+        # time since the last tick counts as well (blocked to the end)
+        self.tick()
+        self.timer.stop()
+
+
+def _ms(values, q=None):
+    if not values:
+        return 0.0
+    if q is None:
+        return 1000.0 * max(values)
+    v = sorted(values)
+    return 1000.0 * v[min(int(q * len(v)), len(v) - 1)]
+
+
+class LoadTest(object):
+    """Steps against one GmcApp, results in self.results"""
+
+    def __init__(self):
+        from PyQt4 import QtGui, QtCore
+        import gwcmain
+        self.QtGui, self.QtCore, self.gui = QtGui, QtCore, gwcmain
+        self.app = QtGui.QApplication.instance() or QtGui.QApplication(sys.argv[:1])
+        self.form = gwcmain.GmcApp()
+        self.form.show()
+        self.app.processEvents()
+        self.rss0 = rss()
+        self.results = []
+
+    def frame(self):
+        """Seconds to repaint the text widget"""
+        t0 = time.time()
+        self.form.plainTextEdit.viewport().repaint()
+        return time.time() - t0
+
+    def run(self, step, size, func):
+        """Measure func() (which returns frame times) as step/size"""
+        self.app.processEvents()
+        probe = Probe(self.QtCore)
+        m0 = rss()
+        t0 = time.time()
+        frames = func() or []
+        self.app.processEvents()
+        frames.append(self.frame())
+        dt = time.time() - t0
+        probe.stop()
+        m1 = rss()
+        r = {'step': step, 'size': size, 'seconds': dt,
+             'latency_max_ms': _ms(probe.late), 'latency_p95_ms': _ms(probe.late, 0.95),
+             'frame_max_ms': _ms(frames), 'frame_mean_ms': 1000.0 * sum(frames) / len(frames),
+             'rss_mb': m1 / 1e6, 'growth_mb': (m1 - m0) / 1e6, 'total_growth_mb': (m1 - self.rss0) / 1e6}
+        self.results.append(r)
+        print ("{step:6s} {size:9d} {seconds:8.2f} s  latency max {latency_max_ms:7.1f} ms "
+               "p95 {latency_p95_ms:6.1f} ms  frame max {frame_max_ms:6.1f} ms "
+               "mean {frame_mean_ms:5.1f} ms  rss {rss_mb:6.1f} MB (+{growth_mb:.1f})").format(**r)
+        sys.stdout.flush()
+        return r
+
+    def lines(self, n):
+        def feed():
+            self.form.clearplain()
+            frames = []
+            for i in xrange(n):
+                self.form.writeplain("2017-03-01 12:{:02d}:{:02d}  {:5d}".format(i // 60 % 60, i % 60, i % 97))
+                if i % BATCH == BATCH - 1:
+                    self.app.processEvents()
+                    frames.append(self.frame())
+            return frames
+        return self.run('lines', n, feed)
+
+    def dump(self, size):
+        raw = synthetic(size)
+
+        def process():
+            self.gui.data = raw
+            self.form.processdata()
+            return []
+        return self.run('dump', size, process)
+
+    def live(self, n):
+        import gmcreplay
+        import gmcshm
+        # samples enough for n readings (2 GETCPM per reading is possible)
+        rs = gmcreplay.ReplaySerial(synthetic(3 * n + 64, mode=1), 0)
+        old, self.gui.ser = self.gui.ser, rs
+        button = self.form.pushButtonLiveData
+        frames = []
+
+        def check():
+            if rs.i >= n:
+                button.setChecked(False)
+            elif rs.i % 100 == 0:
+                frames.append(self.frame())
+
+        def stream():
+            # own ring file: do not disturb a GUI running on this machine
+            ring, gmcshm.RING = gmcshm.RING, gmcshm.RING + '.loadtest{:d}'.format(os.getpid())
+            timer = self.QtCore.QTimer()
+            timer.setInterval(1)
+            timer.timeout.connect(check)
+            timer.start()
+            button.setChecked(True)
+            try:
+                self.form.livedata()
+            finally:
+                timer.stop()
+                try:
+                    os.remove(gmcshm.RING)
+                except OSError:
+                    pass
+                gmcshm.RING = ring
+            return frames
+        try:
+            return self.run('live', n, stream)
+        finally:
+            self.gui.ser = old
+
+    def close(self):
+        self.form.close()
+        self.app.processEvents()
+
+
+def sizes(s):
+    return [int(x) for x in s.split(',') if x.strip()]
+
+
+def main(argv=None):
+    args = docopt(__doc__, argv)
+    display(args['--xvfb'])
+    lt = LoadTest()
+    for n in sizes(args['--lines']):
+        lt.lines(n)
+    for n in sizes(args['--dumps']):
+        lt.dump(n)
+    for n in sizes(args['--live']):
+        lt.live(n)
+    lt.close()
+    if args['--json']:
+        with open(args['--json'], 'w') as f:
+            json.dump(lt.results, f, indent=1)
+    failed = []
+    for r in lt.results:
+        for opt, key in (('--max-latency', 'latency_max_ms'), ('--max-frame', 'frame_max_ms'),
+                         ('--max-growth', 'growth_mb')):
+            if args[opt] is not None and r[key] > float(args[opt]):
+                failed.append("{:s} {:d}: {:s} {:.1f} > {:s}".format(r['step'], r['size'], key, r[key], args[opt]))
+    for f in failed:
+        print "LIMIT EXCEEDED", f
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Several dumps on one time axis
+
+Loader decodes dump files in a pool of worker processes: the raw data
+is read and decoded there, only the count records come back as a
+Series (times and CPM as arrays, 8 bytes per sample; times in seconds
+since gmcdecode.TSTART, like in the RecordBatch). Overlay keeps
+the series up to MAXBYTES, the oldest added are dropped first, and
+gives per bin mean, min and max CPM for a common time window, e.g. one
+bin per pixel of the plot (gwcoverlay).
+
+Counts are scaled to CPM by the interval mode as in gmcsummary (sec:
+x 60; min and hour mode records are CPM already), so runs of different
+modes can be compared. The samples of a series are sorted by device time.
+
+Usage:
+    gmcoverlay.py [-n BINS] DUMPFILE...    mean CPM per time bin, one column per dump (csv)
+'''
+
+# versions:
+# vers 2017-04: first version
+# vers 2017-04: hour mode is CPM (gmcsummary.CPM), series pickled as bytes
+
+import array
+import bisect
+import collections
+import multiprocessing
+import os
+import re
+import sys
+
+import gmcdecode
+import gmcsummary
+from gmcdecode import TSTART, KIND_TIME, KIND_TAG
+
+
+MAXBYTES = 256 << 20    # memory for all series
+_TAGKINDS = re.compile('[{:c}{:c}]'.format(KIND_TIME, KIND_TAG))
+
+
+class Series(object):
+    """Count records of one dump: times (sec since TSTART) and CPM, sorted by time"""
+
+    __slots__ = ('name', 'times', 'cpm', 'records', 'rawsize')
+
+    def __init__(self, name, times, cpm, records=0, rawsize=0):
+        self.name = name
+        self.times = times
+        self.cpm = cpm
+        self.records = records    # all records decoded
+        self.rawsize = rawsize    # bytes of the dump
+
+    def __len__(self):
+        return len(self.times)
+
+    def nbytes(self):
+        return len(self.times) * self.times.itemsize + len(self.cpm) * self.cpm.itemsize
+
+    def span(self):
+        """(first, last) epoch sec, None if empty"""
+        return (int(self.times[0]) + TSTART, int(self.times[-1]) + TSTART) if self.times else None
+
+    def __getstate__(self):
+        # arrays as bytes, as gmcdecode.RecordBatch
+        return tuple((getattr(self, f).typecode, getattr(self, f).tostring()) if f in ('times', 'cpm')
+                     else getattr(self, f) for f in self.__slots__)
+
+    def __setstate__(self, state):
+        for f, v in zip(self.__slots__, state):
+            if f in ('times', 'cpm'):
+                a = array.array(v[0])
+                a.fromstring(v[1])
+                v = a
+            setattr(self, f, v)
+
+
+def series(rb, name=''):
+    """Series of the count records of a RecordBatch"""
+    runs = []    # (times, cpm) of the runs between tags, each ascending
+    ks = rb.kinds.tostring()
+    mode = 2
+    i, n = 0, len(rb)
+    while i < n:
+        k = rb.kinds[i]
+        if k == KIND_TIME:
+            if rb.counts[i] < 4:
+                mode = rb.counts[i]
+            i += 1
+            continue
+        if k == KIND_TAG:
+            i += 1
+            continue
+        m = _TAGKINDS.search(ks, i)
+        j = m.start() if m else n
+        f = gmcsummary.CPM[mode]
+        counts = rb.counts[i:j]
+        runs.append((rb.times[i:j], array.array('f', counts if f == 1.0 else [c * f for c in counts])))
+        i = j
+    # clock set back between runs: runs in order of time
+    runs.sort(key=lambda r: r[0][0])
+    times = array.array(rb.times.typecode)
+    cpm = array.array('f')
+    for t, c in runs:
+        times.extend(t)
+        cpm.extend(c)
+    if any(a[0][-1] > b[0][0] for a, b in zip(runs, runs[1:])):
+        # runs overlap in time: sort the samples
+        order = sorted(xrange(len(times)), key=times.__getitem__)
+        times = array.array(times.typecode, [times[k] for k in order])
+        cpm = array.array('f', [cpm[k] for k in order])
+    return Series(name, times, cpm, len(rb))
+
+
+def readdump(fn):
+    """Raw data of a dump file or *.gmcz archive"""
+    with open(fn, 'rb') as f:
+        data = f.read()
+    if fn.endswith('.gmcz'):
+        import gmccodec
+        data = gmccodec.decompress(data)
+    return data
+
+
+def load(fn):
+    """Series of dump file fn (run in a worker: raw data stay there)"""
+    data = readdump(fn)
+    s = series(gmcdecode.decode(data), os.path.basename(fn))
+    s.rawsize = len(data)
+    return s
+
+
+class Loader(object):
+    """Decodes dump files in worker processes; results collected by poll()
+
+    Nothing blocks: add() queues a file, poll() (e.g. from a GUI timer)
+    returns the files finished since the last call.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers
+        self.pool = None
+        self.pending = collections.OrderedDict()
+
+    def add(self, fn):
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers)
+        self.pending[fn] = self.pool.apply_async(load, (fn,))
+
+    def busy(self):
+        return len(self.pending)
+
+    def poll(self):
+        """[(file name, Series or exception), ...] of files finished"""
+        done = []
+        for fn, r in self.pending.items():
+            if r.ready():
+                del self.pending[fn]
+                try:
+                    done.append((fn, r.get()))
+                except Exception as e:
+                    done.append((fn, e))
+        return done
+
+    def wait(self):
+        """Results of all files queued (blocks)"""
+        done = []
+        for fn, r in self.pending.items():
+            try:
+                done.append((fn, r.get()))
+            except Exception as e:
+                done.append((fn, e))
+        self.pending.clear()
+        return done
+
+    def close(self):
+        if self.pool:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self.pending.clear()
+
+
+class Overlay(object):
+    """Series by file name, memory up to maxbytes"""
+
+    def __init__(self, maxbytes=MAXBYTES):
+        self.maxbytes = maxbytes
+        self.series = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.series)
+
+    def nbytes(self):
+        return sum(s.nbytes() for s in self.series.itervalues())
+
+    def add(self, key, s):
+        """Add series s, returns keys of series dropped for memory"""
+        self.series.pop(key, None)
+        self.series[key] = s
+        dropped = []
+        while len(self.series) > 1 and self.nbytes() > self.maxbytes:
+            k, _ = self.series.popitem(last=False)
+            dropped.append(k)
+        return dropped
+
+    def remove(self, key):
+        self.series.pop(key, None)
+
+    def span(self):
+        """(first, last) time of all series, None if empty"""
+        spans = [s.span() for s in self.series.itervalues() if len(s)]
+        if not spans:
+            return None
+        return min(a for a, _ in spans), max(b for _, b in spans)
+
+
+def bins(s, t0, t1, n):
+    """[(mean, min, max) or None if no sample, ...] of series s in n bins of t0..t1 (epoch sec)"""
+    times, cpm = s.times, s.cpm
+    w = float(t1 - t0) / n if t1 > t0 else 1.0
+    t0 -= TSTART
+    t1 -= TSTART
+    out = []
+    lo = bisect.bisect_left(times, t0)
+    for k in xrange(n):
+        hi = bisect.bisect_left(times, t0 + (k + 1) * w, lo) if k < n - 1 else \
+            bisect.bisect_right(times, t1, lo)
+        if hi > lo:
+            part = cpm[lo:hi]
+            out.append((sum(part) / len(part), min(part), max(part)))
+        else:
+            out.append(None)
+        lo = hi
+    return out
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    nbins = 100
+    if args[:1] == ['-n']:
+        nbins = int(args[1])
+        args = args[2:]
+    if not args:
+        print __doc__
+        sys.exit(1)
+    import gmcwrite
+    loader = Loader()
+    ov = Overlay()
+    for fn in args:
+        loader.add(fn)
+    for fn, s in loader.wait():
+        if isinstance(s, Exception):
+            sys.stderr.write("{:s}: {!s}\n".format(fn, s))
+        else:
+            ov.add(fn, s)
+    loader.close()
+    if not ov.span():
+        sys.exit(1)
+    t0, t1 = ov.span()
+    cols = [bins(s, t0, t1, nbins) for s in ov.series.itervalues()]
+    print ','.join(['time'] + [s.name for s in ov.series.itervalues()])
+    w = float(t1 - t0) / nbins
+    for k in xrange(nbins):
+        print ','.join([gmcwrite.timestr(int(t0 + k * w))] +
+                       ['{:.1f}'.format(c[k][0]) if c[k] else '' for c in cols])
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Decode large data in parallel, split at time tags
+
+A time tag sets time and interval, so the data between two time tags
+can be decoded on its own (see gmcindex.segments). Segments are grouped
+into jobs of similar size, decoded in a process (or thread) pool and
+joined in order. The result equals gmcdecode.decode(data). Data without
+time tags is one segment and is decoded by one worker.
+'''
+
+# versions:
+# vers 2017-04: first version
+
+import multiprocessing
+import multiprocessing.pool
+
+import gmcdecode
+import gmcindex
+import gmcprof
+
+
+MINSIZE = 1 << 17   # below: decode sequentially
+JOBSPERWORKER = 4
+
+_data = None   # data of the pool workers
+
+
+def _init(data):
+    global _data
+    _data = bytearray(data)
+
+
+def _job(args):
+    start, end, tstart, idcpm = args
+    return gmcdecode.decode(_data, start, end, tstart, idcpm)
+
+
+def jobs(segs, size, n):
+    """Group segments into about n jobs: (start, end, tstart, idcpm)"""
+    step = max(size // n, 1)
+    out = []
+    first = None
+    for seg in segs:
+        if first is None:
+            first = seg
+        if seg['end'] - first['offset'] >= step:
+            out.append((first['offset'], seg['end'], first['tstart'], first['idcpm']))
+            first = None
+    if first is not None:
+        out.append((first['offset'], segs[-1]['end'], first['tstart'], first['idcpm']))
+    return out
+
+
+def decode(data, workers=None, threads=False):
+    """Decode data like gmcdecode.decode(data), using a pool of workers
+
+    workers: number of processes (threads), default: number of CPUs
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers < 2 or len(data) < MINSIZE:
+        return gmcdecode.decode(data)
+    if not isinstance(data, bytearray):
+        data = bytearray(data)
+    with gmcprof.timer('prescan', len(data)):
+        segs = gmcindex.segments(data)
+    job = jobs(segs, len(data), workers * JOBSPERWORKER)
+    if threads:
+        _init(data)
+        pool = multiprocessing.pool.ThreadPool(workers)
+    else:
+        pool = multiprocessing.Pool(workers, _init, (str(data),))
+    try:
+        parts = pool.map(_job, job)
+    finally:
+        pool.close()
+        pool.join()
+    rb = parts[0]
+    for part in parts[1:]:
+        rb.extend(part)
+    return rb
@@ -8,19 +8,39 @@ Examples:
 gmcparse.py:                      read USB/serial and print 50 lines of parsed data to screen
 gmcparse.py -o file1 -d file2:    pretty print to file1, dump binary to file2
 gmcparse.py -f >file3:            full output to file3
+gmcparse.py -i file2 -o file4.csv:  convert dump to csv
+gmcparse.py -i file2 -o file5.csv,file5.sqlite:  convert dump to csv and SQLite
+gmcparse.py -i file2 -x - -r 0x1000:0x1400:  hex listing of 1k of file2
+gmcparse.py -i file2 --from "2017-03-01 12:00" --to "2017-03-01 13:00":  one hour of file2
+gmcparse.py -i file2 -S:          start, duration, mode, counts, mean/max/min CPM per run
 
 
 Usage:
   gmcparse.py [options] 
   
 Options:
-  -i FILE, --input FILE    Binary input file (GMC Dump), otherwise via USB/serial
-  -o FILE, --output FILE   Pretty output file (time stamp : count rate)
-  -d FILE, --dump FILE     Save hex dump, previously loaded via USB/serial
+  -P DEV, --port DEV       Serial device, e.g. /dev/ttyUSB0 (default: search)
+  -b BAUD, --baud BAUD     Baud rate (default: search)
+  -i FILE, --input FILE    Binary input file (GMC Dump or *.gmcz archive), otherwise via USB/serial
+  -o FILE, --output FILE   Output file(s), comma separated; format by extension:
+                           text, *.csv, *.tsv, *.jsonl, *.json, *.sqlite, *.gmcc (columnar), - (stdout)
+  --from TIME              Only data from TIME on (YYYY-MM-DD HH:MM:SS), requires -i
+  --to TIME                Only data up to TIME (YYYY-MM-DD HH:MM:SS), requires -i
+  -j N, --jobs N           Decode large files with N processes (0: number of CPUs) [default: 1]
+  -t FMT, --format FMT     Text output file format: plain, csv, tsv (default: by file name)
+  -d FILE, --dump FILE     Save hex dump, previously loaded via USB/serial (compressed if FILE is *.gmcz)
+  -x FILE, --hexlist FILE  Hex listing with markers to FILE (- : screen); with -i only the listing
+  -r RANGE, --range RANGE  Offsets of the hex listing, e.g. 0x1000:0x2000 or 4096:
   -v, --verbose            Print more details
   -f, --full               Print all, ie time stamp, location string, changes of recording modes. Use ">file" to save data 
   -h --help                Show help 
   -g --debug               Debug mode
+  -c, --cache              Keep decoded data in ~/.cache/gmc_datalogger for the next runs
+  -a, --alerts             Print spikes and increases of the count rate (see gmcalarm)
+  -S, --summary            Print a table of the runs between time tags and ID tags (see gmcsummary)
+  -s, --serialstats        Print serial link statistics per command
+  -p, --profile            Print time spent per stage (serial, download, decode, output)
+  --profile-dump FILE      Save time per stage as JSON
   
 '''
 
@@ -31,6 +51,9 @@ Options:
 # versions:
 # vers 2017-02-24b: pointer control removed (it gave wrong reading for last values)
 #    unsolved: what happens if data ends with 55  AA  00? Then pointer will check ahead bytes which are missing.
+# vers 2017-04: analyse() based on gmcdecode/gmcwrite, truncated markers are treated as counts
+#    data > 64k accepted (1M flash, archives), -j for parallel decoding
+#    -S: table of the runs (gmcsummary)
 
 
 # remarks:
@@ -41,17 +64,39 @@ Options:
 
 
 from docopt import docopt
+import bisect
 import datetime
 import struct
+import sys
 import time
-import serial       # the communication with the serial port
 
-
-vers="GMCparse 2017-02-24b"
+import gmcalarm     # anomaly detection
+import gmccache     # decoded data cache
+import gmccodec     # compressed dump archives
+import gmcflash     # end of data in device memory
+import gmchex       # hex listing
+import gmcdecode    # raw data -> record arrays
+import gmcindex     # time tag index of dump files
+import gmclink      # serial link statistics
+import gmcparallel  # decoding of large data in parallel
+import gmcprof      # stage timers
+import gmcserial    # device search
+import gmcsink      # output files
+import gmcsummary   # table of the runs
+import gmcwrite     # record arrays -> text
+
+
+vers="GMCparse 2017-04"
 device="GMC-320"
 verbose=1 
 debug=0
 limitlines=80  # limit output lines to screen if not verbose
+outputformat=None  # output file format, see gmcwrite.FORMATS
+jobs=1  # decoding processes, None: number of CPUs
+alerts=False  # print anomalies
+summary=False  # table of the runs
+hexlist=None  # hex listing file, '-': screen
+hexrange=None  # offsets of hex listing 'start:end'
 
 def stime():
     """Return current time as YYYY-MM-DD HH:MM:SS"""
@@ -83,7 +128,7 @@ def getDate(ser):
     return datetime.datetime(*dsb)
 
 
-def getSPIR(ser, address = 0, datalength = 4096):
+def getSPIR(ser, address = 0, datalength = 4096, retries = 2, into = None):
     # by ullix
     # Request history data from internal flash memory
     # Command:  <SPIR[A2][A1][A0][L1][L0]>>
@@ -125,88 +170,87 @@ def getSPIR(ser, address = 0, datalength = 4096):
 
     # returns string of characters with each chr-value from 0...255
     # NOT converted into list of int
-    rec = serialCOMM(ser, b'<SPIR'+ad+dl+'>>', datalength, False) 
+    # into: memoryview to read into, returns number of bytes then
+    rec = serialCOMM(ser, b'<SPIR'+ad+dl+'>>', datalength, False, retries, into) 
     if debug:
-        print "SPIR datalength received:\t{:5d},".format(len(rec)), type(rec)
+        print "SPIR datalength received:\t{:5d},".format(rec if into is not None else len(rec)), type(rec)
     
     return rec
 
     
-def serialCOMM(ser, sendtxt, returnlength, byteformat = True):
+def serialCOMM(ser, sendtxt, returnlength, byteformat = True, retries = 0, into = None):
     # write to and read from serial port
     # exit on comm error
     # if byteformat is True, then convert received string to list of int
-    # (ullix)
+    # short reads are repeated up to retries times
+    # into: memoryview to read into (no copy), returns number of bytes then
+    # latency, short reads and retries are counted in gmclink.stats
+    # (ullix and mod)
     
-    try:
-        ser.write(sendtxt)
-    except:        
-        print "\nERROR in Serial Write", sys.exc_info()
-        ser.close()
-        sys.exit(1)
-
-    try:
-        rec = ser.read(returnlength)
-    except:
-        print "\nERROR in Serial Read", sys.exc_info()
-        ser.close()
-        sys.exit(1)
-
-    if byteformat: rec = map(ord,rec) # convert string to list of int
+    cmd = gmclink.cmdname(sendtxt)
+    while True:
+        t0 = time.time()
+        try:
+            with gmcprof.timer('serial.write', len(sendtxt)):
+                ser.write(sendtxt)
+        except:        
+            print "\nERROR in Serial Write", sys.exc_info()
+            ser.close()
+            sys.exit(1)
+        try:
+            with gmcprof.timer('serial.read', returnlength):
+                if into is None:
+                    rec = ser.read(returnlength)
+                    got = len(rec)
+                else:
+                    rec = got = ser.readinto(into)
+        except:
+            print "\nERROR in Serial Read", sys.exc_info()
+            ser.close()
+            sys.exit(1)
+        gmclink.stats.record(cmd, time.time() - t0, returnlength, got)
+        if got >= returnlength or retries <= 0:
+            break
+        retries -= 1
+        gmclink.stats.retry(cmd)
+        ser.flushInput()    # drop late bytes of the failed request
+    if byteformat and into is None: rec = map(ord,rec) # convert string to list of int
     
     return rec
     
-def readHIST():
-    """Read history data from device
+def readHIST(size=None):
+    """Read history data from device, returns bytearray
     """
     # (ullix and mod)
     
-    allspir =""
-    # read data from device
-    for chunk in range(0, 16): # all 64k data
-    #for chunk in range(0, 1):   # only first 4096 bytes
-        time.sleep(0.5)         # fails occasionally to read all data
-                                # when sleep is too short
-        allspir += getSPIR(ser, chunk * 4096 , 4096)
-        if (ord(allspir[-1])== 0xff) and  (ord(allspir[-2]) == 0xff) and (ord(allspir[-3])== 0xff):
-            if verbose:
-                print "Device memory: {:02d} pages (4096 each) out of 16 read".format(chunk+1)
-            break
+    if size is None:
+        size = gmcflash.flashsize(getVER(ser))
+    # one buffer for the whole flash, pages are read into it
+    allspir = bytearray(size)
+    view = memoryview(allspir)
+    # end of data by small probes (see gmcflash), then only the bytes in use
+    with gmcprof.timer('download.probe'):
+        end = gmcflash.findend(lambda a, n: getSPIR(ser, a, n), size)
     if verbose:
-        print "SPIR datalength combined:\t{:5d},".format(len(allspir)), type(allspir)
-    #print "last bytes: {:0X} {:0X} {:0X}".format(ord(allspir[-1]), ord(allspir[-2]), ord(allspir[-3]))
-
-    # remove all trailing 0xff (= missing data at the end)
-    allspir = allspir.rstrip(chr(0xff)) 
-    l = len(allspir)
+        print "Device memory: {:d} bytes used out of {:d}".format(end, size)
+    for address in range(0, end, 4096):
+        with gmcprof.timer('download.sleep'):
+            time.sleep(0.5)     # fails occasionally to read all data
+                                # when sleep is too short
+        n = min(4096, end - address)
+        with gmcprof.timer('download.page', n):
+            getSPIR(ser, address, n, into=view[address:address + n])
+    del view    # resize needs all views released
+
+    # remove all trailing 0xff (= missing data at the end), in place
+    while end and allspir[end - 1] == 0xff:
+        end -= 1
+    del allspir[end:]
     if debug:
-        print "SPIR all 0xff removed:{:5d},".format(l), type(allspir)
+        print "SPIR all 0xff removed:{:5d},".format(end), type(allspir)
         
     return allspir
         
-'''           
-    binfile = open(binpath, "w")     # writing trailed data
-    binfile.write(allspir)
-    binfile.close
-
-
-    print "The history data are :   \t(Format: dec byte_number: hex value=dec value)"
-    allspirInt = map(ord, allspir)  # convert to list of int
-    lstfile = open(lstpath, "w")
-    for i in range(0, l, 10):
-        lstvalueline =""
-        for j in range(0,10):
-            k  = i + j
-            if k >= l: break
-            lstvalue = "%5d: %02x=%3d  " % (k, allspirInt[k], allspirInt[k])
-            lstvalueline += lstvalue
-
-        lstfile.write(lstvalueline + "\n")
-        if i < 55: print "\t\t\t\t", lstvalueline        
-    print "\t\t\t\tand more ...\n"
-
-    lstfile.close
-'''
 
 
 
@@ -231,104 +275,53 @@ def analyse(data, fn):
     55 AA 02 str_length chr1 chr2 ...
     """
 
-    idcpm=2 # id_cpm 
-    tick= datetime.timedelta(minutes=1)
-    dp=0    # data pointer
-    ccount=0  # counted events; <0 if no counter value found but date or other control value
+    # decoding: gmcdecode, text output: gmcwrite
 
-    datenow= datetime.datetime(1950,01,22, 11,12, 13)  #  arabitrary time as init value (< 2000)
-    
-    if fn:
-        f=open(fn,"w")
+    if len(data)>65536 and verbose:
+        # more than the 64k of a GMC-320: e.g. 1M flash or several dumps
+        print "Note: more data than 16 * 4096 bytes"
 
-    while dp<len(data):
-        
-        # test whether data is counter value
-        ccount=ord(data[dp])
-        if (ord(data[dp])==0x55) and (ord(data[dp+1])==0xaa):
-            if ord(data[dp+2])==0x00:
-                    
-                # date + time found (very likely)
-                if (ord(data[dp+9])==0x55) and (ord(data[dp+10])==0xaa):
-                    if ord(data[dp+11])<4:
-                        if ord(data[dp+11]) != idcpm:
-                            idcpm= ord(data[dp+11]) 
-                            if verbose:
-                                print "* Time interval changed (0: off, 1: sec, 2: min, 3: hour): {:0d}".format(idcpm)
-                            # define time interval
-                            if idcpm == 2:
-                                tick= datetime.timedelta(minutes=1)
-                            elif idcpm == 1:
-                                tick=  datetime.timedelta(seconds=1)
-                            elif idcpm == 3:
-                                tick = datetime.timedelta(minutes=60)
-                            elif idcpm == 0:
-                                if verbose:
-                                    print "time interval off"
-                                    tick = datetime.timedelta(minutes=0)
-                            else: 
-                                # should not happen
-                                if verbose:
-                                    print "Undefined history interval; should be 0,1,2,3; found: {:2d}".format( ord(data[dp+11]) )
-                                    print "{:0X}{:0X}{:0X}".format(ord(data[dp+9]), ord(data[dp+10]), ord(data[dp+11]) )
-                    #print "*", ord(data[dp+11])
-                    ds = data[dp+3:dp+9]
-                    dsb = [ord(i) for i in ds]
-                    dsb[0] +=2000
-                    datenow=datetime.datetime(*dsb)
-                    if verbose:
-                        print "* Time tag found: {:%Y-%m-%d %H:%M:%S} {:d}".format(datenow, idcpm)
-                    ccount=-1
-                    # next value: 11 + 1=12; additional single incremented below
-                    dp += 11
-                else:
-                    if verbose:
-                        print "No date/time endmarker found; treat markers as counting data"
-                    
-            # double byte found
-            elif ord(data[dp+2])==1:
-                # double byte found
-                ccount = struct.unpack('>H',data[dp+3]+data[dp+4])[0]
-                #print "***", ord(data[dp+2]), ord(data[dp+3]), ord(data[dp+4]), ord(data[dp+5]), getnumber, '***'
-                #print ccount, "****",
-                #next value: 4+1=5; additional single incremented below
-                dp +=4
-                        
-            # string found
-            elif ord(data[dp+2])==2:
-                # ascii string found
-                strgl=ord(data[dp+3])
-                strg=data[dp+4:dp+4+strgl]
-                if verbose:
-                    print "* Tag found: {:s}".format(strg)
-                ccount=-1
-                #additional single incremented below
-                dp = dp+3+strgl
-
-
-        #print " {:02X}".format(ord(data[dp])),   
-        if ccount>= 0:
-            #print "{:02X}".format(ccount),
-
-            #print datenow , ccount
-            sp="{:%Y-%m-%d %H:%M:%S} {:5d}".format(datenow, ccount)
-            
-            # print only a few lines to screen
-            if fullout or (dp<limitlines):
-                print sp
-            if fn:
-                f.write(sp+ "\n")
-                
-            datenow += tick
-
-        dp += 1
-        if dp>65536:
-            print "Invalid data file (> 16 * 4096)"
-            exit(1)
-    if datenow.year<2000:
+    # runs between time/ID tags, summed up while decoding (see gmcsummary)
+    if summary:
+        rb, segments= gmcsummary.decode(data)
+        show(rb, fn, segments)
+        return
+
+    # decoded data of a previous run from disk with --cache (see gmccache)
+    if jobs != 1:
+        show(gmccache.decode(data, lambda d: gmcparallel.decode(d, jobs)), fn)
+    else:
+        show(gmccache.decode(data), fn)
+
+
+def show(rb, fn, segments=None):
+    """Print and save decoded records (gmcdecode.RecordBatch)
+
+    segments: gmcsummary.Summary of rb if made while decoding
+    """
+
+    # print only a few lines to screen
+    if fullout or not len(rb):
+        n= len(rb)
+    else:
+        n= bisect.bisect_left(rb.offsets, rb.offsets[0]+limitlines)
+    # output files in the sink threads, while printing
+    outs= [f.strip() for f in fn.split(',')] if fn else []
+    if '-' in outs:
+        # the stdout sink writes the records, no second copy in between
+        n= 0
+    pipe= gmcsink.Pipeline([gmcsink.forfile(f, outputformat) for f in outs])
+    pipe.write(rb)
+    if n:
+        gmcwrite.write(sys.stdout, rb, 'plain', verbose, 0, n)
+    pipe.close()
+    if not rb.timetags():
         print "No date/time tag found. Valid data?"
-    if fn:
-        f.close()
+    if alerts:
+        for a in gmcalarm.replay(rb, gmcalarm.Detector()):
+            print gmcalarm.describe(a)
+    if summary:
+        print (segments or gmcsummary.summarize(rb)).table()
         
         
                         
@@ -338,6 +331,21 @@ def analyse(data, fn):
 
 
 
+def hexlisting(listing):
+    """Call listing(file, start, end) for file hexlist and range hexrange"""
+    a, b = 0, None
+    if hexrange:
+        s, _, e = hexrange.partition(':')
+        a = gmchex.offset(s) if s else 0
+        b = gmchex.offset(e) if e else None
+    out = sys.stdout if hexlist == '-' else open(hexlist, 'w', gmcwrite.BUFSIZE)
+    try:
+        listing(out, a, b)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
 def main(argv=None):
     global ser
     
@@ -345,6 +353,26 @@ def main(argv=None):
         print "\nGeiger counter: ", device
         print "Software version: ", vers
     
+    # hex listing of a file: read block by block, not decoded (see gmchex)
+    if inputfile and hexlist:
+        hexlisting(lambda out, a, b: gmchex.listfile(inputfile, out, a, b))
+        return
+
+    # time window of a file: decode only the segments needed (see gmcindex)
+    if inputfile and (timefrom or timeto):
+        tf= gmcdecode.parsetime(timefrom) if timefrom else None
+        tt= gmcdecode.parsetime(timeto) if timeto else None
+        # archives have no index: decoded all, then cut segment by segment;
+        # segments cut by the window start at their first record
+        segs= gmcsummary.Summary() if summary else None
+        show(gmcindex.select(inputfile, tf, tt, segs), outputfile, segs)
+        return
+
+    # compressed archive: decode frame by frame (see gmccodec)
+    if inputfile and inputfile.endswith('.gmcz'):
+        show(gmccodec.decode(inputfile), outputfile)
+        return
+
     # get raw data from file or device        
     if inputfile:
         with open(inputfile, mode='rb') as file:  
@@ -353,9 +381,18 @@ def main(argv=None):
     else:
         # no input file given, try serial connection
             
-        # open the serial port with baudrate 115200, timeout 3 sec
+        # open the serial port, timeout 3 sec
         # NOTE: baud rate must be set at device first, default is 57600
-        ser = serial.Serial('/dev/ttyUSB0', 115200, timeout= 3)
+        # without --port/--baud: search all ports and baud rates (gmcserial)
+        port, baud = serialport, serialbaud
+        if not (port and baud):
+            found = gmcserial.detect([port] if port else None,
+                                     (int(baud),) if baud else gmcserial.BAUDS)
+            if found:
+                port, baud = found[:2]
+        # session: reopened with backoff if the device drops off during download
+        ser = gmcserial.Session(port or '/dev/ttyUSB0', int(baud or 115200))
+        ser.open(1)
         if verbose:
             if not fullout:
                 print "Use -f in order to get all data."
@@ -374,9 +411,16 @@ def main(argv=None):
         #fn = "f3.bin"
         
         data = readHIST()
+        ser.close()
+        if hexlist:
+            hexlisting(lambda out, a, b: gmchex.listdata(data, out, a, b))
         if dumpfile:
+            if dumpfile.endswith('.gmcz'):
+                data_out= gmccodec.compress(data)
+            else:
+                data_out= data
             with open(dumpfile, mode='wb') as file:
-                file.write(data)
+                file.write(data_out)
 
 
     print "Number of data points: ", len(data)
@@ -406,7 +450,27 @@ if __name__ == "__main__":
     verbose=arguments['--verbose']  
     debug=arguments['--debug']  
     fullout=arguments['--full']
+    outputformat=arguments['--format']
+    timefrom=arguments['--from']
+    serialport=arguments['--port']
+    serialbaud=arguments['--baud']
+    jobs=int(arguments['--jobs']) or None
+    timeto=arguments['--to']
+    alerts=arguments['--alerts']
+    summary=arguments['--summary']
+    hexlist=arguments['--hexlist']
+    hexrange=arguments['--range']
+    if arguments['--cache']:
+        gmccache.use_disk()
+    gmcprof.enable(arguments['--profile'] or bool(arguments['--profile-dump']))
     
     main()
+
+    if arguments['--serialstats']:
+        sys.stderr.write(gmclink.stats.report()+"\n")
+    if arguments['--profile']:
+        sys.stderr.write(gmcprof.report()+"\n")
+    if arguments['--profile-dump']:
+        gmcprof.dump(arguments['--profile-dump'])
     
 
@@ -8,11 +8,20 @@
 
 # versions:
 # vers 2017-03: modified as library for GUI 
+# vers 2017-04: analyse() based on gmcdecode/gmcwrite
+# vers 2017-04: getDate/getVER raise IOError when the answer is missing
 
+import bisect
 import datetime
 import struct
 import time
-import serial       
+
+import gmccache     # decoded data cache
+import gmcflash     # end of data in device memory
+import gmclink      # serial link statistics
+import gmcprof      # stage timers
+import gmcsink      # output files
+import gmcwrite     # record arrays -> text
 
 
 vers="GMCparse 2017-03-17"
@@ -31,13 +40,15 @@ def getVER(ser):
     # e.g.: GMC-300Re 4.20
     # (ullix)
     rec = serialCOMM(ser, b'<GETVER>>', 14, False) # returns ASCII string
+    if not rec:
+        # read failed (port lost) or the device did not answer
+        raise IOError("no answer to GETVER")
     return rec
     
     
 def getCPM(ser): 
     # get CPM from device
-    ser.write(b'<GETCPM>>')
-    rec = ser.read(2)
+    rec = serialCOMM(ser, b'<GETCPM>>', 2, False, 1)
     try:
         s1= ord(rec[0])<< 8 | ord(rec[1])
     except IndexError:
@@ -49,12 +60,14 @@ def getDate(ser):
     """ get device date
     """
     rec = serialCOMM(ser, b'<GETDATETIME>>', 7, False) 
+    if len(rec) < 7:
+        raise IOError("GETDATETIME: {:d} of 7 bytes".format(len(rec)))
     dsb = [ord(i) for i in rec[:6]]
     dsb[0] +=2000
     return datetime.datetime(*dsb).strftime("%Y-%m-%d %H:%M:%S")
 
 
-def getSPIR(ser, address = 0, datalength = 4096):
+def getSPIR(ser, address = 0, datalength = 4096, retries = 2, into = None):
     # by ullix
     # Request history data from internal flash memory
     # Command:  <SPIR[A2][A1][A0][L1][L0]>>
@@ -96,65 +109,88 @@ def getSPIR(ser, address = 0, datalength = 4096):
 
     # returns string of characters with each chr-value from 0...255
     # NOT converted into list of int
-    rec = serialCOMM(ser, b'<SPIR'+ad+dl+'>>', datalength, False) 
+    # into: memoryview to read into, returns number of bytes then
+    rec = serialCOMM(ser, b'<SPIR'+ad+dl+'>>', datalength, False, retries, into) 
     if debug:
-        print "SPIR datalength received:\t{:5d},".format(len(rec)), type(rec)
+        print "SPIR datalength received:\t{:5d},".format(rec if into is not None else len(rec)), type(rec)
     return rec
 
     
-def serialCOMM(ser, sendtxt, returnlength, byteformat = True):
+def serialCOMM(ser, sendtxt, returnlength, byteformat = True, retries = 0, into = None):
     # write to and read from serial port
-    # exit on comm error
+    # comm errors are raised (serial.SerialException, OSError)
     # if byteformat is True, then convert received string to list of int
-    # (ullix)
+    # short reads are repeated up to retries times
+    # into: memoryview to read into (no copy), returns number of bytes then
+    # latency, short reads and retries are counted in gmclink.stats
+    # (ullix and mod)
     
-    try:
-        ser.write(sendtxt)
-    except:        
-        print "\nERROR in Serial Write", sys.exc_info()
-        ser.close()
-        sys.exit(1)
-    try:
-        rec = ser.read(returnlength)
-    except:
-        print "\nERROR in Serial Read", sys.exc_info()
-        ser.close()
-        sys.exit(1)
-    if byteformat: rec = map(ord,rec) # convert string to list of int
+    cmd = gmclink.cmdname(sendtxt)
+    while True:
+        t0 = time.time()
+        try:
+            with gmcprof.timer('serial.write', len(sendtxt)):
+                ser.write(sendtxt)
+        except Exception:
+            # port lost or not available: the caller decides (GUI: status bar)
+            ser.close()
+            raise
+        try:
+            with gmcprof.timer('serial.read', returnlength):
+                if into is None:
+                    rec = ser.read(returnlength)
+                    got = len(rec)
+                else:
+                    rec = got = ser.readinto(into)
+        except Exception:
+            ser.close()
+            raise
+        gmclink.stats.record(cmd, time.time() - t0, returnlength, got)
+        if got >= returnlength or retries <= 0:
+            break
+        retries -= 1
+        gmclink.stats.retry(cmd)
+        ser.flushInput()    # drop late bytes of the failed request
+    if byteformat and into is None: rec = map(ord,rec) # convert string to list of int
     return rec
   
     
-def readHIST(ser):
-    """Read history data from device
+def readHIST(ser, size=None):
+    """Read history data from device, returns bytearray
     """
     # (ullix and mod)
     
     verbose=""
-    allspir =""
-    # read data from device
-    for chunk in range(0, 16): # all 64k data
-    #for chunk in range(0, 1):   # only first 4096 bytes
-        time.sleep(0.5)         # fails occasionally to read all data
-                                # when sleep is too short
-        allspir += getSPIR(ser, chunk * 4096 , 4096)
-        if (ord(allspir[-1])== 0xff) and  (ord(allspir[-2]) == 0xff) and (ord(allspir[-3])== 0xff):
-            if verbose:
-                print "Device memory: {:02d} pages (4096 each) out of 16 read".format(chunk+1)
-            break
+    if size is None:
+        size = gmcflash.flashsize(getVER(ser))
+    # one buffer for the whole flash, pages are read into it
+    allspir = bytearray(size)
+    view = memoryview(allspir)
+    # end of data by small probes (see gmcflash), then only the bytes in use
+    with gmcprof.timer('download.probe'):
+        end = gmcflash.findend(lambda a, n: getSPIR(ser, a, n), size)
     if verbose:
-        print "SPIR datalength combined:\t{:5d},".format(len(allspir)), type(allspir)
-    #print "last bytes: {:0X} {:0X} {:0X}".format(ord(allspir[-1]), ord(allspir[-2]), ord(allspir[-3]))
-
-    # remove all trailing 0xff (= missing data at the end)
-    allspir = allspir.rstrip(chr(0xff)) 
-    l = len(allspir)
+        print "Device memory: {:d} bytes used out of {:d}".format(end, size)
+    for address in range(0, end, 4096):
+        with gmcprof.timer('download.sleep'):
+            time.sleep(0.5)     # fails occasionally to read all data
+                                # when sleep is too short
+        n = min(4096, end - address)
+        with gmcprof.timer('download.page', n):
+            getSPIR(ser, address, n, into=view[address:address + n])
+    del view    # resize needs all views released
+
+    # remove all trailing 0xff (= missing data at the end), in place
+    while end and allspir[end - 1] == 0xff:
+        end -= 1
+    del allspir[end:]
     if debug:
-        print "SPIR all 0xff removed:{:5d},".format(l), type(allspir)
+        print "SPIR all 0xff removed:{:5d},".format(end), type(allspir)
         
     return allspir
         
 
-def analyse(form, data, fn, verbose=True):
+def analyse(form, data, fn, verbose=True, sinks=()):
     """
     Parse data
 
@@ -174,120 +210,39 @@ def analyse(form, data, fn, verbose=True):
     55 AA 02 str_length chr1 chr2 ...
     """
 
-    idcpm=2 # id_cpm 
-    tick= datetime.timedelta(minutes=1)
-    dp=0    # data pointer
-    ccount=0  # counted events; <0 if no counter value found but date or other control value
-    msgv='' #verbose message
+    # decoding: gmcdecode, text output: gmcwrite, files: gmcsink
+    # fn: output file, format by extension (text, csv, jsonl, sqlite, gmcc)
+    # sinks: more gmcsink outputs
+
     msge='' #error message
-    fullout=False
     limitlines=30
 
-    datenow= datetime.datetime(1950,01,22, 11,12, 13)  #  arabitrary time as init value (< 2000)
-    
-    if fn:
-        f=open(fn,"w")
+    if len(data)>gmcflash.MAXSIZE:
+        # not decoded; the GUI shows the message
+        msge= "Invalid data file (> 1 MB)"
+        return msge
 
-    while dp<len(data):
-        
-        # test whether data is counter value
-        ccount=ord(data[dp])
-        if (ord(data[dp])==0x55) and (ord(data[dp+1])==0xaa):
-            if ord(data[dp+2])==0x00:
-                    
-                # date + time found (very likely)
-                if (ord(data[dp+9])==0x55) and (ord(data[dp+10])==0xaa):
-                    if ord(data[dp+11])<4:
-                        if ord(data[dp+11]) != idcpm:
-                            idcpm= ord(data[dp+11]) 
-                            if verbose:
-                                msgv= "* Time intv. mod. (0: off, 1: sec, 2: min, 3: hour): {:0d}".format(idcpm)
-                            # define time interval
-                            if idcpm == 2:
-                                tick= datetime.timedelta(minutes=1)
-                            elif idcpm == 1:
-                                tick=  datetime.timedelta(seconds=1)
-                            elif idcpm == 3:
-                                tick = datetime.timedelta(minutes=60)
-                            elif idcpm == 0:
-                                if verbose:
-                                    print "Time interval off"
-                                    tick = datetime.timedelta(minutes=0)
-                            else: 
-                                # should not happen
-                                if verbose:
-                                    print "Undefined history interval; should be 0,1,2,3; found: {:2d}".format( ord(data[dp+11]) )
-                                    print "{:0X}{:0X}{:0X}".format(ord(data[dp+9]), ord(data[dp+10]), ord(data[dp+11]) )
-                    #print "*", ord(data[dp+11])
-                    ds = data[dp+3:dp+9]
-                    dsb = [ord(i) for i in ds]
-                    dsb[0] +=2000
-                    datenow=datetime.datetime(*dsb)
-                    if verbose:
-                        msgv= "* {:%Y-%m-%d %H:%M:%S} Dev. Timetag;  {:d}".format(datenow, idcpm)
-                    ccount=-1
-                    # next value: 11 + 1=12; additional single incremented below
-                    dp += 11
-                else:
-                    if verbose:
-                        #should not happen
-                        print "No date/time endmarker found; treat markers as counting data"
-                    
-            # double byte found
-            elif ord(data[dp+2])==1:
-                # double byte found
-                ccount = struct.unpack('>H',data[dp+3]+data[dp+4])[0]
-                #print "***", ord(data[dp+2]), ord(data[dp+3]), ord(data[dp+4]), ord(data[dp+5]), getnumber, '***'
-                #print ccount, "****",
-                #next value: 4+1=5; additional single incremented below
-                dp +=4
-                        
-            # string found
-            elif ord(data[dp+2])==2:
-                # ascii string found
-                strgl=ord(data[dp+3])
-                strg=data[dp+4:dp+4+strgl]
-                if verbose:
-                    msgv= "* ID tag: {:s}".format(strg)
-                ccount=-1
-                #additional single incremented below
-                dp = dp+3+strgl
-
-        #print " {:02X}".format(ord(data[dp])),   
-        
-        ##prepare output
-        if ccount>= 0:
-            #print "{:02X}".format(ccount),
-
-            #print datenow , ccount
-            sp="{:%Y-%m-%d %H:%M:%S} {:5d}".format(datenow, ccount)
-            
-            # print only a few lines to screen
-            #if fullout or (dp<limitlines):
-
-            # print only a few lines to screen
-            if fullout or (dp<limitlines):
-                print sp
-            form.writeplain(sp)
-            if fn:
-                f.write(sp+ "\n")
-            datenow += tick
-        else:
-            if verbose:
-                #** print data **
-                print msgv
-                form.writeplain(msgv)
-                if fn:
-                    f.write(msgv+"\n")     
-        dp += 1
-        if dp>65536:
-            msge= "Invalid data file (> 16 * 4096)"
-            exit(1)
-    if datenow.year<2000:
-        msge = "No date/time tag found. Valid data?"
+    # same data again (verbose toggled, write data): decoded only once
+    rb= gmccache.decode(data)
+
+    # files are written in the sink threads while the screen is filled
+    outs= list(sinks)
     if fn:
-        f.close()
+        outs.append(gmcsink.forfile(str(fn), None, verbose))
+    pipe= gmcsink.Pipeline(outs)
+    pipe.write(rb)
+
+    # print only a few lines to screen
+    n= bisect.bisect_left(rb.offsets, limitlines)
+    for blk in gmcwrite.blocks(rb, 'plain', verbose, 0, n):
+        print blk,
+    with gmcprof.timer('format', len(rb)):
+        text= ''.join(gmcwrite.blocks(rb, 'plain', verbose)).rstrip("\n")
+    form.writeplain(text)
+    pipe.close()
+
+    if not rb.timetags():
+        msge = "No date/time tag found. Valid data?"
     form.writeplain("*** done ***")
     print msge
     return(msge)
-        
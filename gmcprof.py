@@ -0,0 +1,107 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Timers and counters per processing stage
+
+Usage:
+    with gmcprof.timer('decode', len(data)):
+        ...
+
+Stages used: serial.write, serial.read, download.page, download.sleep,
+decode, format, file.write, widget.update
+Disabled by default; then timer() returns a shared no-op object.
+'''
+
+# versions:
+# vers 2017-04: first version
+
+import json
+import time
+
+
+enabled = False
+_stats = {}   # stage: [calls, seconds, max seconds, items]
+
+
+class _Null(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null = _Null()
+
+
+class _Timer(object):
+    __slots__ = ('stage', 'items', 't0')
+
+    def __init__(self, stage, items):
+        self.stage = stage
+        self.items = items
+
+    def __enter__(self):
+        self.t0 = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        add(self.stage, time.time() - self.t0, self.items)
+        return False
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def reset():
+    _stats.clear()
+
+
+def timer(stage, items=0):
+    """Context manager measuring one call of stage; items e.g. bytes or lines"""
+    if not enabled:
+        return _null
+    return _Timer(stage, items)
+
+
+def add(stage, seconds=0.0, items=0):
+    """Add one measured call to stage (also usable as plain counter)"""
+    if not enabled:
+        return
+    s = _stats.get(stage)
+    if s is None:
+        s = _stats[stage] = [0, 0.0, 0.0, 0]
+    s[0] += 1
+    s[1] += seconds
+    if seconds > s[2]:
+        s[2] = seconds
+    s[3] += items
+
+
+def stats():
+    """Structured results: {stage: {calls, seconds, max, items}}"""
+    return dict((k, {'calls': v[0], 'seconds': v[1], 'max': v[2], 'items': v[3]})
+                for k, v in _stats.items())
+
+
+def summary():
+    """One line, e.g. for a status bar: stages sorted by time"""
+    st = sorted(_stats.items(), key=lambda kv: -kv[1][1])
+    return "  ".join("{:s} {:.3f}s".format(k, v[1]) for k, v in st)
+
+
+def report():
+    """Table of all stages"""
+    lines = ["{:16s} {:>7s} {:>9s} {:>9s} {:>10s}".format("stage", "calls", "total s", "max s", "items")]
+    for k, v in sorted(_stats.items()):
+        lines.append("{:16s} {:7d} {:9.3f} {:9.3f} {:10d}".format(k, v[0], v[1], v[2], v[3]))
+    return "\n".join(lines)
+
+
+def dump(fn):
+    """Write stats() as JSON to file fn"""
+    with open(fn, "w") as f:
+        json.dump(stats(), f, indent=1, sort_keys=True)
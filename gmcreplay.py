@@ -0,0 +1,189 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Replay a dump as live data
+
+Replay:        iterator of (time, count) samples of a dump, paced like
+               the recording: speed 1 real time, N: N times faster,
+               0: as fast as possible
+ReplaySerial:  stands in for the serial port (write/read like
+               serial.Serial), answers GETCPM, GETDATETIME, GETVER and
+               SPIR from the dump, so livedata, readHIST and all other
+               consumers of the device work unchanged
+
+The count of a sample is the recorded value (CPS, CPM or CPH, as set at
+the device when recording).
+
+Usage:
+    gmcreplay.py DUMPFILE [SPEED [OUTPUT,...]]
+        feed samples into gmcalarm (and gmcsink outputs), print alerts
+        and samples per second
+'''
+
+# versions:
+# vers 2017-04: first version
+# vers 2017-04: GETVER and SPIR answered for a dump without counts
+
+import array
+import bisect
+import itertools
+import struct
+import sys
+import time
+
+import gmccache
+import gmcdecode
+from gmcdecode import KIND_COUNT, KIND_COUNT2, TSTART
+
+
+def samples(rb):
+    """(times, counts) arrays of the count records of rb
+
+    times as in rb: seconds since gmcdecode.TSTART
+    """
+    times = array.array(rb.times.typecode)
+    counts = array.array('l')
+    for t, c, k in itertools.izip(rb.times, rb.counts, rb.kinds):
+        if k == KIND_COUNT or k == KIND_COUNT2:
+            times.append(t)
+            counts.append(c)
+    return times, counts
+
+
+def _decode(data):
+    if isinstance(data, gmcdecode.RecordBatch):
+        return data
+    return gmccache.decode(data)
+
+
+class Replay(object):
+    """Iterate (time, count) of data (raw dump or RecordBatch) at speed
+
+    Time jumps (clock set, recording paused) are not waited for: a gap of
+    more than maxgap seconds of recording time is replayed as one interval.
+    """
+
+    def __init__(self, data, speed=1.0, maxgap=3600):
+        self.times, self.counts = samples(_decode(data))
+        self.speed = speed
+        self.maxgap = maxgap
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        times, counts = self.times, self.counts
+        if not self.speed:
+            for i in xrange(len(times)):
+                yield int(times[i]) + TSTART, counts[i]
+            return
+        due = time.time()
+        prev = times[0] if times else 0
+        for i in xrange(len(times)):
+            t = times[i]
+            dt = t - prev
+            if dt < 0 or dt > self.maxgap:
+                dt = 0
+            due += dt / float(self.speed)
+            prev = t
+            wait = due - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            yield int(t) + TSTART, counts[i]
+
+
+class ReplaySerial(object):
+    """Replays a dump through the device commands, like serial.Serial
+
+    speed 0: every GETCPM moves to the next sample, else the samples
+    follow the wall clock, speed times faster.
+    """
+
+    name = 'replay'
+
+    def __init__(self, data, speed=1.0):
+        if isinstance(data, gmcdecode.RecordBatch):
+            self.raw = ''
+            rb = data
+        else:
+            self.raw = str(data)
+            rb = gmccache.decode(data)
+        self.times, self.counts = samples(rb)
+        self.speed = speed
+        self.start = time.time()
+        self.i = -1
+        self.out = ''
+
+    def __str__(self):
+        return "ReplaySerial({:d} samples, speed {!s})".format(len(self.times), self.speed)
+
+    def _index(self):
+        # sample of now
+        if not self.speed:
+            return min(max(self.i, 0), len(self.times) - 1)
+        t = self.times[0] + (time.time() - self.start) * self.speed
+        return max(bisect.bisect_right(self.times, t) - 1, 0)
+
+    def write(self, cmd):
+        if cmd.startswith(('<GETCPM>>', '<GETDATETIME>>')) and not self.times:
+            # dump without counts: no live data, no answer
+            return len(cmd)
+        if cmd.startswith('<GETCPM>>'):
+            if not self.speed:
+                self.i += 1
+                if self.i >= len(self.times):
+                    # end of dump: no answer
+                    return len(cmd)
+            self.out += struct.pack('>H', min(self.counts[self._index()], 0xffff))
+        elif cmd.startswith('<GETDATETIME>>'):
+            dt = gmcdecode.fromepoch(int(self.times[self._index()]) + TSTART)
+            self.out += struct.pack('6B', dt.year % 100, dt.month, dt.day, dt.hour, dt.minute,
+                                    dt.second) + '\xaa'
+        elif cmd.startswith('<GETVER>>'):
+            self.out += 'GMC-Replay1.00'
+        elif cmd.startswith('<SPIR'):
+            ad = struct.unpack('>I', '\x00' + cmd[5:8])[0]
+            n = struct.unpack('>H', cmd[8:10])[0] + 1
+            self.out += self.raw[ad:ad + n].ljust(n, '\xff')
+        return len(cmd)
+
+    def read(self, n):
+        rec, self.out = self.out[:n], self.out[n:]
+        return rec
+
+    def readinto(self, b):
+        rec = self.read(len(b))
+        b[:len(rec)] = rec
+        return len(rec)
+
+    def flushInput(self):
+        self.out = ''
+
+    def close(self):
+        pass
+
+
+if __name__ == '__main__':
+    import gmcalarm
+    import gmcsink
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+    fn = sys.argv[1]
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    with open(fn, 'rb') as f:
+        data = f.read()
+    if fn.endswith('.gmcz'):
+        import gmccodec
+        data = gmccodec.decompress(data)
+    outs = [gmcsink.forfile(o) for o in sys.argv[3].split(',')] if len(sys.argv) > 3 else []
+    det = gmcalarm.Detector(lambda a: sys.stdout.write(gmcalarm.describe(a) + "\n"))
+    rp = Replay(data, speed)
+    t0 = time.time()
+    with gmcsink.Pipeline(outs) as pipe:
+        for t, c in rp:
+            det.update(t, c)
+            pipe.append(t, c)
+    dt = time.time() - t0
+    print "{:d} samples in {:.2f} s: {:.0f} samples/s".format(len(rp), dt, len(rp) / max(dt, 1e-9))
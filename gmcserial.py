@@ -0,0 +1,241 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Serial port of a GMC device: search and session
+
+Search:
+
+All candidate ports (/dev/ttyUSB*, /dev/ttyACM*) are probed at the same
+time, one thread per port; each thread tries the baud rates in turn with
+a short timeout and a <GETVER>> handshake. A port can be opened only
+once, so the baud rates of one port are not probed in parallel.
+The last working port and baud rate are saved in ~/.gmc_datalogger and
+tried first next time.
+
+Session:
+One object owns the port for all commands. The port is opened on first
+use and kept open. After an I/O error (e.g. USB unplugged) it is closed
+and reopened with exponential backoff; if the device node is gone, the
+device is searched again (it may come back as another ttyUSB).
+Session has write/read/readinto/flushInput/close like serial.Serial, so it can be
+passed to the gmcparse routines instead of the port.
+'''
+
+# versions:
+# vers 2017-04: first version
+# vers 2017-04: read/readinto/flushInput raise if the port cannot be reopened
+
+import glob
+import json
+import os
+import threading
+import time
+
+
+BAUDS = (115200, 57600, 38400, 28800, 19200, 14400, 9600, 4800, 2400, 1200)
+PORTS = ('/dev/ttyUSB*', '/dev/ttyACM*')
+CACHEFILE = os.path.expanduser('~/.gmc_datalogger')
+TIMEOUT = 0.3   # per probe; GETVER answer is 14 bytes
+BACKOFF = 0.5   # first wait before reopening, doubled up to MAXBACKOFF
+MAXBACKOFF = 30.0
+
+
+def loadcache():
+    """Last working (port, baud) or (None, None)"""
+    try:
+        with open(CACHEFILE) as f:
+            c = json.load(f)
+        return str(c['port']), int(c['baud'])
+    except (IOError, ValueError, KeyError, TypeError):
+        return None, None
+
+
+def savecache(port, baud):
+    try:
+        with open(CACHEFILE, 'w') as f:
+            json.dump({'port': port, 'baud': baud}, f)
+    except IOError:
+        pass
+
+
+def candidates():
+    """Serial ports which may be a GMC device, last working one first"""
+    ports = []
+    for pattern in PORTS:
+        ports.extend(sorted(glob.glob(pattern)))
+    port = loadcache()[0]
+    if port in ports:
+        ports.remove(port)
+        ports.insert(0, port)
+    return ports
+
+
+def probe(port, baud, timeout=TIMEOUT):
+    """Model and firmware (e.g. 'GMC-320Re 4.20') if a GMC answers, else None"""
+    import serial
+    try:
+        ser = serial.Serial(port, baud, timeout=timeout)
+    except (serial.SerialException, OSError, ValueError):
+        return None
+    try:
+        # stop heartbeat (one CPS value per second), would garble the answer
+        ser.write(b'<HEARTBEAT0>>')
+        ser.flushInput()
+        ser.write(b'<GETVER>>')
+        rec = ser.read(14)
+    except (serial.SerialException, OSError):
+        rec = ''
+    finally:
+        ser.close()
+    if rec.startswith('GMC'):
+        return rec
+    return None
+
+
+def detect(ports=None, bauds=BAUDS, timeout=TIMEOUT):
+    """Find a GMC device, returns (port, baud, version) or None"""
+    cport, cbaud = loadcache()
+    # last working settings first, if allowed by ports and bauds
+    if cport and cbaud and (ports is None or cport in ports) and cbaud in bauds:
+        ver = probe(cport, cbaud, timeout)
+        if ver:
+            return cport, cbaud, ver
+    if ports is None:
+        ports = candidates()
+    if cbaud in bauds:
+        bauds = (cbaud,) + tuple(b for b in bauds if b != cbaud)
+    found = []
+    done = threading.Event()
+
+    def run(port):
+        for baud in bauds:
+            if done.is_set():
+                return
+            ver = probe(port, baud, timeout)
+            if ver:
+                found.append((port, baud, ver))
+                done.set()
+                return
+
+    threads = [threading.Thread(target=run, args=(p,)) for p in ports]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+    if not found:
+        return None
+    port, baud, ver = found[0]
+    savecache(port, baud)
+    return port, baud, ver
+
+
+class Session(object):
+    """Serial port opened on first use, reused, reopened after errors"""
+
+    def __init__(self, port=None, baud=None, timeout=3, attempts=8):
+        self.port = port
+        self.baud = baud
+        self.timeout = timeout
+        self.attempts = attempts    # reopen attempts before giving up
+        self.ser = None
+        self.reconnects = 0
+
+    def __str__(self):
+        return str(self.ser) if self.ser else "Session({!s}, {!s}) closed".format(self.port, self.baud)
+
+    @property
+    def name(self):
+        return self.port
+
+    def configure(self, port, baud):
+        """New port or baud rate: close the old port (reopened on next use)"""
+        if (port, baud) != (self.port, self.baud):
+            self.close()
+            self.port = port
+            self.baud = baud
+
+    def open(self, attempts=None):
+        """Open port if not open, with backoff; returns the serial.Serial"""
+        import serial
+        if self.ser is not None:
+            return self.ser
+        if attempts is None:
+            attempts = self.attempts
+        delay = BACKOFF
+        while True:
+            if self.port and not os.path.exists(self.port):
+                # unplugged: may be back under another name
+                found = detect(bauds=(self.baud,) if self.baud else BAUDS)
+                if found:
+                    self.port, self.baud = found[:2]
+            try:
+                self.ser = serial.Serial(self.port, self.baud, timeout=self.timeout)
+                return self.ser
+            except (serial.SerialException, OSError):
+                attempts -= 1
+                if attempts <= 0:
+                    raise
+            time.sleep(delay)
+            delay = min(delay * 2, MAXBACKOFF)
+
+    def close(self):
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+            self.ser = None
+
+    def _lost(self):
+        # I/O error: drop the port, reopen (with backoff) on next use
+        self.close()
+        self.reconnects += 1
+
+    def write(self, data):
+        import serial
+        ser = self.open()   # errors of open() (after backoff) go to the caller
+        try:
+            return ser.write(data)
+        except (serial.SerialException, OSError):
+            # port failed while open: one quick reopen, no second backoff
+            self._lost()
+            return self.open(1).write(data)
+
+    def read(self, n):
+        # after an error the command is lost: return a short read, so the
+        # caller (serialCOMM) may repeat the command
+        # errors of open() (port gone after all attempts) go to the caller
+        import serial
+        ser = self.open()
+        try:
+            return ser.read(n)
+        except (serial.SerialException, OSError):
+            self._lost()
+            return ''
+
+    def readinto(self, b):
+        import serial
+        ser = self.open()
+        try:
+            return ser.readinto(b)
+        except (serial.SerialException, OSError):
+            self._lost()
+            return 0
+
+    def flushInput(self):
+        import serial
+        ser = self.open()
+        try:
+            ser.flushInput()
+        except (serial.SerialException, OSError):
+            self._lost()
+
+
+if __name__ == '__main__':
+    res = detect()
+    if res:
+        print "{:s} at {:d} baud: {:s}".format(*res)
+    else:
+        print "No GMC device found"
@@ -0,0 +1,209 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Live data for several local programs through shared memory
+
+Only one program can use the serial port. It publishes every live
+sample (time, CPM) with Ring.publish() into a memory mapped file; any
+number of Readers follow the samples without locks and without serial
+traffic.
+
+Layout (little endian): header of HEAD bytes: 'GMCR', version, number of
+slots, sequence number of the last sample; then the slots, sample seq in
+slot seq % slots: sequence number, time (epoch sec), CPM. The writer
+clears the sequence number of a slot while writing it and sets the
+header last, so a reader sees a sample completely or not at all.
+
+A reader falling behind by more than the ring size (or a slot
+overwritten while read) is an overrun: the samples in between are lost,
+counted in Reader.lost, and the reader continues at the latest sample.
+
+Usage:
+    gmcshm.py [RING]    print the samples published (default: RING)
+'''
+
+# versions:
+# vers 2017-04: first version
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # no lock against a second writer (Windows)
+    fcntl = None
+
+
+MAGIC = 'GMCR'
+VERSION = 1
+SLOTS = 4096                 # samples kept, about 1 h of 1 s samples
+HEAD = 64                    # header bytes
+_HEADER = struct.Struct('<4sB3xI')
+_SEQ = struct.Struct('<Q')   # at SEQPOS in the header, first field of a slot
+SEQPOS = 16
+_SLOT = struct.Struct('<Qqq')
+_DATA = struct.Struct('<qq')
+_ZERO = _SEQ.pack(0)
+RING = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+                    'gmc_live.ring')
+
+
+def _size(slots):
+    return HEAD + slots * _SLOT.size
+
+
+class Ring(object):
+    """Writer of the ring file path; one writer at a time (IOError else)
+
+    An existing ring of the same size is continued (sequence numbers go
+    on, readers keep following across a restart of the writer).
+    """
+
+    def __init__(self, path=None, slots=SLOTS):
+        self.path = path = path or RING
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0644)
+        try:
+            if fcntl:
+                try:
+                    fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except IOError:
+                    raise IOError("live data ring {:s} in use by another program".format(path))
+            size = _size(slots)
+            head = os.read(self.fd, _HEADER.size) if os.fstat(self.fd).st_size == size else ''
+            if len(head) != _HEADER.size or _HEADER.unpack(head) != (MAGIC, VERSION, slots):
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, size)
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                os.write(self.fd, _HEADER.pack(MAGIC, VERSION, slots))
+            self.mm = mmap.mmap(self.fd, size)
+        except Exception:
+            os.close(self.fd)
+            raise
+        self.slots = slots
+        self.seq = _SEQ.unpack_from(self.mm, SEQPOS)[0]
+
+    def publish(self, t, cpm):
+        """Add sample (epoch sec, CPM), returns its sequence number"""
+        seq = self.seq + 1
+        pos = HEAD + (seq % self.slots) * _SLOT.size
+        mm = self.mm
+        # slice assignment, not pack_into: that clears the bytes first
+        s = _SEQ.pack(seq)
+        mm[pos:pos + 8] = _ZERO
+        mm[pos + 8:pos + _SLOT.size] = _DATA.pack(t, cpm)
+        mm[pos:pos + 8] = s
+        mm[SEQPOS:SEQPOS + 8] = s
+        self.seq = seq
+        return seq
+
+    def close(self):
+        if self.mm:
+            self.mm.close()
+            self.mm = None
+            os.close(self.fd)
+
+
+class Reader(object):
+    """Follows the samples of the ring file path
+
+    backlog: start with the samples still in the ring, else only new ones.
+    """
+
+    def __init__(self, path=None, backlog=False):
+        self.path = path = path or RING
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.slots = _HEADER.unpack_from(self.mm)
+        if magic != MAGIC or version != VERSION or len(self.mm) < _size(self.slots):
+            self.mm.close()
+            raise ValueError("not a live data ring: " + path)
+        head = self.head()
+        self.next = max(head - self.slots + 2, 1) if backlog else head + 1
+        self.lost = 0        # samples missed by overruns
+        self.overruns = 0
+
+    def head(self):
+        """Sequence number of the latest sample"""
+        # unpack reads byte by byte: read again until not torn by a write
+        seq = _SEQ.unpack_from(self.mm, SEQPOS)[0]
+        while True:
+            again = _SEQ.unpack_from(self.mm, SEQPOS)[0]
+            if again == seq:
+                return seq
+            seq = again
+
+    def _resync(self, head):
+        # continue at the latest sample
+        self.overruns += 1
+        self.lost += max(head - self.next, 0)
+        self.next = head
+
+    def poll(self):
+        """New samples [(time, CPM), ...] since the last call"""
+        mm = self.mm
+        out = []
+        head = self.head()
+        if head < self.next - 1:
+            # new ring (other size or version): start again
+            self.next = head + 1
+        elif self.next < head - self.slots + 2:
+            # slot of head - slots + 1 is the next one written
+            self._resync(head)
+        while self.next <= head:
+            pos = HEAD + (self.next % self.slots) * _SLOT.size
+            seq, t, cpm = _SLOT.unpack_from(mm, pos)
+            if seq == self.next and _SEQ.unpack_from(mm, pos)[0] == seq:
+                out.append((t, cpm))
+                self.next += 1
+            elif seq < self.next:
+                # not written yet
+                break
+            else:
+                # overwritten while behind
+                head = self.head()
+                self._resync(head)
+        return out
+
+    def follow(self, interval=0.1):
+        """Yield (time, CPM) of new samples, polling every interval seconds"""
+        while True:
+            for s in self.poll():
+                yield s
+            time.sleep(interval)
+
+    def writing(self):
+        """True if a writer has the ring open (None: unknown, no flock)"""
+        if not fcntl:
+            return None
+        with open(self.path, 'rb') as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except IOError:
+                return True
+        return False
+
+    def close(self):
+        if self.mm:
+            self.mm.close()
+            self.mm = None
+
+
+if __name__ == '__main__':
+    import gmcwrite
+    rd = Reader(sys.argv[1] if len(sys.argv) > 1 else RING)
+    try:
+        for t, cpm in rd.follow():
+            print "{:s}  {:d}".format(gmcwrite.timestr(t), cpm)
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if rd.lost:
+            print "{:d} samples lost in {:d} overruns".format(rd.lost, rd.overruns)
+        rd.close()
@@ -0,0 +1,403 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Output sinks for decoded records, fed by a batching pipeline
+
+Sinks receive record batches (gmcdecode.RecordBatch), not single lines:
+    TextSink     plain, csv or tsv text (gmcwrite); file name '-': stdout
+    JsonlSink    JSON Lines, one object per record
+    JsonSink     JSON array of the same objects
+    SqliteSink   SQLite table 'records' (time, count, kind, offset, tag)
+    ColumnSink   columnar binary (*.gmcc), see readcolumns()
+forfile() selects a sink by file name extension.
+
+Pipeline fans out batches to any number of sinks. Each sink has its own
+thread and a bounded queue, so a slow sink (e.g. SQLite on a network
+drive) delays the others only when its queue is full (backpressure),
+or never if the pipeline is created with block=False (batches for a
+full queue are dropped and counted). Live data is collected by append()
+and passed on every batchsize records or maxdelay seconds.
+
+Columnar binary format (little endian):
+    "GMCC" version (2), then blocks:
+    n (uint32)  ntags (uint32)  len (uint32) of JSON tag list
+    type codes of times and counts (2 chars, as gmcdecode.RecordBatch)
+    times[n]  counts[n]  kinds int8[n]  offsets uint32[n]  tags JSON
+    times: seconds since gmcdecode.TSTART, uint32 ('I') or float64 ('d')
+    counts: uint16 ('H') or uint32 ('I')
+    counts of ID tag records are indices into the tag list of the block
+    (tag strings are stored as latin-1, like in JSON Lines)
+    Version 1 (still read): no type codes, times int32 epoch seconds,
+    counts int32.
+'''
+
+# versions:
+# vers 2017-04: first version
+# vers 2017-04: GMCC version 2, times since TSTART (all device years)
+# vers 2017-04: *.json is a JSON array (JsonSink), not JSON Lines
+
+import array
+import itertools
+import json
+import Queue
+import struct
+import sys
+import threading
+import time
+
+import gmcdecode
+import gmcprof
+import gmcwrite
+from gmcdecode import KIND_TIME, KIND_TAG
+
+
+BATCHSIZE = 16384   # records per batch
+QUEUESIZE = 8       # batches waiting per sink
+MAXDELAY = 2.0      # seconds, live data
+COLMAGIC = 'GMCC'
+COLVERSION = 2
+_BIGENDIAN = sys.byteorder == 'big'
+
+
+class Sink(object):
+    """Base class; open(), write() and close() run in the sink thread"""
+
+    name = 'sink'
+
+    def open(self):
+        pass
+
+    def write(self, rb):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class TextSink(Sink):
+    """Text as gmcwrite: plain, csv or tsv; fn '-' is stdout"""
+
+    def __init__(self, fn, fmt=None, withtags=False):
+        self.fn = fn
+        self.fmt = fmt or gmcwrite.formatfor(fn)
+        self.withtags = withtags
+        self.name = self.fmt
+        self.f = None
+
+    def open(self):
+        self.f = sys.stdout if self.fn == '-' else open(self.fn, 'w', gmcwrite.BUFSIZE)
+        self.f.write(gmcwrite.header(self.fmt))
+
+    def write(self, rb):
+        for blk in gmcwrite.blocks(rb, self.fmt, self.withtags):
+            self.f.write(blk)
+
+    def close(self):
+        if self.f is sys.stdout:
+            self.f.flush()
+        elif self.f:
+            self.f.close()
+
+
+class JsonlSink(Sink):
+    """JSON Lines: {"time": ..., "count": n}, {"time": ..., "timetag": mode}, {"time": ..., "tag": s}"""
+
+    name = 'jsonl'
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.f = None
+
+    def open(self):
+        self.f = open(self.fn, 'w', gmcwrite.BUFSIZE)
+
+    def objects(self, rb):
+        """JSON text of the records of rb, one string each"""
+        out = []
+        timestr = gmcwrite.timestr
+        for t, c, k in itertools.izip(rb.epochs(), rb.counts, rb.kinds):
+            if k == KIND_TIME:
+                out.append('{{"time": "{:s}", "timetag": {:d}}}'.format(timestr(t), c))
+            elif k == KIND_TAG:
+                out.append('{{"time": "{:s}", "tag": {:s}}}'.format(timestr(t), json.dumps(rb.tags[c].decode('latin-1'))))
+            else:
+                out.append('{{"time": "{:s}", "count": {:d}}}'.format(timestr(t), c))
+        return out
+
+    def write(self, rb):
+        out = self.objects(rb)
+        if out:
+            self.f.write('\n'.join(out) + '\n')
+
+    def close(self):
+        if self.f:
+            self.f.close()
+
+
+class JsonSink(JsonlSink):
+    """JSON array of the objects of JsonlSink, one per line"""
+
+    name = 'json'
+
+    def open(self):
+        JsonlSink.open(self)
+        self.f.write('[')
+        self.sep = '\n'
+
+    def write(self, rb):
+        out = self.objects(rb)
+        if out:
+            self.f.write(self.sep + ',\n'.join(out))
+            self.sep = ',\n'
+
+    def close(self):
+        if self.f:
+            self.f.write('\n]\n')
+            self.f.close()
+
+
+class SqliteSink(Sink):
+    """SQLite table records(time, count, kind, offset, tag), time as epoch seconds"""
+
+    name = 'sqlite'
+
+    def __init__(self, fn, table='records'):
+        self.fn = fn
+        self.table = table
+        self.db = None
+
+    def open(self):
+        import sqlite3
+        # connection must be made in the thread using it
+        self.db = sqlite3.connect(self.fn)
+        self.db.execute('CREATE TABLE IF NOT EXISTS {:s} (time INTEGER, count INTEGER, '
+                        'kind INTEGER, offset INTEGER, tag TEXT)'.format(self.table))
+        self.insert = 'INSERT INTO {:s} VALUES (?, ?, ?, ?, ?)'.format(self.table)
+
+    def write(self, rb):
+        tags = rb.tags
+        rows = ((t, c, k, o, tags[c].decode('latin-1') if k == KIND_TAG else None)
+                for t, c, k, o in itertools.izip(rb.epochs(), rb.counts, rb.kinds, rb.offsets))
+        with self.db:
+            self.db.executemany(self.insert, rows)
+
+    def close(self):
+        if self.db:
+            self.db.execute('CREATE INDEX IF NOT EXISTS {0:s}_time ON {0:s} (time)'.format(self.table))
+            self.db.commit()
+            self.db.close()
+
+
+def _le(a, code):
+    # array as little endian bytes of type code (no copy if a is already)
+    if a.typecode != code:
+        a = array.array(code, a)
+    if _BIGENDIAN:
+        a = array.array(code, a)
+        a.byteswap()
+    return a.tostring()
+
+
+class ColumnSink(Sink):
+    """Columnar binary file (*.gmcc), read by readcolumns()"""
+
+    name = 'columns'
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.f = None
+
+    def open(self):
+        self.f = open(self.fn, 'wb', gmcwrite.BUFSIZE)
+        self.f.write(COLMAGIC + chr(COLVERSION))
+
+    def write(self, rb):
+        counts = rb.counts
+        tags = []
+        if rb.tags:
+            # ID tags: local numbering per block
+            ks = rb.kinds.tostring()
+            used = []
+            i = ks.find(chr(KIND_TAG))
+            while i >= 0:
+                used.append(i)
+                i = ks.find(chr(KIND_TAG), i + 1)
+            counts = array.array(gmcdecode.fitcode(counts.typecode, 0, len(used)), counts)
+            for i in used:
+                counts[i] = len(tags)
+                tags.append(rb.tags[rb.counts[i]])
+        tj = json.dumps([s.decode('latin-1') for s in tags])
+        self.f.write(struct.pack('<III2s', len(rb), len(tags), len(tj),
+                                 rb.times.typecode + counts.typecode))
+        self.f.write(_le(rb.times, rb.times.typecode))
+        self.f.write(_le(counts, counts.typecode))
+        self.f.write(rb.kinds.tostring())
+        self.f.write(_le(rb.offsets, 'I'))
+        self.f.write(tj)
+
+    def close(self):
+        if self.f:
+            self.f.close()
+
+
+def readcolumns(fn):
+    """RecordBatch of a columnar binary file"""
+    rb = gmcdecode.RecordBatch()
+    with open(fn, 'rb') as f:
+        if f.read(4) != COLMAGIC:
+            raise ValueError("not a GMCC file")
+        version = ord(f.read(1) or '\0')
+        if version not in (1, COLVERSION):
+            raise ValueError("GMCC version {:d} not supported".format(version))
+        while True:
+            head = f.read(12 if version == 1 else 14)
+            if not head:
+                break
+            if version == 1:
+                n, ntags, lt = struct.unpack('<III', head)
+                tcode, ccode = 'i', 'i'
+            else:
+                n, ntags, lt, codes = struct.unpack('<III2s', head)
+                tcode, ccode = codes
+            part = gmcdecode.RecordBatch()
+            for name, code in (('times', tcode), ('counts', ccode),
+                               ('kinds', 'b'), ('offsets', 'I')):
+                a = array.array(code)
+                a.fromstring(f.read(n * a.itemsize))
+                if _BIGENDIAN and a.itemsize > 1:
+                    a.byteswap()
+                setattr(part, name, a)
+            if version == 1:
+                # epoch seconds, int32 counts
+                ts = [t - gmcdecode.TSTART for t in part.times]
+                part.times = array.array(gmcdecode.fitcode(gmcdecode.TIMECODE, min(ts or [0]), max(ts or [0])), ts)
+                part.counts = array.array(gmcdecode.fitcode(gmcdecode.COUNTCODE, 0, max(part.counts or [0])),
+                                          part.counts)
+            part.tags = [s.encode('latin-1') for s in json.loads(f.read(lt))]
+            rb.extend(part)
+    return rb
+
+
+def forfile(fn, fmt=None, withtags=False):
+    """Sink for file name fn, by extension; '-' is stdout"""
+    low = fn.lower()
+    if low.endswith('.jsonl'):
+        return JsonlSink(fn)
+    if low.endswith('.json'):
+        return JsonSink(fn)
+    if low.endswith(('.sqlite', '.db')):
+        return SqliteSink(fn)
+    if low.endswith('.gmcc'):
+        return ColumnSink(fn)
+    return TextSink(fn, fmt, withtags)
+
+
+class _Worker(threading.Thread):
+    # thread of one sink, fed by a bounded queue
+    def __init__(self, sink, queuesize, block):
+        threading.Thread.__init__(self, name='sink-' + sink.name)
+        self.daemon = True
+        self.sink = sink
+        self.queue = Queue.Queue(queuesize)
+        self.block = block
+        self.error = None
+        self.dropped = 0
+
+    def put(self, rb):
+        if self.error:
+            return
+        if self.block:
+            self.queue.put(rb)
+        else:
+            try:
+                self.queue.put_nowait(rb)
+            except Queue.Full:
+                self.dropped += len(rb)
+
+    def run(self):
+        timer = 'sink.' + self.sink.name
+        try:
+            self.sink.open()
+            while True:
+                rb = self.queue.get()
+                if rb is None:
+                    break
+                with gmcprof.timer(timer, len(rb)):
+                    self.sink.write(rb)
+        except Exception as e:
+            self.error = e
+            # keep taking batches, the producer must not block
+            while self.queue.get() is not None:
+                pass
+        finally:
+            try:
+                self.sink.close()
+            except Exception as e:
+                self.error = self.error or e
+
+
+class Pipeline(object):
+    """Pass record batches to sinks, each in its own thread
+
+    with Pipeline([sink, ...]) as p:
+        p.write(rb)           # decoded data
+        p.append(t, count)    # live data
+    """
+
+    def __init__(self, sinks, batchsize=BATCHSIZE, queuesize=QUEUESIZE,
+                 maxdelay=MAXDELAY, block=True):
+        self.batchsize = batchsize
+        self.maxdelay = maxdelay
+        self.workers = [_Worker(s, queuesize, block) for s in sinks]
+        for w in self.workers:
+            w.start()
+        self.pending = gmcdecode.RecordBatch()
+        self.since = None
+
+    def write(self, rb):
+        """Pass all records of rb, in batches"""
+        self.flush()
+        for i in xrange(0, len(rb), self.batchsize):
+            b = rb.slice(i, i + self.batchsize) if len(rb) > self.batchsize else rb
+            for w in self.workers:
+                w.put(b)
+
+    def append(self, t, count, kind=gmcdecode.KIND_COUNT, offset=0):
+        """One live record; passed on with the next batch"""
+        p = self.pending
+        p.append(t, count, kind, offset)
+        now = time.time()
+        if self.since is None:
+            self.since = now
+        if len(p) >= self.batchsize or now - self.since >= self.maxdelay:
+            self.flush()
+
+    def flush(self):
+        """Pass records collected by append()"""
+        if len(self.pending):
+            for w in self.workers:
+                w.put(self.pending)
+            self.pending = gmcdecode.RecordBatch()
+        self.since = None
+
+    def dropped(self):
+        """{sink name: records dropped} (block=False only)"""
+        return dict((w.sink.name, w.dropped) for w in self.workers)
+
+    def close(self):
+        """Write pending records, wait for all sinks; raises first sink error"""
+        self.flush()
+        for w in self.workers:
+            w.queue.put(None)
+        for w in self.workers:
+            w.join()
+        for w in self.workers:
+            if w.error:
+                raise w.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, value, tb):
+        self.close()
@@ -0,0 +1,217 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Summary of the measurement runs of a dump
+
+A run (segment) starts at a time tag or an ID tag and ends at the next
+one. Per segment: start, end, duration, interval mode, records, total
+counts, mean, max and min CPM (counts of sec mode scaled to CPM; min
+and hour mode records are CPM already), ID tag text and offset of the tag.
+
+The segments are summed up while decoding (gmcdecode.decode(...,
+summary=Summary())), one run of plain counts at a time, so the report
+costs no second pass over the data. summarize() does the same for a
+RecordBatch decoded before.
+
+Usage:
+    gmcsummary.py DUMPFILE [OUTPUT]    OUTPUT *.json, *.jsonl, *.csv or text
+'''
+
+# versions:
+# vers 2017-04: first version
+# vers 2017-04: hour mode is CPM; summarize() starts at the first record
+
+import collections
+import csv
+import json
+import re
+import sys
+
+import gmcdecode
+from gmcdecode import TSTART, TICKS, KIND_TIME, KIND_TAG
+
+
+Segment = collections.namedtuple(
+    'Segment', 'start end duration mode records total mean max min tag offset')
+
+# count per record -> CPM, per interval mode off, sec, min, hour
+# (hour mode: one CPM value per hour)
+CPM = (1.0, 60.0, 1.0, 1.0)
+MODES = ('off', 'sec', 'min', 'hour')
+FIELDS = Segment._fields
+_TAGKINDS = re.compile('[{:c}{:c}]'.format(KIND_TIME, KIND_TAG))
+
+
+class Summary(object):
+    """Segments of decoded data, fed by the decoder
+
+    tstart, idcpm: decoder state at the start, as given to gmcdecode.decode
+    """
+
+    def __init__(self, tstart=TSTART, idcpm=2, offset=0):
+        self.segments = []
+        self.mode = idcpm
+        self._open(tstart, None, offset)
+
+    def _open(self, t, tag, offset):
+        self.start = self.next = t
+        self.label = tag
+        self.offset = offset
+        self.records = self.total = 0
+        self.max = -1
+        self.min = 1 << 30
+
+    def _close(self):
+        if not self.records:
+            return
+        f = CPM[self.mode] if self.mode < 4 else 1.0
+        self.segments.append(Segment(
+            self.start, self.next, self.next - self.start, self.mode, self.records, self.total,
+            self.total * f / self.records, self.max * f, self.min * f, self.label, self.offset))
+
+    def _tick(self):
+        return TICKS[self.mode] if self.mode < 4 else 60
+
+    def counts(self, t, values):
+        """Run of count records, the first at time t"""
+        n = len(values)
+        if not n:
+            return
+        self.records += n
+        self.total += sum(values)
+        self.max = max(self.max, max(values))
+        self.min = min(self.min, min(values))
+        self.next = t + n * self._tick()
+
+    def timetag(self, t, mode, offset):
+        self._close()
+        # an ID tag directly before the time tag names this run
+        tag = self.label if not self.records else None
+        if mode < 4:
+            self.mode = mode
+        self._open(t, tag, offset)
+
+    def tag(self, t, text, offset):
+        self._close()
+        self._open(t, text, offset)
+
+    def restart(self, t, mode, offset):
+        """New segment at t in interval mode, e.g. a time window starting within a run"""
+        self._close()
+        tag = self.label if not self.records else None
+        if mode < 4:
+            self.mode = mode
+        self._open(t, tag, offset)
+
+    def close(self):
+        """Finish the last segment, returns all segments"""
+        self._close()
+        self.records = 0
+        return self.segments
+
+    def table(self):
+        """Segments as text table"""
+        import gmcwrite
+        out = ["  #  start                end                  duration  mode  records"
+               "     total  mean CPM  max CPM  min CPM  tag"]
+        for i, s in enumerate(self.segments):
+            h, m = divmod(s.duration, 3600)
+            out.append(("{:3d}  {:s}  {:s}  {:4d}:{:02d}:{:02d}  {:4s}  {:7d}  {:8d}"
+                        "  {:8.1f}  {:7.0f}  {:7.0f}  {:s}").format(
+                i + 1, gmcwrite.timestr(s.start), gmcwrite.timestr(s.end), h, m // 60, m % 60,
+                MODES[s.mode] if s.mode < 4 else str(s.mode), s.records, s.total, s.mean, s.max, s.min,
+                s.tag or ''))
+        return "\n".join(out)
+
+    def rows(self):
+        """Segments as dicts, times as 'YYYY-MM-DD HH:MM:SS'"""
+        import gmcwrite
+        rows = []
+        for s in self.segments:
+            d = s._asdict()
+            d['start'] = gmcwrite.timestr(s.start)
+            d['end'] = gmcwrite.timestr(s.end)
+            d['tag'] = s.tag.decode('latin-1') if s.tag is not None else None
+            rows.append(d)
+        return rows
+
+    def write(self, fn):
+        """Save segments to fn: *.json, *.jsonl, *.csv, else text table"""
+        low = fn.lower()
+        with open(fn, 'wb' if low.endswith('.csv') else 'w') as f:
+            if low.endswith('.jsonl'):
+                for r in self.rows():
+                    f.write(json.dumps(r) + "\n")
+            elif low.endswith('.json'):
+                json.dump(self.rows(), f, indent=1)
+            elif low.endswith('.csv'):
+                w = csv.DictWriter(f, FIELDS)
+                w.writeheader()
+                for r in self.rows():
+                    if r['tag'] is not None:
+                        r['tag'] = r['tag'].encode('utf-8')
+                    w.writerow(r)
+            else:
+                f.write(self.table() + "\n")
+
+
+def decode(data):
+    """(RecordBatch, Summary) of raw data in one decoding pass
+
+    The RecordBatch is put into the cache (gmccache) for later users.
+    """
+    import gmccache
+    s = Summary()
+    rb = gmcdecode.decode(data, summary=s)
+    s.close()
+    gmccache.cache.put(gmccache.key(data), rb)
+    return rb, s
+
+
+def summarize(rb, idcpm=2, summary=None):
+    """Summary of a RecordBatch (e.g. from the cache or an index query)
+
+    The first segment starts at the first record, in interval mode idcpm
+    (mode of the records before the first time tag). summary: Summary to
+    add the segments to (not closed), e.g. one per part of a time window.
+    """
+    s = summary if summary is not None else Summary()
+    if len(rb):
+        s.restart(rb.time(0), idcpm, rb.offsets[0])
+    counts, kinds = rb.counts, rb.kinds
+    i, n = 0, len(rb)
+    ks = kinds.tostring()
+    while i < n:
+        k = kinds[i]
+        if k == KIND_TIME:
+            s.timetag(rb.time(i), counts[i], rb.offsets[i])
+            i += 1
+        elif k == KIND_TAG:
+            s.tag(rb.time(i), rb.tags[counts[i]], rb.offsets[i])
+            i += 1
+        else:
+            # run of count records up to the next tag
+            m = _TAGKINDS.search(ks, i)
+            j = m.start() if m else n
+            s.counts(rb.time(i), counts[i:j])
+            i = j
+    if summary is None:
+        s.close()
+    return s
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+    with open(sys.argv[1], 'rb') as f:
+        data = f.read()
+    if sys.argv[1].endswith('.gmcz'):
+        import gmccodec
+        data = gmccodec.decompress(data)
+    rb, summary = decode(data)
+    if len(sys.argv) > 2:
+        summary.write(sys.argv[2])
+    else:
+        print summary.table()
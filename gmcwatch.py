@@ -0,0 +1,267 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''Watch folder
+Decode dump files dropped into a directory and write them to the outputs.
+
+New files are found by inotify (Linux), else by listing the directory
+every few seconds. A file is taken when its size and time stamp have not
+changed for --settle seconds (still being copied otherwise). Every
+file taken is added to a ledger (JSON lines, default DIR/.gmcwatch.ledger)
+with size, time stamp and SHA1, so it is not processed again, also after
+a restart; files with the same content under another name are skipped.
+Files arrived while not running are processed at start.
+
+Outputs (see gmcsink), comma separated: a name containing {name} gives
+one file per dump (e.g. out/{name}.csv), others collect all dumps
+(e.g. all.sqlite). Relative names are relative to DIR, so by default
+DIR/dump.csv is written next to DIR/dump.bin.
+
+Usage:
+  gmcwatch.py [options] DIR
+
+Options:
+  -o OUT, --output OUT     Output file(s), comma separated, relative to DIR [default: {name}.csv]
+  -p PAT, --pattern PAT    File name patterns, comma separated [default: *.bin,*.gmcz]
+  -s SEC, --settle SEC     Seconds without change before a file is taken [default: 2]
+  -i SEC, --interval SEC   Seconds between directory listings without inotify [default: 5]
+  -l FILE, --ledger FILE   Ledger of processed files (default: DIR/.gmcwatch.ledger)
+  -1, --once               Process waiting files and exit
+  -v, --verbose            Print each file
+  -h --help                Show help
+'''
+
+# versions:
+# vers 2017-04: first version
+# vers 2017-04: outputs relative to DIR
+
+import fnmatch
+import hashlib
+import json
+import os
+import select
+import struct
+import time
+
+import gmcdecode
+import gmcsink
+
+
+PATTERNS = ('*.bin', '*.gmcz')
+SETTLE = 2.0     # seconds without change
+INTERVAL = 5.0   # seconds between listings (no inotify)
+RESCAN = 300.0   # seconds between listings with inotify, for lost events
+LEDGER = '.gmcwatch.ledger'
+
+IN_CLOSE_WRITE = 0x08
+IN_MOVED_TO = 0x80
+IN_Q_OVERFLOW = 0x4000
+
+
+class Inotify(object):
+    """inotify of a directory via libc (Linux only), raises OSError else"""
+
+    def __init__(self, path):
+        import ctypes
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            init = libc.inotify_init
+        except (OSError, AttributeError):
+            raise OSError("no inotify")
+        self.fd = init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init")
+        if libc.inotify_add_watch(self.fd, path, IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            e = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(e, "inotify_add_watch " + path)
+
+    def wait(self, timeout):
+        """Names of files written or moved in within timeout; None: events lost"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        buf = os.read(self.fd, 1 << 16)
+        names = []
+        i = 0
+        while i + 16 <= len(buf):
+            wd, mask, cookie, n = struct.unpack_from('iIII', buf, i)
+            if mask & IN_Q_OVERFLOW:
+                return None
+            names.append(buf[i + 16:i + 16 + n].rstrip('\0'))
+            i += 16 + n
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Ledger(object):
+    """Processed files, appended to a JSON lines file"""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.seen = set()      # (name, size, mtime)
+        self.hashes = set()
+        try:
+            with open(fn) as f:
+                for ln in f:
+                    try:
+                        e = json.loads(ln)
+                    except ValueError:
+                        # last line cut by a crash
+                        continue
+                    self.seen.add((e['name'].encode('utf-8'), e['size'], e['mtime']))
+                    self.hashes.add(e['sha1'])
+        except IOError:
+            pass
+        self.f = open(fn, 'a')
+
+    def __contains__(self, key):
+        return key in self.seen
+
+    def add(self, entry):
+        self.seen.add((entry['name'], entry['size'], entry['mtime']))
+        self.hashes.add(entry['sha1'])
+        self.f.write(json.dumps(entry) + "\n")
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.close()
+
+
+class Watcher(object):
+    """Watch directory, decode new dump files into outputs"""
+
+    def __init__(self, directory, outputs, patterns=PATTERNS, ledger=None,
+                 settle=SETTLE, interval=INTERVAL, verbose=False):
+        self.dir = directory
+        self.patterns = patterns
+        self.settle = settle
+        self.interval = interval
+        self.verbose = verbose
+        self.ledger = Ledger(ledger or os.path.join(directory, LEDGER))
+        # relative output names: next to the dumps ('-': stdout)
+        outputs = [o if o == '-' else os.path.join(directory, o) for o in outputs]
+        self.perfile = [o for o in outputs if '{name}' in o]
+        shared = [o for o in outputs if '{name}' not in o]
+        self.pipe = gmcsink.Pipeline([gmcsink.forfile(o) for o in shared]) if shared else None
+        self.pending = {}      # name -> (size, mtime, time of last change)
+
+    def wanted(self, name):
+        return any(fnmatch.fnmatch(name, p) for p in self.patterns)
+
+    def scan(self):
+        """Add all files of the directory not yet processed"""
+        for name in os.listdir(self.dir):
+            if self.wanted(name):
+                self.pending.setdefault(name, None)
+
+    def ready(self):
+        """Names of pending files unchanged for settle seconds, oldest first"""
+        now = time.time()
+        out = []
+        for name, last in self.pending.items():
+            try:
+                st = os.stat(os.path.join(self.dir, name))
+            except OSError:
+                # deleted or moved away
+                del self.pending[name]
+                continue
+            key = (name, st.st_size, st.st_mtime)
+            if key in self.ledger:
+                del self.pending[name]
+            elif last is None or last[:2] != key[1:]:
+                self.pending[name] = (st.st_size, st.st_mtime, now)
+            elif now - last[2] >= self.settle:
+                out.append((st.st_mtime, name))
+        return [name for _, name in sorted(out)]
+
+    def ingest(self, name):
+        size, mtime = self.pending.pop(name)[:2]
+        fn = os.path.join(self.dir, name)
+        with open(fn, 'rb') as f:
+            data = f.read()
+        entry = {'name': name, 'size': size, 'mtime': mtime, 'sha1': hashlib.sha1(data).hexdigest(),
+                 'time': time.strftime("%Y-%m-%d %H:%M:%S")}
+        if entry['sha1'] in self.ledger.hashes:
+            entry['status'] = 'duplicate'
+        else:
+            try:
+                if name.endswith('.gmcz'):
+                    import gmccodec
+                    data = gmccodec.decompress(data)
+                rb = gmcdecode.decode(data)
+                if self.pipe:
+                    self.pipe.write(rb)
+                if self.perfile:
+                    base = os.path.splitext(name)[0]
+                    with gmcsink.Pipeline([gmcsink.forfile(o.format(name=base)) for o in self.perfile]) as p:
+                        p.write(rb)
+                entry['records'] = len(rb)
+                entry['status'] = 'ok'
+            except Exception as e:
+                # kept in the ledger: not tried again unless the file changes
+                entry['status'] = 'error: {!s}'.format(e)
+        self.ledger.add(entry)
+        if self.verbose:
+            print "{:s}: {:s}".format(name, entry['status'])
+        return entry
+
+    def run(self, once=False):
+        """Process files until interrupted (once: only those waiting now)"""
+        try:
+            ino = Inotify(self.dir)
+        except OSError:
+            ino = None
+        self.scan()
+        lastscan = time.time()
+        try:
+            while True:
+                for name in self.ready():
+                    self.ingest(name)
+                if once:
+                    if not self.pending:
+                        return
+                    time.sleep(self.settle / 2)
+                    continue
+                timeout = self.settle / 2 if self.pending else self.interval
+                if ino:
+                    names = ino.wait(timeout if self.pending else RESCAN)
+                    if names is None or time.time() - lastscan > RESCAN:
+                        self.scan()
+                        lastscan = time.time()
+                    else:
+                        for name in names:
+                            if self.wanted(name):
+                                self.pending.setdefault(name, None)
+                else:
+                    time.sleep(timeout)
+                    self.scan()
+        finally:
+            if ino:
+                ino.close()
+            self.close()
+
+    def close(self):
+        if self.pipe:
+            self.pipe.close()
+            self.pipe = None
+        self.ledger.close()
+
+
+if __name__ == '__main__':
+    from docopt import docopt
+    arguments = docopt(__doc__)
+    w = Watcher(arguments['DIR'],
+                [o.strip() for o in arguments['--output'].split(',')],
+                tuple(p.strip() for p in arguments['--pattern'].split(',')),
+                arguments['--ledger'],
+                float(arguments['--settle']),
+                float(arguments['--interval']),
+                arguments['--verbose'])
+    try:
+        w.run(arguments['--once'])
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,185 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Write decoded records (gmcdecode.RecordBatch) as text
+
+Formats:
+plain:  "YYYY-MM-DD HH:MM:SS count" as written by analyse()
+csv:    "YYYY-MM-DD HH:MM:SS,count" with header line
+tsv:    same, tab separated
+
+Time stamps are not formatted by datetime per record: records between two
+tags are equidistant, so their time strings are slices of a prebuilt
+table of all seconds of a day plus a cached date prefix. Lines are joined
+and written in large blocks.
+'''
+
+# versions:
+# vers 2017-04: first version
+
+import array
+import datetime
+import re
+
+import gmcprof
+from gmcdecode import KIND_TIME, KIND_TAG, EPOCH, TSTART
+
+
+FORMATS = ('plain', 'csv', 'tsv')
+BLOCKSIZE = 65536   # records per write
+BUFSIZE = 1 << 20   # file buffer
+_TAGKINDS = re.compile('[{:c}{:c}]'.format(KIND_TIME, KIND_TAG))
+
+_HEADER = {
+    'plain': '',
+    'csv': 'time,count\n',
+    'tsv': 'time\tcount\n',
+}
+_SEP = {'plain': ' ', 'csv': ',', 'tsv': '\t'}
+
+_tod = []    # "HH:MM:SS" for every second of the day, built on first use
+_cnt = {}    # per format: separator + count string, filled on demand
+
+
+class _Cache(dict):
+    """dict which computes missing values by func(key)"""
+
+    def __init__(self, func):
+        dict.__init__(self)
+        self.func = func
+
+    def __missing__(self, key):
+        v = self[key] = self.func(key)
+        return v
+
+
+def _day(d):
+    return '{:%Y-%m-%d} '.format(EPOCH + datetime.timedelta(days=d))
+
+
+_days = _Cache(_day)
+
+
+def _tables(fmt):
+    if not _tod:
+        two = ['{:02d}'.format(i) for i in xrange(60)]
+        _tod.extend([h + ':' + m + ':' + s for h in two[:24] for m in two for s in two])
+    if fmt not in _cnt:
+        cf = (' {:5d}\n' if fmt == 'plain' else _SEP[fmt] + '{:d}\n').format
+        _cnt[fmt] = _Cache(cf)
+    return _tod, _cnt[fmt]
+
+
+def header(fmt):
+    """Header line of format fmt ('' for plain)"""
+    return _HEADER[fmt]
+
+
+def timestr(t):
+    """'YYYY-MM-DD HH:MM:SS' of epoch seconds t"""
+    _tables('plain')
+    return _days[t // 86400] + _tod[t % 86400]
+
+
+def formatfor(fn):
+    """Guess output format from file name extension"""
+    fn = str(fn).lower()
+    if fn.endswith('.csv'):
+        return 'csv'
+    if fn.endswith('.tsv'):
+        return 'tsv'
+    return 'plain'
+
+
+def tagline(rb, i):
+    """Message line of a time tag or ID tag record"""
+    if rb.kinds[i] == KIND_TIME:
+        dt = EPOCH + datetime.timedelta(seconds=rb.time(i))
+        return "* {:%Y-%m-%d %H:%M:%S} Dev. Timetag;  {:d}".format(dt, rb.counts[i])
+    return "* ID tag: {:s}".format(rb.tags[rb.counts[i]])
+
+
+def _run(rb, i, j, cnt):
+    # text parts of count records i..j-1 (no tags in between):
+    # date, time of day, separator + count + newline
+    ts = rb.times[i:j]    # seconds since TSTART
+    n = j - i
+    parts = [None] * (3 * n)
+    parts[2::3] = map(cnt.__getitem__, rb.counts[i:j])
+    t0 = int(ts[0])
+    tick = int(ts[1]) - t0 if n > 1 else 0
+    if tick >= 0 and ts[-1] == t0 + (n - 1) * tick and \
+            ts.tostring() == array.array(ts.typecode, xrange(t0, t0 + n * tick, tick) if tick else [t0] * n).tostring():
+        # equidistant, the usual case: slices of the time of day table
+        t0 += TSTART
+        r = 0
+        while r < n:
+            d, s = divmod(t0 + r * tick, 86400)
+            # records left in this day
+            k = min(n - r, (86400 - s + tick - 1) // tick) if tick else n
+            parts[3*r:3*(r+k):3] = [_days[d]] * k
+            parts[3*r+1:3*(r+k):3] = _tod[s:s + k * tick:tick] if tick else [_tod[s]] * k
+            r += k
+    else:
+        ts = list(rb.epochs(i, j))
+        parts[0::3] = [_days[t // 86400] for t in ts]
+        parts[1::3] = [_tod[t % 86400] for t in ts]
+    return parts
+
+
+def blocks(rb, fmt='plain', withtags=False, start=0, end=None, blocksize=BLOCKSIZE):
+    """Yield formatted text blocks of up to blocksize records
+
+    withtags: include time tag and ID tag messages (plain format only)
+    """
+    if end is None:
+        end = len(rb)
+    cnt = _tables(fmt)[1]
+    withtags = withtags and fmt == 'plain'
+    for a in xrange(start, end, blocksize):
+        b = min(a + blocksize, end)
+        out = []
+        i = a
+        # time tags and ID tags split the block into equidistant runs
+        for m in _TAGKINDS.finditer(rb.kinds[a:b].tostring()):
+            j = a + m.start()
+            if j > i:
+                out.extend(_run(rb, i, j, cnt))
+            if withtags:
+                out.append(tagline(rb, j) + '\n')
+            i = j + 1
+        if b > i:
+            out.extend(_run(rb, i, b, cnt))
+        if out:
+            yield ''.join(out)
+
+
+def lines(rb, fmt='plain', withtags=False, start=0, end=None):
+    """List of formatted lines (without newline)"""
+    out = []
+    for blk in blocks(rb, fmt, withtags, start, end):
+        out.extend(blk.splitlines())
+    return out
+
+
+def write(f, rb, fmt='plain', withtags=False, start=0, end=None):
+    """Write records to open file f"""
+    if _HEADER[fmt]:
+        f.write(_HEADER[fmt])
+    it = blocks(rb, fmt, withtags, start, end)
+    while True:
+        with gmcprof.timer('format'):
+            blk = next(it, None)
+        if blk is None:
+            break
+        with gmcprof.timer('file.write', len(blk)):
+            f.write(blk)
+
+
+def writefile(fn, rb, fmt=None, withtags=False):
+    """Write records to file fn; format from file name if not given"""
+    if fmt is None:
+        fmt = formatfor(fn)
+    with open(fn, 'w', BUFSIZE) as f:
+        write(f, rb, fmt, withtags)
@@ -18,6 +18,23 @@ import gwcp3  # GUI layout file. Created by: qtuic4 gwcp3.ui >gwcp3.py
 from gmcparse6 import *  # basic I/O routines
 import os  # directory methods
 import time
+import atexit
+import serial  # errors of the serial port
+import gmcprof  # stage timers, enabled by --profile
+import gmclink  # serial link statistics
+import gmccodec  # compressed dump archives (*.gmcz)
+import gmcserial  # device search, last serial settings
+import gmcalarm  # anomaly detection on count rates
+import gmcdecode  # raw data -> records
+import gmccache  # decoded data, by content
+import gmcfilter  # search in decoded data
+import gmcwrite  # decoded data -> text
+import gmcreplay  # dump file as live data
+import gmchex  # hex listing
+import gmcshm  # live data for other programs
+import gmcsummary  # table of the runs
+import gwcoverlay  # several dumps on one time axis
+from PyQt4 import QtCore
 
 
 class GmcApp(QtGui.QMainWindow, gwcp3.Ui_MainWindow):
@@ -35,7 +52,6 @@ class GmcApp(QtGui.QMainWindow, gwcp3.Ui_MainWindow):
         # define some global variables (might be improved later)
         helptextname="help.md"
         data =''
-        ser=''
         serialdev='/dev/ttyUSB0'
         #speed= 115200
         speedid=0
@@ -45,12 +61,31 @@ class GmcApp(QtGui.QMainWindow, gwcp3.Ui_MainWindow):
         
         self.menuFile.triggered[QtGui.QAction].connect(self.windowaction)
         self.menuHelp.triggered[QtGui.QAction].connect(self.windowaction)
+        self.menuHelp.addAction("Serial statistics")
+        self.menuFile.insertAction(self.actionQuit, QtGui.QAction("Find alerts", self))
+        self.menuFile.insertAction(self.actionQuit, QtGui.QAction("Replay dump...", self))
+        self.menuFile.insertAction(self.actionQuit, QtGui.QAction("Hex listing", self))
+        self.menuFile.insertAction(self.actionQuit, QtGui.QAction("Summary", self))
+        self.menuFile.insertAction(self.actionQuit, QtGui.QAction("Compare dumps...", self))
+        self.overlay= None
         self.radioButtonCSV.setChecked(True)
         
+        # last working device and baud rate (see gmcserial)
+        cport, cbaud = gmcserial.loadcache()
+        if cport:
+            serialdev=cport
+        if cbaud in gmcserial.BAUDS:
+            speedid=gmcserial.BAUDS.index(cbaud)
+        
         # preselect baud rate
         self.listWidgetspeed.setCurrentRow(speedid)
         speed=int(self.listWidgetspeed.currentItem().text())
         self.lineEditsetDev.setText(serialdev)
+        # one serial session for all commands, port opened on first use
+        # (files may be processed without device connected)
+        # GUI actions: one attempt to open, errors shown in the status bar
+        ser=gmcserial.Session(serialdev, speed, attempts=1)
+        self.lineEditsetDev.setToolTip("serial interface name; empty or 'auto': search device")
         
         #load bin file
         self.pushButtonLoadBin.clicked.connect(self.readbinfile)
@@ -70,6 +105,9 @@ class GmcApp(QtGui.QMainWindow, gwcp3.Ui_MainWindow):
         #time info
         self.pushButtongetTime.clicked.connect(self.timeinfo)
         
+        #filter bar
+        self.setupfilter()
+        
         #live data
         self.pushButtonLiveData.setCheckable(True)
         #.pushButtonLiveData.setChecked(False)
@@ -82,12 +120,30 @@ class GmcApp(QtGui.QMainWindow, gwcp3.Ui_MainWindow):
         
         print "triggered by menubar", q.text()
         if q.text() == "&Quit":
+            ser.close()
             sys.exit()
         elif q.text() =="Show Helpfile":
             with open(helptextname, mode='rb') as file:  
                 helptext = file.read()  
             self.clearplain()
             self.writeplain(helptext)
+        elif q.text() =="Serial statistics":
+            # latency, bytes/s, short reads and retries per command
+            self.writeplain(gmclink.stats.report())
+        elif q.text() =="Find alerts":
+            self.findalerts()
+        elif q.text() =="Replay dump...":
+            self.replay()
+        elif q.text() =="Hex listing":
+            # loaded data with markers, e.g. to look at corrupted flash
+            self.clearplain()
+            for blk in gmchex.blocks([data]):
+                self.writeplain(blk.rstrip("\n"))
+        elif q.text() =="Summary":
+            # runs between time/ID tags of the loaded data
+            self.summary()
+        elif q.text() =="Compare dumps...":
+            self.compare()
 
         
     def readbinfile(self):
@@ -96,26 +152,29 @@ class GmcApp(QtGui.QMainWindow, gwcp3.Ui_MainWindow):
         fname = QtGui.QFileDialog.getOpenFileName(self, 'Open file', '',"Data files (*.*)")
         with open(fname, mode='rb') as file:  
             data = file.read() 
+        if str(fname).endswith('.gmcz'):
+            data = gmccodec.decompress(data)
         msg= "{:d} bytes loaded from {:s}".format(len(data),fname)
         self.statusBar().showMessage(msg) 
         self.processdata()
+        self.showprofile()
     
     
     def readdev(self):
         global ser, data
         
-        # ser not defined in init in order to process files even if no device connected
-        if not ser:
-            #print "set ser"
-            #ser = serial.Serial('/dev/ttyUSB0', 115200, timeout= 3) 
-            ser = serial.Serial(serialdev, speed, timeout= 3) 
         self.statusBar().clear()
         self.statusBar().showMessage("loading...") 
         print "loading..."
-        data = readHIST(ser)
+        try:
+            data = readHIST(ser)
+        except (serial.SerialException, OSError, IOError) as e:
+            self.serialerror(e)
+            return
         msg= "{:d} bytes read from device".format(len(data))
         self.statusBar().showMessage(msg) 
         self.processdata()
+        self.showprofile()
 
         
     def checkserial(self):
@@ -123,11 +182,32 @@ class GmcApp(QtGui.QMainWindow, gwcp3.Ui_MainWindow):
         global serialdev
         global ser
         
-        serialdev= self.lineEditsetDev.text().toUtf8()
+        serialdev= str(self.lineEditsetDev.text().toUtf8()).strip()
         #speed= int(self.listWidgetspeed.item(1).text())
         speed=int(self.listWidgetspeed.currentItem().text())
+        if serialdev in ('', 'auto'):
+            # probe all ports and baud rates
+            self.statusBar().showMessage("searching device...")
+            QtGui.QApplication.processEvents()
+            found= gmcserial.detect()
+            if not found:
+                self.statusBar().showMessage("No GMC device found")
+                return
+            serialdev, speed, ver= found
+            self.lineEditsetDev.setText(serialdev)
+            self.listWidgetspeed.setCurrentRow(gmcserial.BAUDS.index(speed))
         msg="Serial interface: {:s} at {:d} baud".format(serialdev, speed)
-        ser = serial.Serial(serialdev, speed, timeout= 3) 
+        # closes the port of the old settings (or ends a replay)
+        if not isinstance(ser, gmcserial.Session):
+            ser.close()
+            ser=gmcserial.Session(attempts=1)
+        ser.configure(serialdev, speed)
+        try:
+            ser.open(1)
+        except (serial.SerialException, OSError) as e:
+            self.statusBar().showMessage("Cannot open {:s}: {!s}".format(serialdev, e))
+            return
+        gmcserial.savecache(serialdev, speed)
         self.statusBar().showMessage(msg)
         
 
@@ -139,7 +219,11 @@ class GmcApp(QtGui.QMainWindow, gwcp3.Ui_MainWindow):
             if self.radioButtonBin.isChecked():
                 print "binary choosen"
                 with open(fn, mode='wb') as file:  
-                    file.write(data)  
+                    if str(fn).endswith('.gmcz'):
+                        # compressed archive
+                        file.write(gmccodec.compress(data))
+                    else:
+                        file.write(data)  
                 msgs= "{:d} bytes saved to {:s}".format(len(data), fn)
             else:
                 analyse(self, data, fn, self.checkBox.isChecked())
@@ -147,6 +231,7 @@ class GmcApp(QtGui.QMainWindow, gwcp3.Ui_MainWindow):
         else:
             msgs= "No data to save"
         self.statusBar().showMessage(msgs)
+        self.showprofile()
             
 
     #process data
@@ -164,9 +249,11 @@ class GmcApp(QtGui.QMainWindow, gwcp3.Ui_MainWindow):
     def timeinfo(self):
         global ser
         
-        if not ser:
-            ser = serial.Serial(serialdev, speed, timeout= 3) 
-        dtime=getDate(ser)
+        try:
+            dtime=getDate(ser)
+        except (serial.SerialException, OSError, IOError) as e:
+            self.serialerror(e)
+            return
         stime= "{:%Y-%m-%d %H:%M:%S}".format(datetime.datetime.now())
         print "GMC device date:", dtime
         print "(interface date: ", stime
@@ -182,39 +269,189 @@ class GmcApp(QtGui.QMainWindow, gwcp3.Ui_MainWindow):
     def livedata(self):
         global ser
         
-        if not ser:
-            ser = serial.Serial(serialdev, speed, timeout= 3)
+        # alerts on spikes and lasting increases of the count rate
+        detector= gmcalarm.Detector(self.alert)
+        ring= None
         if self.pushButtonLiveData.isChecked():
             self.writeplain("* Live data:")
             self.pushButtonLiveData.setStyleSheet("background-color: red")
+            # samples for other local programs (gmcshm.py, gmc.py live --follow)
+            try:
+                ring= gmcshm.Ring()
+            except (IOError, OSError) as e:
+                self.writeplain("* Live data not shared: {!s}".format(e))
         else:
             self.pushButtonLiveData.setStyleSheet("background-color: none")
         ta=''
-        while self.pushButtonLiveData.isChecked():
-            QtGui.QApplication.processEvents()
-            ds= "{:s}  {:d}".format(getDate(ser), getCPM(ser))
-            tn= ds[-6:-4]
-            if ta != tn:
-                self.writeplain(ds)
-                ta=tn
-            #print "Checked? ", self.pushButtonLiveData.isChecked()
+        try:
+            while self.pushButtonLiveData.isChecked():
+                QtGui.QApplication.processEvents()
+                dtime, cpm= getDate(ser), getCPM(ser)
+                ds= "{:s}  {:d}".format(dtime, cpm)
+                tn= ds[-6:-4]
+                if ta != tn:
+                    self.writeplain(ds)
+                    ta=tn
+                    t= gmcdecode.epoch(datetime.datetime.now())
+                    detector.update(t, cpm)
+                    if ring:
+                        ring.publish(t, cpm)
+                #print "Checked? ", self.pushButtonLiveData.isChecked()
+        except (serial.SerialException, OSError, IOError) as e:
+            self.serialerror(e)
+            self.pushButtonLiveData.setChecked(False)
+            self.pushButtonLiveData.setStyleSheet("background-color: none")
+        finally:
+            if ring:
+                ring.close()
 
     
+    def setupfilter(self):
+        # filter bar below the buttons (not in gwcp3.ui)
+        self.findex= None
+        box= QtGui.QWidget(self.centralwidget)
+        box.setGeometry(QtCore.QRect(370, 455, 331, 86))
+        grid= QtGui.QGridLayout(box)
+        grid.setContentsMargins(0, 0, 0, 0)
+        self.filterFrom= QtGui.QLineEdit(box)
+        self.filterTo= QtGui.QLineEdit(box)
+        self.filterMin= QtGui.QLineEdit(box)
+        self.filterMax= QtGui.QLineEdit(box)
+        self.filterTag= QtGui.QLineEdit(box)
+        self.filterInfo= QtGui.QLabel(box)
+        for e in (self.filterFrom, self.filterTo):
+            e.setPlaceholderText("YYYY-MM-DD HH:MM:SS")
+        self.filterTag.setPlaceholderText("ID tag text")
+        grid.addWidget(QtGui.QLabel("From", box), 0, 0)
+        grid.addWidget(self.filterFrom, 0, 1)
+        grid.addWidget(QtGui.QLabel("To", box), 0, 2)
+        grid.addWidget(self.filterTo, 0, 3)
+        grid.addWidget(QtGui.QLabel("Count", box), 1, 0)
+        grid.addWidget(self.filterMin, 1, 1)
+        grid.addWidget(QtGui.QLabel("..", box), 1, 2)
+        grid.addWidget(self.filterMax, 1, 3)
+        grid.addWidget(QtGui.QLabel("Tag", box), 2, 0)
+        grid.addWidget(self.filterTag, 2, 1)
+        grid.addWidget(self.filterInfo, 2, 2, 1, 2)
+        for e in (self.filterFrom, self.filterTo, self.filterMin, self.filterMax, self.filterTag):
+            e.textChanged.connect(self.applyfilter)
+
+    def applyfilter(self):
+        # show records matching the filter bar, looked up in indexes (gmcfilter)
+        maxshow= 5000
+        if len(data) < 2:
+            return
+        rb= gmccache.decode(data)
+        if self.findex is None or self.findex.rb is not rb:
+            self.findex= gmcfilter.RecordIndex(rb)
+        q= {}
+        try:
+            for key, e, conv in (('tfrom', self.filterFrom, gmcdecode.parsetime),
+                                 ('tto', self.filterTo, gmcdecode.parsetime),
+                                 ('cmin', self.filterMin, int),
+                                 ('cmax', self.filterMax, int)):
+                s= str(e.text()).strip()
+                if s:
+                    q[key]= conv(s)
+        except ValueError:
+            # still typing
+            self.filterInfo.setText("?")
+            return
+        q['tag']= str(self.filterTag.text().toUtf8()).strip()
+        rows= self.findex.query(**q)
+        sub= gmcfilter.take(rb, rows[:maxshow])
+        text= ''.join(gmcwrite.blocks(sub, 'plain', self.checkBox.isChecked() or bool(q['tag'])))
+        if len(rows) > maxshow:
+            text+= "* ... {:d} more".format(len(rows)-maxshow)
+        self.plainTextEdit.setPlainText(text)
+        self.filterInfo.setText("{:d} records".format(len(rows)))
+
+    def alert(self, a):
+        # gmcalarm callback
+        msg= gmcalarm.describe(a)
+        print msg
+        self.writeplain(msg)
+        self.statusBar().setStyleSheet("background-color: red")
+        self.statusBar().showMessage(msg)
+
+    def replay(self):
+        # dump file instead of the device: Live data, Load from device etc. use it
+        # until Set serial is pressed
+        global ser
+        fname = QtGui.QFileDialog.getOpenFileName(self, 'Replay file', '',"Data files (*.*)")
+        if not fname:
+            return
+        speed, ok = QtGui.QInputDialog.getDouble(self, "Replay", "Speed (1: real time, 0: as fast as possible)", 60, 0, 1e6, 1)
+        if not ok:
+            return
+        with open(fname, mode='rb') as file:
+            rdata = file.read()
+        if str(fname).endswith('.gmcz'):
+            rdata = gmccodec.decompress(rdata)
+        ser.close()
+        ser= gmcreplay.ReplaySerial(rdata, speed)
+        self.statusBar().showMessage("Replay of {:s} at speed {:g}; Set serial to end".format(fname, speed))
+
+    def findalerts(self):
+        # replay of loaded data, e.g. for tuning of gmcalarm parameters
+        self.statusBar().setStyleSheet("")
+        alerts= gmcalarm.replay(gmccache.decode(data), gmcalarm.Detector(self.alert))
+        if not alerts:
+            self.statusBar().showMessage("No alerts")
+
+    def summary(self):
+        # one decoding pass for records and runs (gmcsummary); result cached for Process data
+        if len(data) < 2:
+            self.statusBar().showMessage("No data loaded")
+            return
+        rb, segments= gmcsummary.decode(data)
+        self.clearplain()
+        self.writeplain(segments.table())
+        self.statusBar().showMessage("{:d} runs, {:d} records".format(len(segments.segments), len(rb)))
+
+    def compare(self):
+        # dumps overlaid on one time axis, decoded in worker processes; data is not changed
+        if self.overlay is None:
+            self.overlay= gwcoverlay.OverlayWindow()
+        self.overlay.show()
+        self.overlay.raise_()
+        self.overlay.adddumps()
+
+    def serialerror(self, e):
+        # device not connected or lost: the GUI goes on
+        self.statusBar().showMessage("Serial port {:s}: {!s}".format(ser.name or '?', e))
+
     def writeplain(self, ln):
-        self.plainTextEdit.appendPlainText(ln)
+        with gmcprof.timer('widget.update', ln.count("\n")+1):
+            self.plainTextEdit.appendPlainText(ln)
         
     def clearplain(self):
         self.plainTextEdit.clear()
+
+    def showprofile(self):
+        # time per stage in status bar (if started with --profile)
+        if gmcprof.enabled:
+            self.statusBar().showMessage(gmcprof.summary())
     
     
 def main():
     global form
+    # --cache: keep decoded data on disk for the next sessions
+    if '--cache' in sys.argv:
+        gmccache.use_disk()
+    # --profile: time per stage in status bar, --profile-dump FILE: save as JSON at exit
+    if '--profile' in sys.argv:
+        gmcprof.enable()
+    if '--profile-dump' in sys.argv[:-1]:
+        gmcprof.enable()
+        atexit.register(gmcprof.dump, sys.argv[sys.argv.index('--profile-dump')+1])
     app = QtGui.QApplication(sys.argv)  # instance of QApplication
     #set icon:
     app.setWindowIcon(QtGui.QIcon("gmcicon32.png")) # GUI icon
     form = GmcApp()  
     form.show()  
     app.exec_() 
+    ser.close()
 
 
 if __name__ == '__main__': 
@@ -0,0 +1,211 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Window to compare dumps: several dumps overlaid on one time axis
+
+Dumps are decoded in worker processes (gmcoverlay.Loader) while the
+window stays usable; each one is drawn when ready. Mean CPM per pixel
+as line, min..max as light band. Mouse wheel: zoom at the cursor,
+double click: all.
+
+Opened by the menu File / Compare dumps... of gwcmain; does not change
+the data loaded there.
+'''
+
+# versions:
+# vers 2017-04: first version
+
+import os
+
+from PyQt4 import QtGui, QtCore
+
+import gmcoverlay
+import gmcwrite
+
+
+COLORS= ('#1f77b4', '#d62728', '#2ca02c', '#ff7f0e', '#9467bd', '#8c564b', '#e377c2', '#17becf')
+
+
+class OverlayPlot(QtGui.QWidget):
+    # series of an gmcoverlay.Overlay, one color per file name
+
+    def __init__(self, overlay, parent=None):
+        super(OverlayPlot, self).__init__(parent)
+        self.overlay= overlay
+        self.colors= {}
+        self.window= None    # (t0, t1) when zoomed
+        self.setMinimumSize(400, 200)
+
+    def area(self):
+        # plot area without axis labels
+        return QtCore.QRect(55, 10, max(self.width()-65, 1), max(self.height()-35, 1))
+
+    def paintEvent(self, ev):
+        p= QtGui.QPainter(self)
+        p.fillRect(self.rect(), QtCore.Qt.white)
+        span= self.window or self.overlay.span()
+        if not span:
+            p.drawText(self.rect(), QtCore.Qt.AlignCenter, "No dumps loaded")
+            p.end()
+            return
+        t0, t1= span
+        r= self.area()
+        n= r.width()
+        cols= [(key, gmcoverlay.bins(s, t0, t1, n)) for key, s in self.overlay.series.items()]
+        ymax= max([b[0] for _, bs in cols for b in bs if b] or [1.0]) * 1.2
+        scale= r.height() / ymax
+
+        def y(v):
+            return r.bottom() - min(v, ymax) * scale
+
+        for key, bs in cols:
+            color= QtGui.QColor(self.colors.get(key, QtCore.Qt.black))
+            band= QtGui.QColor(color)
+            band.setAlpha(60)
+            p.setPen(QtGui.QPen(band))
+            for x, b in enumerate(bs):
+                if b and b[2] > b[1]:
+                    p.drawLine(QtCore.QPointF(r.left() + x, y(b[1])), QtCore.QPointF(r.left() + x, y(b[2])))
+            # mean, broken where no data
+            pen= QtGui.QPen(color)
+            pen.setWidthF(1.5)
+            p.setPen(pen)
+            line= QtGui.QPolygonF()
+            for x, b in enumerate(bs):
+                if b:
+                    line.append(QtCore.QPointF(r.left() + x, y(b[0])))
+                elif line.size():
+                    p.drawPolyline(line)
+                    line= QtGui.QPolygonF()
+            if line.size():
+                p.drawPolyline(line)
+
+        p.setPen(QtCore.Qt.black)
+        p.drawRect(r)
+        fm= p.fontMetrics()
+        p.drawText(2, r.top() + fm.ascent(), "{:.0f}".format(ymax))
+        p.drawText(2, r.bottom(), "0 CPM")
+        p.drawText(r.left(), r.bottom() + fm.height() + 4, gmcwrite.timestr(int(t0)))
+        s1= gmcwrite.timestr(int(t1))
+        p.drawText(r.right() - fm.width(s1), r.bottom() + fm.height() + 4, s1)
+        p.end()
+
+    def wheelEvent(self, ev):
+        span= self.window or self.overlay.span()
+        if not span:
+            return
+        t0, t1= span
+        r= self.area()
+        # time at the cursor stays in place
+        f= min(max(float(ev.x() - r.left()) / r.width(), 0.0), 1.0)
+        tc= t0 + f * (t1 - t0)
+        k= 0.8 if ev.delta() > 0 else 1.25
+        w= max((t1 - t0) * k, 60)
+        self.window= (tc - f * w, tc + (1 - f) * w)
+        self.update()
+
+    def mouseDoubleClickEvent(self, ev):
+        self.window= None
+        self.update()
+
+
+class OverlayWindow(QtGui.QWidget):
+
+    def __init__(self, parent=None):
+        super(OverlayWindow, self).__init__(parent)
+        self.setWindowTitle("Compare dumps")
+        self.resize(900, 450)
+        self.overlay= gmcoverlay.Overlay()
+        self.loader= gmcoverlay.Loader()
+        self.items= {}    # file name -> list item
+        self.ncolor= 0
+
+        self.plot= OverlayPlot(self.overlay, self)
+        self.files= QtGui.QListWidget(self)
+        self.files.setMaximumWidth(240)
+        self.files.setSelectionMode(QtGui.QAbstractItemView.ExtendedSelection)
+        add= QtGui.QPushButton("Add dumps...", self)
+        remove= QtGui.QPushButton("Remove", self)
+        add.clicked.connect(self.adddumps)
+        remove.clicked.connect(self.removeselected)
+        self.info= QtGui.QLabel(self)
+
+        left= QtGui.QVBoxLayout()
+        left.addWidget(self.files)
+        left.addWidget(add)
+        left.addWidget(remove)
+        top= QtGui.QHBoxLayout()
+        top.addLayout(left)
+        top.addWidget(self.plot, 1)
+        box= QtGui.QVBoxLayout(self)
+        box.addLayout(top, 1)
+        box.addWidget(self.info)
+
+        # results of the workers, collected in the GUI thread
+        self.timer= QtCore.QTimer(self)
+        self.timer.setInterval(100)
+        self.timer.timeout.connect(self.collect)
+        self.showinfo()
+
+    def adddumps(self):
+        names= QtGui.QFileDialog.getOpenFileNames(self, 'Dumps to compare', '', "Data files (*.*)")
+        for fn in names:
+            self.add(str(fn))
+
+    def add(self, fn):
+        if fn in self.items:
+            return
+        color= COLORS[self.ncolor % len(COLORS)]
+        self.ncolor += 1
+        self.plot.colors[fn]= color
+        item= QtGui.QListWidgetItem("{:s} (decoding)".format(os.path.basename(fn)), self.files)
+        item.setForeground(QtGui.QBrush(QtGui.QColor(color)))
+        self.items[fn]= item
+        self.loader.add(fn)
+        self.timer.start()
+        self.showinfo()
+
+    def collect(self):
+        for fn, s in self.loader.poll():
+            item= self.items.get(fn)
+            if item is None:
+                # removed while decoding
+                continue
+            name= os.path.basename(fn)
+            if isinstance(s, Exception):
+                item.setText("{:s} ({!s})".format(name, s))
+                continue
+            for k in self.overlay.add(fn, s):
+                # oldest over the memory limit; may be added again
+                self.items.pop(k).setText("{:s} (dropped: memory)".format(os.path.basename(k)))
+            item.setText("{:s}  {:d} samples".format(name, len(s)))
+            item.setToolTip("{:s}\n{:s} .. {:s}".format(fn, *map(gmcwrite.timestr, s.span())) if len(s) else fn)
+            self.plot.update()
+        if not self.loader.busy():
+            self.timer.stop()
+        self.showinfo()
+
+    def removeselected(self):
+        for item in self.files.selectedItems():
+            for fn, it in self.items.items():
+                if it is item:
+                    del self.items[fn]
+                    self.overlay.remove(fn)
+            self.files.takeItem(self.files.row(item))
+        self.plot.update()
+        self.showinfo()
+
+    def showinfo(self):
+        self.info.setText("{:d} dumps shown, {:.1f} MB, {:d} decoding".format(
+            len(self.overlay), self.overlay.nbytes() / 1e6, self.loader.busy()))
+
+    def closeEvent(self, ev):
+        self.timer.stop()
+        # files still decoding are dropped, may be added again
+        for fn in self.loader.pending:
+            item= self.items.pop(fn, None)
+            if item is not None:
+                self.files.takeItem(self.files.row(item))
+        self.loader.close()
+        ev.accept()
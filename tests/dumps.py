@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Raw dumps built for the tests, and helpers to compare decoded records
+'''
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gmcdecode
+from gmcdecode import KIND_TAG
+
+
+def timetag(y, mo, d, h, mi, s, mode):
+    return bytearray([0x55, 0xaa, 0x00, y - 2000, mo, d, h, mi, s, 0x55, 0xaa, mode])
+
+
+def idtag(text):
+    return bytearray([0x55, 0xaa, 0x02, len(text)]) + text
+
+
+def count2(value):
+    return bytearray([0x55, 0xaa, 0x01, value >> 8, value & 0xff])
+
+
+def synthetic(size, seed=1, back=False):
+    """Dump of about size bytes: runs of counts between time and ID tags
+
+    back: the clock is set back now and then (times not ascending)
+    """
+    rnd = random.Random(seed)
+    out = bytearray()
+    day = 1
+    while len(out) < size:
+        if back and rnd.random() < 0.2:
+            day = max(day - rnd.randint(1, 5), 1)
+        out += timetag(2017, 3 + day // 28, day % 28 + 1, rnd.randint(0, 23), 0, 0, rnd.choice((1, 2, 3)))
+        if rnd.random() < 0.3:
+            out += idtag('run{:d}'.format(rnd.randint(1, 999)))
+        out += bytearray(rnd.randint(0, 0x54) for _ in xrange(rnd.randint(100, 3000)))
+        if rnd.random() < 0.2:
+            out += count2(rnd.randint(0, 0xffff))
+        day += 1
+    return str(out[:size])
+
+
+def fields(rb):
+    """Records of rb as lists, ID tags as text"""
+    return [getattr(rb, f).tolist() for f in gmcdecode.FIELDS] + [tagtexts(rb)]
+
+
+def tagtexts(rb):
+    return [r.tag for r in rb if r.kind == KIND_TAG]
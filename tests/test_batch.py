@@ -0,0 +1,45 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+RecordBatch: slicing, joining and wide times
+'''
+
+import unittest
+
+from dumps import timetag, synthetic, fields, tagtexts
+import gmcdecode
+import gmcwrite
+
+
+class RecordBatch(unittest.TestCase):
+
+    def test_late_years(self):
+        # device years up to 2255: times beyond 32 bit from TSTART
+        rb = gmcdecode.decode(str(timetag(2040, 1, 1, 0, 0, 0, 2) + bytearray([4]) +
+                                  timetag(2255, 12, 31, 23, 59, 0, 2) + bytearray([6])))
+        self.assertEqual(rb.timetags(), 2)
+        self.assertEqual(rb.times.typecode, 'd')
+        self.assertEqual(gmcwrite.lines(rb, 'plain'), ["2040-01-01 00:00:00     4", "2255-12-31 23:59:00     6"])
+
+    def test_concat_tags(self):
+        rb = gmcdecode.decode(synthetic(100000))
+        parts = rb[:10] + rb[10:2000] + rb[2000:]
+        self.assertEqual(fields(parts), fields(rb))
+        # only the tags used are taken over
+        self.assertEqual(len((rb[:10] + rb[10:20]).tags), len(tagtexts(rb[:20])))
+
+    def test_extend_widens(self):
+        rb = gmcdecode.decode(synthetic(20000, 9))
+        late = gmcdecode.decode(str(timetag(2255, 1, 1, 0, 0, 0, 2) + bytearray([1])))
+        out = gmcdecode.RecordBatch()
+        out.extend(rb)
+        out.extend(late, 20000)
+        self.assertEqual(out.times.typecode, 'd')
+        self.assertEqual(fields(out[:len(rb)]), fields(rb))
+        self.assertEqual(out.time(len(out) - 1), late.time(1))
+        self.assertEqual(out.offsets[-1], 20000 + 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
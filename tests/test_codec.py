@@ -0,0 +1,62 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Archives (gmccodec) and time windows of dumps and archives (gmcindex)
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dumps import synthetic, fields
+import gmccodec
+import gmcdecode
+import gmcindex
+
+
+class Archive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def save(self, name, data):
+        fn = os.path.join(self.tmp, name)
+        with open(fn, 'wb') as f:
+            f.write(data)
+        return fn
+
+    def test_round_trip(self):
+        for data in ('', '\x55\xaa', synthetic(3 * gmccodec.FRAMESIZE + 123, 2)):
+            self.assertEqual(gmccodec.decompress(gmccodec.compress(data)), data)
+
+    def test_decode(self):
+        data = synthetic(2 * gmccodec.FRAMESIZE + 77, 3)
+        fn = self.save('dump.gmcz', gmccodec.compress(data))
+        self.assertEqual(fields(gmccodec.decode(fn)), fields(gmcdecode.decode(data)))
+
+    def test_window_clock_set_back(self):
+        # runs overlap in time: the window is cut per time tag segment
+        data = synthetic(300000, 8, back=True)
+        rb = gmcdecode.decode(data)
+        self.assertNotEqual(rb.times.tolist(), sorted(rb.times))
+        dump = self.save('dump.bin', data)
+        archive = self.save('dump.gmcz', gmccodec.compress(data))
+        tf, tt = gmcdecode.parsetime("2017-03-05 00:00:00"), gmcdecode.parsetime("2017-03-09 12:00:00")
+        scan = gmcdecode.RecordBatch()
+        for i in xrange(len(rb)):
+            if tf <= rb.time(i) <= tt:
+                scan.extend(rb[i:i + 1])
+        self.assertTrue(0 < len(scan) < len(rb))
+        self.assertEqual(fields(gmcindex.query(dump, tf, tt)), fields(scan))
+        self.assertEqual(fields(gmcindex.select(archive, tf, tt)), fields(scan))
+        self.assertEqual(fields(gmcindex.window(rb, None, tt)),
+                         fields(gmcindex.query(dump, None, tt)))
+
+
+if __name__ == '__main__':
+    unittest.main()
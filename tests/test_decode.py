@@ -0,0 +1,78 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Decoder and text writer against known output
+
+    python -m unittest discover tests
+'''
+
+import unittest
+
+from dumps import timetag, idtag, count2
+import gmcdecode
+import gmcwrite
+from gmcdecode import KIND_COUNT, KIND_COUNT2, KIND_TIME, KIND_TAG
+
+
+# one count before the first time tag (time TSTART), minute mode with a
+# double byte count and an ID tag, then second mode
+DUMP = str(bytearray([5]) +
+           timetag(2017, 3, 1, 12, 0, 0, 2) + bytearray([10, 20]) + count2(300) +
+           idtag('abc') + bytearray([7]) +
+           timetag(2017, 3, 1, 13, 0, 0, 1) + bytearray([1, 2]))
+
+# text of DUMP as written by analyse() before gmcdecode/gmcwrite
+PLAIN = [
+    "1950-01-22 11:12:13     5",
+    "* 2017-03-01 12:00:00 Dev. Timetag;  2",
+    "2017-03-01 12:00:00    10",
+    "2017-03-01 12:01:00    20",
+    "2017-03-01 12:02:00   300",
+    "* ID tag: abc",
+    "2017-03-01 12:03:00     7",
+    "* 2017-03-01 13:00:00 Dev. Timetag;  1",
+    "2017-03-01 13:00:00     1",
+    "2017-03-01 13:00:01     2",
+]
+
+
+class KnownOutput(unittest.TestCase):
+
+    def test_records(self):
+        rb = gmcdecode.decode(DUMP)
+        self.assertEqual(rb.kinds.tolist(), [KIND_COUNT, KIND_TIME, KIND_COUNT, KIND_COUNT, KIND_COUNT2,
+                                             KIND_TAG, KIND_COUNT, KIND_TIME, KIND_COUNT, KIND_COUNT])
+        self.assertEqual([r.count for r in rb if r.kind != KIND_TAG], [5, 2, 10, 20, 300, 7, 1, 1, 2])
+        self.assertEqual(rb.offsets.tolist(), [0, 1, 13, 14, 15, 20, 27, 28, 40, 41])
+        self.assertEqual(rb.tags, ['abc'])
+        self.assertEqual(rb.time(0), gmcdecode.TSTART)
+        self.assertEqual(rb.tnext, gmcdecode.parsetime("2017-03-01 13:00:02"))
+        self.assertEqual(rb.idcpm, 1)
+
+    def test_plain(self):
+        rb = gmcdecode.decode(DUMP)
+        self.assertEqual(gmcwrite.lines(rb, 'plain', True), PLAIN)
+        self.assertEqual(gmcwrite.lines(rb, 'plain'), [l for l in PLAIN if not l.startswith('*')])
+
+    def test_csv(self):
+        rb = gmcdecode.decode(DUMP)
+        self.assertEqual(gmcwrite.lines(rb, 'csv')[:3],
+                         ["1950-01-22 11:12:13,5", "2017-03-01 12:00:00,10", "2017-03-01 12:01:00,20"])
+
+    def test_invalid_date_is_counts(self):
+        # month 13: the marker bytes are counts
+        rb = gmcdecode.decode(str(timetag(2017, 13, 1, 0, 0, 0, 2)))
+        self.assertEqual(rb.timetags(), 0)
+        self.assertEqual(rb.counts.tolist(), [0x55, 0xaa, 0x00, 17, 13, 1, 0, 0, 0, 0x55, 0xaa, 2])
+
+    def test_parts(self):
+        # decoding in two parts, with the state of the first, gives the same
+        a = gmcdecode.decode(DUMP, 0, 20)
+        b = gmcdecode.decode(DUMP, 20, None, a.tnext, a.idcpm)
+        rb = gmcdecode.decode(DUMP)
+        self.assertEqual(gmcwrite.lines(a, 'plain') + gmcwrite.lines(b, 'plain'), gmcwrite.lines(rb, 'plain'))
+
+
+if __name__ == '__main__':
+    unittest.main()
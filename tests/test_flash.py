@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+End of data in device memory by small probes (gmcflash.findend)
+'''
+
+import unittest
+
+import dumps    # path of the modules
+import gmcflash
+
+
+class Flash(object):
+    """SPIR of a flash with data in front, erased (0xff) after"""
+
+    def __init__(self, used, size=gmcflash.FLASHSIZE, lost=()):
+        self.mem = ('\x00' * used + '\xff' * (size - used))[:size]
+        self.lost = list(lost)     # addresses of probes answered short once
+        self.probes = 0
+
+    def spir(self, address, n):
+        self.probes += 1
+        if address in self.lost:
+            self.lost.remove(address)
+            return self.mem[address:address + n // 2]
+        return self.mem[address:address + n]
+
+
+class FindEnd(unittest.TestCase):
+
+    def findend(self, flash, size=gmcflash.FLASHSIZE):
+        return gmcflash.findend(flash.spir, size, pace=0)
+
+    def test_ends(self):
+        for used in (1, 15, 16, 17, 4096, 40000, gmcflash.FLASHSIZE - 1):
+            flash = Flash(used)
+            self.assertEqual(self.findend(flash), used)
+            self.assertLess(flash.probes, 20)
+
+    def test_empty(self):
+        self.assertEqual(self.findend(Flash(0)), 0)
+
+    def test_full(self):
+        self.assertEqual(self.findend(Flash(gmcflash.FLASHSIZE)), gmcflash.FLASHSIZE)
+
+    def test_lost_probe(self):
+        # a short answer is repeated, not taken as erased memory
+        flash = Flash(40000, lost=[0, gmcflash.FLASHSIZE // 2])
+        self.assertEqual(self.findend(flash), 40000)
+        self.assertEqual(flash.lost, [])
+
+    def test_dead_device(self):
+        self.assertRaises(IOError, gmcflash.findend, lambda a, n: '', gmcflash.FLASHSIZE, pace=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Overlay series: CPM per interval mode, pickled for the loader pool
+'''
+
+import pickle
+import unittest
+
+from dumps import timetag
+import gmcdecode
+import gmcoverlay
+
+
+# hour mode, second mode, invalid mode 5 (mode kept), minute mode
+DUMP = str(timetag(2017, 3, 1, 0, 0, 0, 3) + bytearray([20, 22]) +
+           timetag(2017, 3, 2, 0, 0, 0, 1) + bytearray([1, 2]) +
+           timetag(2017, 3, 2, 1, 0, 0, 5) + bytearray([3]) +
+           timetag(2017, 3, 3, 0, 0, 0, 2) + bytearray([10]))
+
+
+class Series(unittest.TestCase):
+
+    def test_cpm(self):
+        s = gmcoverlay.series(gmcdecode.decode(DUMP), 'dump')
+        self.assertEqual(s.cpm.tolist(), [20.0, 22.0, 60.0, 120.0, 180.0, 10.0])
+
+    def test_pickle(self):
+        s = gmcoverlay.series(gmcdecode.decode(DUMP), 'dump')
+        p = pickle.loads(pickle.dumps(s, 2))
+        self.assertEqual((p.name, p.times, p.cpm, p.records), (s.name, s.times, s.cpm, s.records))
+
+
+if __name__ == '__main__':
+    unittest.main()
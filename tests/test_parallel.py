@@ -0,0 +1,71 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Parallel decoding: same records as sequential, and worth the overhead
+'''
+
+import multiprocessing
+import pickle
+import time
+import unittest
+
+from dumps import synthetic, fields
+import gmcdecode
+import gmcindex
+import gmcparallel
+
+
+def best(func, *args):
+    """Best of 3 run times of func(*args), seconds"""
+    out = []
+    for _ in range(3):
+        t = time.time()
+        func(*args)
+        out.append(time.time() - t)
+    return min(out)
+
+
+class Parallel(unittest.TestCase):
+
+    def test_same_as_serial(self):
+        data = synthetic(3 * gmcparallel.MINSIZE)
+        rb = gmcdecode.decode(data)
+        for threads in (True, False):
+            prb = gmcparallel.decode(data, 2, threads)
+            self.assertEqual(fields(prb), fields(rb))
+            self.assertEqual((prb.tnext, prb.idcpm), (rb.tnext, rb.idcpm))
+
+    def test_pickle(self):
+        rb = gmcdecode.decode(synthetic(gmcparallel.MINSIZE))
+        for protocol in (0, 2):
+            prb = pickle.loads(pickle.dumps(rb, protocol))
+            self.assertEqual(fields(prb), fields(rb))
+            self.assertEqual([a.typecode for a in (prb.times, prb.counts)],
+                             [a.typecode for a in (rb.times, rb.counts)])
+
+    def test_overhead(self):
+        # prescan, sending the results back (pickle) and joining them
+        # must be small against decoding, or workers cannot win
+        data = bytearray(synthetic(8 * gmcparallel.MINSIZE, 5))
+        rb = gmcdecode.decode(data)
+        parts = [gmcdecode.decode(data, *job)
+                 for job in gmcparallel.jobs(gmcindex.segments(data), len(data), 8)]
+
+        def join():
+            out = pickle.loads(pickle.dumps(parts[0], 2))
+            for part in parts[1:]:
+                out.extend(pickle.loads(pickle.dumps(part, 2)))
+            return out
+        self.assertEqual(fields(join()), fields(rb))
+        overhead = best(gmcindex.segments, data) + best(join)
+        self.assertLess(overhead, 0.35 * best(gmcdecode.decode, data))
+
+    @unittest.skipUnless(multiprocessing.cpu_count() >= 2, "needs 2 CPUs")
+    def test_speedup(self):
+        data = synthetic(16 * gmcparallel.MINSIZE, 6)
+        self.assertLess(best(gmcparallel.decode, data, 2), 0.9 * best(gmcdecode.decode, data))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Library of the GUI: analyse() reports invalid data, does not exit
+'''
+
+import unittest
+
+import dumps    # path of the modules
+import gmcflash
+import gmcparse6
+
+
+class Analyse(unittest.TestCase):
+
+    def test_too_large(self):
+        # form is not used for invalid data
+        msge = gmcparse6.analyse(None, bytearray(gmcflash.MAXSIZE + 1), '')
+        self.assertEqual(msge, "Invalid data file (> 1 MB)")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Replay of a dump through the device commands
+'''
+
+import unittest
+
+from dumps import timetag, idtag
+import gmcparse6
+import gmcreplay
+
+
+class ReplaySerial(unittest.TestCase):
+
+    def test_samples(self):
+        ser = gmcreplay.ReplaySerial(str(timetag(2017, 3, 1, 12, 0, 0, 2) + bytearray([7, 9])), 0)
+        self.assertEqual((gmcparse6.getCPM(ser), gmcparse6.getCPM(ser)), (7, 9))
+        self.assertEqual(gmcparse6.getDate(ser), "2017-03-01 12:01:00")
+
+    def test_no_counts(self):
+        # tags only: version and memory are there, live data are not
+        data = str(timetag(2017, 3, 1, 12, 0, 0, 2) + idtag('empty'))
+        ser = gmcreplay.ReplaySerial(data, 0)
+        self.assertEqual(gmcparse6.getVER(ser), 'GMC-Replay1.00')
+        self.assertEqual(str(gmcparse6.readHIST(ser, 4096)), data)   # erased after data
+        self.assertRaises(IOError, gmcparse6.getDate, ser)
+
+
+if __name__ == '__main__':
+    unittest.main()
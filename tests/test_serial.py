@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Serial session: errors of a lost port reach the caller
+'''
+
+import tempfile
+import unittest
+
+import dumps    # path of the modules
+import gmcserial
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+
+class FakePort(object):
+    """serial.Serial stand-in: answers from a list, fails when told"""
+
+    opens = 0
+    fail_open = False
+    fail_read = False
+    answer = ''
+
+    def __init__(self, port, baud, timeout=None):
+        if FakePort.fail_open:
+            raise serial.SerialException("could not open port " + port)
+        FakePort.opens += 1
+
+    def write(self, data):
+        return len(data)
+
+    def read(self, n):
+        if FakePort.fail_read:
+            raise serial.SerialException("device reports readiness to read but returned no data")
+        return FakePort.answer[:n]
+
+    def flushInput(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@unittest.skipIf(serial is None, "needs pyserial")
+class Session(unittest.TestCase):
+
+    def setUp(self):
+        self.node = tempfile.NamedTemporaryFile()   # port device node exists
+        self.saved = serial.Serial, gmcserial.BACKOFF
+        serial.Serial = FakePort
+        gmcserial.BACKOFF = 0.0
+        FakePort.opens = 0
+        FakePort.fail_open = FakePort.fail_read = False
+        FakePort.answer = ''
+        self.ser = gmcserial.Session(self.node.name, 115200, attempts=2)
+
+    def tearDown(self):
+        serial.Serial, gmcserial.BACKOFF = self.saved
+        self.node.close()
+
+    def test_lost_read_reopens(self):
+        FakePort.answer = 'GMC-320Re 4.20'
+        FakePort.fail_read = True
+        self.assertEqual(self.ser.read(14), '')
+        self.assertEqual(self.ser.reconnects, 1)
+        FakePort.fail_read = False
+        self.assertEqual(self.ser.read(14), 'GMC-320Re 4.20')
+        self.assertEqual(FakePort.opens, 2)
+
+    def test_gone_port_raises(self):
+        self.ser.write('<GETVER>>')
+        FakePort.fail_read = FakePort.fail_open = True
+        self.assertEqual(self.ser.read(14), '')     # the read fails
+        self.assertRaises(IOError, self.ser.read, 14)   # reopen fails
+        self.assertRaises(IOError, self.ser.readinto, bytearray(14))
+        self.assertRaises(IOError, self.ser.flushInput)
+
+    def test_getdate_failing_read(self):
+        import gmcparse6
+        FakePort.fail_read = True
+        self.assertRaises(IOError, gmcparse6.getDate, self.ser)
+        self.assertRaises(IOError, gmcparse6.getVER, self.ser)
+
+    def test_getdate(self):
+        import gmcparse6
+        FakePort.answer = '\x11\x03\x01\x0c\x00\x05\xaa'
+        self.assertEqual(gmcparse6.getDate(self.ser), "2017-03-01 12:00:05")
+        FakePort.answer = '\x11\x03'
+        self.assertRaises(IOError, gmcparse6.getDate, self.ser)
+
+
+if __name__ == '__main__':
+    unittest.main()
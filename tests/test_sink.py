@@ -0,0 +1,54 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Output sinks: files read back equal the records written
+'''
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from dumps import synthetic, fields
+import gmcdecode
+import gmcsink
+
+
+class Files(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.rb = gmcdecode.decode(synthetic(50000, 4))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, rb=None):
+        fn = os.path.join(self.tmp, name)
+        pipe = gmcsink.Pipeline([gmcsink.forfile(fn)], batchsize=4096)
+        pipe.write(self.rb if rb is None else rb)
+        pipe.close()
+        return fn
+
+    def test_columns(self):
+        crb = gmcsink.readcolumns(self.write('dump.gmcc'))
+        self.assertEqual(fields(crb), fields(self.rb))
+
+    def test_json(self):
+        with open(self.write('dump.json')) as f:
+            objs = json.load(f)
+        with open(self.write('dump.jsonl')) as f:
+            lines = [json.loads(l) for l in f]
+        self.assertEqual(len(objs), len(self.rb))
+        self.assertEqual(objs, lines)
+        self.assertEqual(sum(1 for o in objs if 'timetag' in o), self.rb.timetags())
+
+    def test_json_empty(self):
+        with open(self.write('empty.json', gmcdecode.RecordBatch())) as f:
+            self.assertEqual(json.load(f), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
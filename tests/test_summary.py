@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+'''
+Summary of runs: CPM per interval mode, runs cut by a time window
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dumps import timetag, idtag, synthetic
+import gmcdecode
+import gmcindex
+import gmcsummary
+
+
+# hour mode (CPM once per hour), second mode (counts per second),
+# minute mode after an ID tag
+DUMP = str(timetag(2017, 3, 1, 0, 0, 0, 3) + bytearray([20, 22, 18]) +
+           timetag(2017, 3, 2, 0, 0, 0, 1) + bytearray([1, 2, 3]) +
+           idtag('run') + timetag(2017, 3, 3, 0, 0, 0, 2) + bytearray([10, 30]))
+
+
+def epoch(s):
+    return gmcdecode.parsetime(s)
+
+
+class Modes(unittest.TestCase):
+
+    def test_cpm(self):
+        rb, s = gmcsummary.decode(DUMP)
+        self.assertEqual([(g.mode, g.mean, g.max, g.min) for g in s.segments],
+                         [(3, 20.0, 22.0, 18.0), (1, 120.0, 180.0, 60.0), (2, 20.0, 30.0, 10.0)])
+        self.assertEqual([g.duration for g in s.segments], [3 * 3600, 3, 120])
+        self.assertEqual([g.tag for g in s.segments], [None, None, 'run'])
+
+    def test_summarize_as_decoder(self):
+        data = synthetic(200000, 7)
+        rb, s = gmcsummary.decode(data)
+        self.assertEqual(gmcsummary.summarize(rb).segments, s.segments)
+
+
+class Window(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.fn = os.path.join(self.tmp, 'dump.bin')
+        with open(self.fn, 'wb') as f:
+            f.write(DUMP)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_starts_within_run(self):
+        s = gmcsummary.Summary()
+        rb = gmcindex.query(self.fn, epoch("2017-03-01 01:00:00"), epoch("2017-03-02 00:00:01"), s)
+        self.assertEqual(len(rb), 2 + 1 + 2)
+        first, second = s.segments
+        self.assertEqual((first.start, first.mode, first.records, first.mean),
+                         (epoch("2017-03-01 01:00:00"), 3, 2, 20.0))
+        self.assertEqual((second.start, second.mode, second.records, second.mean),
+                         (epoch("2017-03-02 00:00:00"), 1, 2, 90.0))
+
+    def test_all(self):
+        s = gmcsummary.Summary()
+        gmcindex.query(self.fn, None, None, s)
+        self.assertEqual(s.segments, gmcsummary.decode(DUMP)[1].segments)
+
+
+if __name__ == '__main__':
+    unittest.main()